@@ -1,186 +1,102 @@
 import os
-import requests
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+import sys
 from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-
-def get_japanese_font():
-    """
-    Downloads KleeOne-Regular.ttf (a handwritten-style Japanese font) 
-    from the official Fontworks GitHub repo.
-    """
-    font_filename = "KleeOne-Regular.ttf"
-    
-    # Stable URL for Klee One Regular (Static TTF)
-    url = "https://github.com/fontworks-fonts/Klee/raw/master/fonts/ttf/KleeOne-Regular.ttf"
-
-    if not os.path.exists(font_filename):
-        print(f"Downloading font: {font_filename}...")
-        print("This may take a moment (approx 4MB)...")
-        try:
-            response = requests.get(url, allow_redirects=True)
-            response.raise_for_status()
-            
-            # Sanity check: verify it's not a text file error page
-            if b"<!DOCTYPE html>" in response.content[:100]:
-                raise Exception("Download failed (got HTML instead of TTF).")
-                
-            with open(font_filename, "wb") as f:
-                f.write(response.content)
-            print("Font downloaded successfully.")
-        except Exception as e:
-            print(f"Error downloading font: {e}")
-            print(f"Please manually download {font_filename} and place it in this folder.")
-            return None
-    
-    return font_filename
-
-def create_worksheet():
-    # 1. Setup the Font
-    font_path = get_japanese_font()
-    
-    if font_path:
-        try:
-            # Register the downloaded TrueType Font
-            pdfmetrics.registerFont(TTFont('JapaneseFont', font_path))
-            jp_font_name = 'JapaneseFont'
-        except Exception as e:
-            print(f"Font Error: {e}")
-            print("Try deleting the .ttf file and running this script again.")
-            return
-    else:
-        print("Warning: Could not load Japanese font. Text will not display.")
-        jp_font_name = 'Helvetica'
-
-    # 2. Setup the Document
-    pdf_filename = "Genki_Honorifics_Worksheet.pdf"
-    doc = SimpleDocTemplate(
-        pdf_filename, 
-        pagesize=A4, 
-        rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72
-    )
-    
-    styles = getSampleStyleSheet()
-    
-    # Custom Styles
-    title_style = ParagraphStyle(
-        'TitleJP',
-        parent=styles['Heading1'],
-        fontName=jp_font_name,
-        fontSize=18,
-        spaceAfter=12,
-        alignment=1 # Center
-    )
-    
-    header_style = ParagraphStyle(
-        'HeaderJP',
-        parent=styles['Heading2'],
-        fontName=jp_font_name,
-        fontSize=14,
-        spaceBefore=12,
-        spaceAfter=6
-    )
-    
-    normal_style = ParagraphStyle(
-        'NormalJP',
-        parent=styles['Normal'],
-        fontName=jp_font_name,
-        fontSize=11,
-        leading=16, 
-        spaceAfter=10
-    )
-
-    story = []
-
-    # --- Content ---
-
-    story.append(Paragraph("Genki II - Chapter 19: Honorifics (Keigo)", title_style))
-    story.append(Paragraph("Name: __________________________   Date: ____________", normal_style))
-    story.append(Spacer(1, 12))
+
+# Shared helpers live in genki/ at the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from genki.fonts import japanese_font
+from genki.spec import make_styles, write_outputs
+from genki.keigo import drill_rows
+
+# --- FONT SETUP ---
+# Registered once per process; 'Helvetica' if the font can't be found
+jp_font_name = japanese_font("KleeOne-Regular.ttf")
+
+# --- STYLES ---
+# Kanji not taught by Lesson 19 get their readings automatically (genki/furigana.py)
+styles = make_styles(jp_font_name, header_color=colors.black, furigana=True, lesson=19)
+
+# --- CONTENT: worksheet and answer key from one spec ---
+honorifics_content = [
+    {'type': 'title', 'text': 'Genki II - Chapter 19: Honorifics (Keigo)', 'key_text': 'ANSWER KEY: Genki II - Chapter 19'},
+    {'type': 'name'},
+    {'type': 'spacer', 'height': 12},
 
     # Section 1
-    story.append(Paragraph("I. Special Honorific Verbs (尊敬語)", header_style))
-    story.append(Paragraph("Fill in the correct Special Honorific dictionary form.", normal_style))
-    
-    data1 = [
+    {'type': 'header', 'text': 'I. Special Honorific Verbs (尊敬語)'},
+    {'type': 'text', 'text': 'Fill in the correct Special Honorific dictionary form.', 'only': 'student'},
+    # Rows and answers conjugated from the verb list (genki/keigo.py)
+    {'type': 'drill', 'widths': [150, 100, 180], 'answer_col': 2, 'data': [
         ['Standard (辞書形)', 'Meaning', 'Honorific (尊敬語)'],
-        ['いく / くる / いる', 'to go/come/be', '__________________'],
-        ['たべる / のむ', 'to eat/drink', '__________________'],
-        ['する', 'to do', '__________________'],
-        ['いう', 'to say', '__________________'],
-        ['みる', 'to see', '__________________'],
-        ['寝る (ねる)', 'to sleep', '__________________'],
-    ]
-    
-    t1 = Table(data1, colWidths=[150, 100, 180])
-    t1.setStyle(TableStyle([
-        ('FONTNAME', (0,0), (-1,-1), jp_font_name),
-        ('GRID', (0,0), (-1,-1), 1, colors.black),
-        ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
-        ('PADDING', (0,0), (-1,-1), 6),
-    ]))
-    story.append(t1)
-    story.append(Spacer(1, 20))
+    ] + drill_rows([('行く', '来る', 'いる'), ('食べる', '飲む'), 'する', '言う', '見る', '寝る'],
+                   ['verbs', 'meaning', 'honorific'])},
 
     # Section 2
-    story.append(Paragraph("II. Dialogue: Teacher and Student", header_style))
-    story.append(Paragraph("Fill in the blanks using the appropriate Honorific form.", normal_style))
-    
-    dialogue_text = """
+    {'type': 'header', 'text': 'II. Dialogue: Teacher and Student'},
+    {'type': 'text', 'text': 'Fill in the blanks using the appropriate Honorific form.', 'only': 'student'},
+    {'type': 'blanks', 'text': """
     <b>Context:</b> A student sees their teacher at the station.<br/><br/>
     <b>Student:</b> 先生、こんにちは。どちらに (1) ________________________ か。<br/>
-    &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;(iku: honorific)<br/><br/>
+    (iku: honorific)<br/><br/>
     <b>Teacher:</b> ああ、田中さん。ちょっとデパートに (2) ________________________。<br/>
-    &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;(iku: polite)<br/><br/>
+    (iku: polite)<br/><br/>
     <b>Student:</b> そうですか。先生、もうお昼ご飯を (3) ________________________ か。<br/>
-    &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;(taberu: honorific)<br/><br/>
+    (taberu: honorific)<br/><br/>
     <b>Teacher:</b> いいえ、まだ (4) ________________________。忙しかったですから。<br/>
-    &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;(taberu: polite negative)<br/>
-    """
-    story.append(Paragraph(dialogue_text, normal_style))
-    story.append(Spacer(1, 10))
+    (taberu: polite negative)<br/>
+    """, 'answers': [
+        ('<b>いらっしゃいます</b> (or いらっしゃいました)', 'Subject is Teacher (Honorific)'),
+        ('<b>参ります</b> or <b>行きます</b>', 'Subject is Teacher talking about himself (Humble/Polite)'),
+        ('<b>召し上がりました</b>', 'Subject is Teacher (Honorific)'),
+        ('<b>食べていません</b> or <b>まだなんです</b>', 'Subject is Teacher talking about himself (Polite/Humble)'),
+    ]},
+    {'type': 'spacer', 'height': 10},
 
     # Section 3
-    story.append(Paragraph("III. Choose the Correct Sentence", header_style))
-    story.append(Paragraph("Circle the correct Honorific sentence for the <b>Teacher's</b> actions.", normal_style))
-
-    q1 = """
-    1. The teacher reads a book.<br/>
-    &nbsp;&nbsp;a) 先生は本を読みます。<br/>
-    &nbsp;&nbsp;b) 先生は本をお読みになります。<br/>
-    &nbsp;&nbsp;c) 先生は本をお読みします。<br/>
-    """
-    story.append(Paragraph(q1, normal_style))
-
-    
-    
-    # Section 4
-    story.append(Paragraph("IV. Honorific Nouns & Adjectives", header_style))
-    story.append(Paragraph("Add 'お (o)' or 'ご (go)' to the words below.", normal_style))
+    {'type': 'header', 'text': 'III. Choose the Correct Sentence'},
+    {'type': 'text', 'text': "Circle the correct Honorific sentence for the <b>Teacher's</b> actions.", 'only': 'student'},
+    {'type': 'choice', 'number': 1, 'prompt': 'The teacher reads a book.', 'answer': 1, 'choices': [
+        '先生は本を読みます。',
+        '先生は本をお読みになります。',
+        '先生は本をお読みします。',
+    ]},
 
-    data4 = [
+    # Section 4
+    {'type': 'header', 'text': 'IV. Honorific Nouns & Adjectives'},
+    {'type': 'text', 'text': "Add 'お (o)' or 'ご (go)' to the words below.", 'only': 'student'},
+    {'type': 'drill', 'widths': [150, 180], 'answer_col': 1, 'data': [
         ['Word', 'Polite Form'],
-        ['名前 (Name)', '__________________'],
-        ['忙しい (Busy)', '__________________'],
-        ['家族 (Family)', '__________________'],
-        ['電話 (Phone)', '__________________'],
-    ]
-    t4 = Table(data4, colWidths=[150, 180])
-    t4.setStyle(TableStyle([
-        ('FONTNAME', (0,0), (-1,-1), jp_font_name),
-        ('GRID', (0,0), (-1,-1), 1, colors.black),
-        ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
-        ('PADDING', (0,0), (-1,-1), 6),
-    ]))
-    story.append(t4)
-
-    # Build
-    doc.build(story)
-    print(f"PDF generated successfully: {pdf_filename}")
+        ['名前 (Name)', 'お名前'],
+        ['忙しい (Busy)', 'お忙しい'],
+        ['家族 (Family)', 'ご家族'],
+        ['電話 (Phone)', 'お電話'],
+    ]},
+]
+
+
+def create_worksheet(pdf_filename="Genki_Honorifics_Worksheet.pdf"):
+    write_outputs(honorifics_content, styles, {'student': pdf_filename})
+
+
+def create_answer_key(pdf_filename="Genki_Honorifics_AnswerKey.pdf"):
+    write_outputs(honorifics_content, styles, {'key': pdf_filename})
+
+
+def create_worksheet_with_key(pdf_filename="Genki_Honorifics_Worksheet_WithKey.pdf"):
+    write_outputs(honorifics_content, styles, {'combined': pdf_filename})
+
+
+# --- DOCUMENTS (output name -> function that writes it; used by genki/build.py) ---
+DOCUMENTS = {
+    "Genki_Honorifics_Worksheet.pdf": create_worksheet,
+    "Genki_Honorifics_AnswerKey.pdf": create_answer_key,
+    "Genki_Honorifics_Worksheet_WithKey.pdf": create_worksheet_with_key,
+}
 
 if __name__ == "__main__":
-    create_worksheet()
\ No newline at end of file
+    # One pass: the sheet, the key and the sheet-with-key share font, styles and flowables
+    write_outputs(honorifics_content, styles, {
+        'student': "Genki_Honorifics_Worksheet.pdf",
+        'key': "Genki_Honorifics_AnswerKey.pdf",
+        'combined': "Genki_Honorifics_Worksheet_WithKey.pdf",
+    })
@@ -1,156 +1,112 @@
 import os
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+import sys
 
-# --- FONT SETUP ---
-font_filename = "KleeOne-Regular.ttf"
-jp_font_name = 'JapaneseFont'
+# Shared helpers live in genki/ at the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from genki.fonts import japanese_font
+from genki.incremental import build_pdf
+from genki.spec import make_styles, iter_story, new_doc
+from genki.keigo import conjugate, conjugate_many, reading
 
-# Basic Font Registration Check
-if os.path.exists(font_filename):
-    try:
-        pdfmetrics.registerFont(TTFont(jp_font_name, font_filename))
-    except Exception as e:
-        print(f"Font Error: {e}")
-        jp_font_name = 'Helvetica'
-else:
-    print(f"Warning: {font_filename} not found. Japanese text will not display.")
-    jp_font_name = 'Helvetica'
+# --- FONT SETUP ---
+# Registered once per process; 'Helvetica' if the font can't be found
+jp_font_name = japanese_font("KleeOne-Regular.ttf")
 
 # --- STYLES ---
-styles = getSampleStyleSheet()
-title_style = ParagraphStyle('TitleJP', parent=styles['Heading1'], fontName=jp_font_name, fontSize=18, alignment=1, spaceAfter=12)
-header_style = ParagraphStyle('HeaderJP', parent=styles['Heading2'], fontName=jp_font_name, fontSize=14, spaceBefore=12, spaceAfter=6, textColor=colors.darkblue)
-normal_style = ParagraphStyle('NormalJP', parent=styles['Normal'], fontName=jp_font_name, fontSize=11, leading=16, spaceAfter=10)
-answer_style = ParagraphStyle('AnswerJP', parent=normal_style, textColor=colors.red)
+# Kanji not taught by Lesson 19 get their readings automatically (genki/furigana.py)
+styles = make_styles(jp_font_name, furigana=True, lesson=19)
+title_style = styles['title']
+header_style = styles['header']
+normal_style = styles['normal']
+answer_style = styles['answer']
 
 # --- HELPER FUNCTION ---
 def create_pdf(filename, content_data):
-    doc = SimpleDocTemplate(filename, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
-    story = []
-    
-    for item in content_data:
-        if item['type'] == 'title':
-            story.append(Paragraph(item['text'], title_style))
-        elif item['type'] == 'header':
-            story.append(Paragraph(item['text'], header_style))
-        elif item['type'] == 'text':
-            story.append(Paragraph(item['text'], normal_style))
-        elif item['type'] == 'table':
-            t = Table(item['data'], colWidths=item['widths'])
-            t.setStyle(TableStyle([
-                ('FONTNAME', (0,0), (-1,-1), jp_font_name),
-                ('GRID', (0,0), (-1,-1), 1, colors.black),
-                ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
-                ('PADDING', (0,0), (-1,-1), 6),
-                ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-            ]))
-            story.append(t)
-            story.append(Spacer(1, 12))
-        elif item['type'] == 'break':
-            story.append(PageBreak())
-        elif item['type'] == 'spacer':
-            story.append(Spacer(1, 15))
-
-    doc.build(story)
-    print(f"Generated: {filename}")
+    # Item types are rendered by genki/spec.py (shared with the honorifics worksheet):
+    # the sheet, then its answer key with every answer filled in
+    doc = new_doc(filename)
+    # The spec is turned into flowables lazily, as the build consumes them
+    # Skipped (and reported 'Up to date') by incremental builds when nothing changed
+    if build_pdf(doc, iter_story(content_data, styles, 'combined')) != "hit":
+        print(f"Generated: {filename}")
 
 # --- CONTENT: WORKSHEET 2 (Respectful Advice & Gratitude) ---
+# Drill phrases; the prompts and the answer key are conjugated from them (genki/keigo.py)
+advice_phrases = ['入る', '待つ', '切符を取る', '説明を読む', '家に帰る']
+gratitude_phrases = ['すいせんじょうを書く', '(駅まで) むかえに来る', '待つ', '(お金を) 貸す']
+
 ws2_content = [
     {'type': 'title', 'text': 'Genki II L19: Respectful Advice & Gratitude'},
     
     # Grammar 2: お + Verb Stem + ください
     {'type': 'header', 'text': 'I. Respectful Advice (お + Stem + ください)'},
-    {'type': 'text', 'text': 'Imagine you are a store clerk or station attendant. Change the following polite requests into Respectful Advice.'},
-    {'type': 'table', 'widths': [150, 200], 'data': [
+    {'type': 'text', 'text': 'Imagine you are a store clerk or station attendant. Change the following polite requests into Respectful Advice.', 'only': 'student'},
+    {'type': 'drill', 'widths': [150, 200], 'answer_col': 1, 'romaji': True, 'data': [
         ['Standard Polite (てください)', 'Respectful Advice (お〜ください)'],
-        ['入ってください (はいる)', '___________________________'],
-        ['待ってください (まつ)', '___________________________'],
-        ['切符を取ってください (とる)', '___________________________'],
-        ['説明を読んでください (よむ)', '___________________________'],
-        ['家に帰ってください (かえる)', '___________________________'],
-    ]},
+    ] + [[f"{conjugate(phrase, 'kudasai')} ({reading(phrase)})", conjugate(phrase, 'request')] for phrase in advice_phrases]},
     
     # Grammar 3: ～てくれてありがとう
     {'type': 'header', 'text': 'II. Expressing Gratitude (～てくれてありがとう)'},
-    {'type': 'text', 'text': 'You are talking to a friend. Express gratitude for the specific actions below.'},
-    {'type': 'text', 'text': '<b>Example:</b> Friend helped you. <br/>&nbsp;&rightarrow; 手伝ってくれてありがとう。 (Tetsudatte kurete arigatou.)'},
-    {'type': 'spacer'},
-    
-    {'type': 'text', 'text': '1. Your friend wrote a recommendation letter (すいせんじょう) for you.'},
-    {'type': 'text', 'text': '&nbsp;&nbsp;&nbsp;_________________________________________________________'},
-    
-    {'type': 'text', 'text': '2. Your friend came to pick you up (むかえにくる) at the station.'},
-    {'type': 'text', 'text': '&nbsp;&nbsp;&nbsp;_________________________________________________________'},
-    
-    {'type': 'text', 'text': '3. Your friend waited (まつ) for you for one hour.'},
-    {'type': 'text', 'text': '&nbsp;&nbsp;&nbsp;_________________________________________________________'},
-    
-    {'type': 'text', 'text': '4. Your friend lent (かす) you money.'},
-    {'type': 'text', 'text': '&nbsp;&nbsp;&nbsp;_________________________________________________________'},
+    {'type': 'text', 'text': 'You are talking to a friend. Express gratitude for the specific actions below.', 'only': 'student'},
+    {'type': 'text', 'text': '<b>Example:</b> Friend helped you. <br/>&nbsp;&rightarrow; 手伝ってくれてありがとう。', 'romaji': True, 'only': 'student'},
+    {'type': 'spacer', 'only': 'student'},
+    {'type': 'blanks', 'romaji': True, 'text': """
+    (1) Your friend wrote a recommendation letter (すいせんじょう) for you.<br/>
+    &nbsp;&nbsp;&nbsp;_________________________________________________________<br/><br/>
+    (2) Your friend came to pick you up (むかえにくる) at the station.<br/>
+    &nbsp;&nbsp;&nbsp;_________________________________________________________<br/><br/>
+    (3) Your friend waited (まつ) for you for one hour.<br/>
+    &nbsp;&nbsp;&nbsp;_________________________________________________________<br/><br/>
+    (4) Your friend lent (かす) you money.<br/>
+    &nbsp;&nbsp;&nbsp;_________________________________________________________
+    """, 'answers': [(f"{answer}。", None) for answer in conjugate_many(gratitude_phrases, 'kurete')]},
 
     # Translation Challenge
     {'type': 'header', 'text': 'III. Dialogue Translation'},
-    {'type': 'text', 'text': 'Translate the bracketed English into Japanese.'},
-    {'type': 'text', 'text': '<b>A:</b> This bag is heavy...'},
-    {'type': 'text', 'text': '<b>B:</b> I will carry it. (Use <i>Humble</i>: motsu -> o-mochi shimasu)'},
-    {'type': 'text', 'text': '<b>A:</b> Really? [Thank you for carrying it.]'},
-    
-    
-    # Answer Key Page
-    {'type': 'break'},
-    {'type': 'header', 'text': 'ANSWER KEY'},
-    {'type': 'text', 'text': '<b>I. Respectful Advice</b><br/>1. お入りください (O-hairi kudasai)<br/>2. お待ちください (O-machi kudasai)<br/>3. お取りください (O-tori kudasai)<br/>4. お読みください (O-yomi kudasai)<br/>5. お帰りください (O-kaeri kudasai)'},
-    {'type': 'text', 'text': '<b>II. Gratitude</b><br/>1. すいせんじょうを書いてくれてありがとう。<br/>2. (駅まで) むかえに来てくれてありがとう。<br/>3. 待ってくれてありがとう。<br/>4. (お金を) 貸してくれてありがとう。'},
-    {'type': 'text', 'text': '<b>III. Translation</b><br/>持ってくれてありがとう (Motte kurete arigatou)'},
+    {'type': 'text', 'text': 'Translate the bracketed English into Japanese.', 'only': 'student'},
+    {'type': 'blanks', 'romaji': True, 'text': """
+    <b>A:</b> This bag is heavy...<br/>
+    <b>B:</b> I will carry it. (Use <i>Humble</i>: motsu -> o-mochi shimasu)<br/>
+    <b>A:</b> Really? (1) [Thank you for carrying it.]
+    """, 'answers': [(conjugate('持つ', 'kurete'), None)]},
 ]
 
 # --- CONTENT: WORKSHEET 3 (Gladness & Expectations) ---
+# (situation, phrase, form) for each drill row and (phrase, forms) for each expectation,
+# conjugated into the answer key by genki/keigo.py
+glad_situations = [('I studied Japanese.', '勉強する', 'yokatta'), ('I did not catch a cold.', '風邪をひく', 'nakute_yokatta'),
+                   ('I went to the festival.', 'お祭りに行く', 'yokatta'), ('I did not give up.', 'あきらめる', 'nakute_yokatta')]
+expectation_answers = [('英語が話す', 'potential', 'hazu'), ('閉まる', 'teiru', 'hazu'), ('難しい', 'nai_hazu')]
+
 ws3_content = [
     {'type': 'title', 'text': 'Genki II L19: Reflections & Expectations'},
 
     # Grammar 4: ～てよかったです
     {'type': 'header', 'text': 'I. I am glad that... (～てよかったです)'},
-    {'type': 'text', 'text': 'Combine the situation with "yokatta desu". Pay attention to Positive (〜て) vs Negative (〜なくて).'},
-    {'type': 'table', 'widths': [200, 200], 'data': [
+    {'type': 'text', 'text': 'Combine the situation with "yokatta desu". Pay attention to Positive (〜て) vs Negative (〜なくて).', 'only': 'student'},
+    {'type': 'drill', 'widths': [200, 200], 'answer_col': 1, 'romaji': True, 'data': [
         ['Situation', 'Result ("I am glad that...")'],
-        ['I studied Japanese. (勉強する)', '___________________________'],
-        ['I did not catch a cold. (風邪をひく)', '___________________________'],
-        ['I went to the festival. (お祭りに行く)', '___________________________'],
-        ['I did not give up. (あきらめる)', '___________________________'],
-    ]},
+    ] + [[f"{situation} ({phrase})", f"{conjugate(phrase, form)}。"] for situation, phrase, form in glad_situations]},
     
     # Grammar 5: ～はずです
     {'type': 'header', 'text': 'II. Expectations (～はずです)'},
-    {'type': 'text', 'text': 'Finish the sentences based on logical expectation. <br/>(Remember: Nouns take <b>no</b> / Na-adj take <b>na</b> before hazu)'},
-    
-    {'type': 'text', 'text': '1. Tanaka-san lived in America for 10 years.'},
-    {'type': 'text', 'text': '&nbsp;&nbsp;&nbsp;He [should be able to speak English].'},
-    {'type': 'text', 'text': '&nbsp;&nbsp;&nbsp;田中さんは ___________________________________ です。'},
-    
-    {'type': 'text', 'text': '2. Today is a national holiday (祝日).'},
-    {'type': 'text', 'text': '&nbsp;&nbsp;&nbsp;The bank [should be closed (shimaru)].'},
-    {'type': 'text', 'text': '&nbsp;&nbsp;&nbsp;銀行は _______________________________________ です。'},
-
-    {'type': 'text', 'text': '3. Mary studied very hard.'},
-    {'type': 'text', 'text': '&nbsp;&nbsp;&nbsp;The exam [should not be difficult].'},
-    {'type': 'text', 'text': '&nbsp;&nbsp;&nbsp;試験は _______________________________________ です。'},
-    
-   
-
-    # Answer Key Page
-    {'type': 'break'},
-    {'type': 'header', 'text': 'ANSWER KEY'},
-    {'type': 'text', 'text': '<b>I. Glad that...</b><br/>1. 勉強してよかったです。<br/>2. 風邪をひかなくてよかったです。<br/>3. お祭りに行ってよかったです。<br/>4. あきらめなくてよかったです。'},
-    {'type': 'text', 'text': '<b>II. Expectations</b><br/>1. 英語が話せるはずです (Eigo ga hanaseru hazu desu)<br/>2. 閉まっているはずです (Shimatteiru hazu desu)<br/>3. 難しくないはずです (Muzukashikunai hazu desu)'},
-  
+    {'type': 'text', 'text': 'Finish the sentences based on logical expectation. <br/>(Remember: Nouns take <b>no</b> / Na-adj take <b>na</b> before hazu)', 'only': 'student'},
+    {'type': 'blanks', 'romaji': True, 'text': """
+    (1) Tanaka-san lived in America for 10 years. He [should be able to speak English].<br/>
+    &nbsp;&nbsp;&nbsp;田中さんは ___________________________________ です。<br/><br/>
+    (2) Today is a national holiday (祝日). The bank [should be closed (shimaru)].<br/>
+    &nbsp;&nbsp;&nbsp;銀行は _______________________________________ です。<br/><br/>
+    (3) Mary studied very hard. The exam [should not be difficult].<br/>
+    &nbsp;&nbsp;&nbsp;試験は _______________________________________ です。
+    """, 'answers': [(conjugate(*answer), None) for answer in expectation_answers]},
 ]
 
+# --- DOCUMENTS (output name -> function that writes it; used by genki/build.py) ---
+DOCUMENTS = {
+    "Genki_L19_Worksheet_Interact.pdf": lambda filename: create_pdf(filename, ws2_content),
+    "Genki_L19_Worksheet_Reflect.pdf": lambda filename: create_pdf(filename, ws3_content),
+}
+
 # --- GENERATE FILES ---
 if __name__ == "__main__":
     create_pdf("Genki_L19_Worksheet_Interact.pdf", ws2_content)
@@ -1,165 +1,98 @@
 import os
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+import sys
+
+# Shared helpers live in genki/ at the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from genki.fonts import japanese_font
+from genki.spec import make_styles, write_outputs
+from genki.keigo import drill_rows, meaning
 
 # --- FONT SETUP ---
-font_filename = "KleeOne-Regular.ttf"
-jp_font_name = 'JapaneseFont'
-
-if os.path.exists(font_filename):
-    try:
-        pdfmetrics.registerFont(TTFont(jp_font_name, font_filename))
-    except Exception as e:
-        print(f"Font Error: {e}")
-        jp_font_name = 'Helvetica'
-else:
-    print(f"Warning: {font_filename} not found. Please ensure the font file is in the folder.")
-    jp_font_name = 'Helvetica'
+# Registered once per process; 'Helvetica' if the font can't be found
+jp_font_name = japanese_font("KleeOne-Regular.ttf")
 
 # --- STYLES ---
-styles = getSampleStyleSheet()
-title_style = ParagraphStyle('TitleJP', parent=styles['Heading1'], fontName=jp_font_name, fontSize=18, alignment=1, spaceAfter=12)
-header_style = ParagraphStyle('HeaderJP', parent=styles['Heading2'], fontName=jp_font_name, fontSize=14, spaceBefore=12, spaceAfter=6, textColor=colors.darkblue)
-
-
-# Normal text (sentences)
-normal_style = ParagraphStyle('NormalJP', parent=styles['Normal'], fontName=jp_font_name, fontSize=11, leading=18, spaceAfter=10)
+# Normal text (sentences) gets a taller leading to leave room for readings,
+# which are filled in automatically for kanji not taught by Lesson 20 (genki/furigana.py)
+styles = make_styles(jp_font_name, leading=18, furigana=True, lesson=20)
 
-# Table text (Centered, usually for drill columns)
-table_text_style = ParagraphStyle('TableText', parent=normal_style, alignment=1, leading=14)
-
-def create_worksheet():
-    filename = "Genki_L20_ExtraModest_Furigana.pdf"
-    doc = SimpleDocTemplate(filename, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
-    story = []
-
-    # --- TITLE ---
-    story.append(Paragraph("Genki II - Lesson 20: Extra-modest Expressions", title_style))
-    story.append(Paragraph("Name: __________________________   Date: ____________", normal_style))
-    story.append(Spacer(1, 12))
+# --- CONTENT: worksheet with its answer key on the last page ---
+extra_modest_content = [
+    {'type': 'title', 'text': 'Genki II - Lesson 20: Extra-modest Expressions', 'key_text': 'ANSWER KEY: Lesson 20 Extra-modest'},
+    {'type': 'name'},
+    {'type': 'spacer', 'height': 12, 'only': 'student'},
 
     # --- SECTION 1: CONVERSION TABLE ---
-    story.append(Paragraph("I. Verbs to Extra-modest Expressions (謙譲語・丁重語)", header_style))
-    story.append(Paragraph("Convert the verbs into their Extra-modest 'masu' forms.", normal_style))
-
-    # Note: We use <br/> to put the reading on the next line (Below the Kanji)
-    data1 = [
+    {'type': 'header', 'text': 'I. Verbs to Extra-modest Expressions (謙譲語・丁重語)'},
+    {'type': 'text', 'text': "Convert the verbs into their Extra-modest 'masu' forms.", 'only': 'student'},
+    # Table text is centered, usually for drill columns
+    # Rows and answers conjugated from the verb list (genki/keigo.py)
+    {'type': 'drill', 'widths': [150, 180, 100], 'answer_col': 1, 'cells': 'paragraph', 'padding': 8, 'data': [
         ['Standard Verb\n(辞書形)', 'Extra-modest\n(〜ます)', 'Meaning'],
-        ['いる', '__________________', '(to be)'],
-        ['行く / 来る\n', '__________________', '(to go/come)'],
-        ['言う\n', '__________________', '(to say)'],
-        ['する', '__________________', '(to do)'],
-        ['食べる / 飲む\n', '__________________', '(to eat/drink)'],
-        ['ある', '__________________', '(to exist)',],
-        ['〜ている', '__________________', '(is doing...)'],
-        ['〜です', '__________________', '(is...)'],
-    ]
-
-    # Convert text strings to Paragraphs for formatting
-    table_data = []
-    for row in data1:
-        processed_row = [Paragraph(cell, table_text_style) for cell in row]
-        table_data.append(processed_row)
-
-    t1 = Table(table_data, colWidths=[150, 180, 100])
-    t1.setStyle(TableStyle([
-        ('GRID', (0,0), (-1,-1), 1, colors.black),
-        ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
-        ('PADDING', (0,0), (-1,-1), 8),
-        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-    ]))
-    story.append(t1)
-    story.append(Spacer(1, 20))
+    ] + drill_rows(['いる', ('行く', '来る'), '言う', 'する', ('食べる', '飲む'), 'ある', '〜ている', '〜です'],
+                   ['verbs', ('extra_modest', 'masu'), lambda verbs: f"({meaning(verbs)})"])},
+    {'type': 'spacer', 'height': 8},
 
     # --- SECTION 2: Q&A TRANSFORMATION ---
-    story.append(Paragraph("II. Q&A: Honorific vs. Extra-modest", header_style))
-    story.append(Paragraph("Read the Question (Honorific). Fill in the Answer using the <b>Extra-modest</b> form.", normal_style))
-    story.append(Spacer(1, 6))
-
-    # Q1
-    story.append(Paragraph("<b>Q1:</b> お名前は何とおっしゃいますか。", normal_style))
-    story.append(Paragraph("<b>A:</b> 田中と _____________________________ 。(say)", normal_style))
-    story.append(Spacer(1, 8))
-
-    # Q2
-    story.append(Paragraph("<b>Q2:</b> どちらにいらっしゃいますか。", normal_style))
-    story.append(Paragraph("<b>A:</b> 駅 (えき) に _____________________________ 。(go)", normal_style))
-    story.append(Spacer(1, 8))
-
-    # Q3
-    story.append(Paragraph("<b>Q3:</b> トイレはどちらにありますか。", normal_style))
-    story.append(Paragraph("<b>A:</b> あちらに _____________________________ 。(exist)", normal_style))
-    story.append(Spacer(1, 8))
-
-    # Q4
-    story.append(Paragraph("<b>Q4:</b> 学生さんでいらっしゃいますか。", normal_style))
-    story.append(Paragraph("<b>A:</b> はい、学生_____________________________ 。(is)", normal_style))
-    story.append(Spacer(1, 20))
+    {'type': 'header', 'text': 'II. Q&A: Honorific vs. Extra-modest'},
+    {'type': 'text', 'text': 'Read the Question (Honorific). Fill in the Answer using the <b>Extra-modest</b> form.', 'only': 'student'},
+    {'type': 'spacer', 'height': 6, 'only': 'student'},
+
+    {'type': 'text', 'text': '<b>Q1:</b> お名前は何とおっしゃいますか。', 'only': 'student'},
+    {'type': 'blanks', 'start': 1, 'text': '<b>A:</b> 田中と _____________________________ 。(say)',
+     'answers': [('田中と<b>{申|もう}します</b>。', None)]},
+    {'type': 'spacer', 'height': 8, 'only': 'student'},
+
+    {'type': 'text', 'text': '<b>Q2:</b> どちらにいらっしゃいますか。', 'only': 'student'},
+    {'type': 'blanks', 'start': 2, 'text': '<b>A:</b> {駅|えき}に _____________________________ 。(go)',
+     'answers': [('駅へ<b>{参|まい}ります</b>。', None)]},
+    {'type': 'spacer', 'height': 8, 'only': 'student'},
+
+    {'type': 'text', 'text': '<b>Q3:</b> トイレはどちらにありますか。', 'only': 'student'},
+    {'type': 'blanks', 'start': 3, 'text': '<b>A:</b> あちらに _____________________________ 。(exist)',
+     'answers': [('あちらに<b>ございます</b>。', None)]},
+    {'type': 'spacer', 'height': 8, 'only': 'student'},
+
+    {'type': 'text', 'text': '<b>Q4:</b> 学生さんでいらっしゃいますか。', 'only': 'student'},
+    {'type': 'blanks', 'start': 4, 'text': '<b>A:</b> はい、学生_____________________________ 。(is)',
+     'answers': [('はい、学生<b>でございます</b>。', None)]},
+    {'type': 'spacer', 'height': 20, 'only': 'student'},
 
     # --- SECTION 3: BUSINESS DIALOGUE ---
-    story.append(Paragraph("III. Business Dialogue: Honorific or Modest?", header_style))
-    story.append(Paragraph("Circle the correct verb. Remember: Raise the customer up (Honorific), lower yourself down (Modest).", normal_style))
-    story.append(Spacer(1, 6))
-
-    dialogue = """
+    {'type': 'header', 'text': 'III. Business Dialogue: Honorific or Modest?'},
+    {'type': 'text', 'text': 'Circle the correct verb. Remember: Raise the customer up (Honorific), lower yourself down (Modest).', 'only': 'student'},
+    {'type': 'spacer', 'height': 6, 'only': 'student'},
+    {'type': 'circle', 'text': """
     <b>Situation:</b> Mr. Miller (Customer) visits a Japanese company.<br/><br/>
     <b>Receptionist:</b> いらっしゃいませ。<br/><br/>
-    <b>Miller:</b> あの、私はミラーと ( a. おっしゃいます / b. 申 (もう) します )。<br/>
-    &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;2時に山下先生に会うやくそくが<br/>
-    &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;( a. ございます / b. あります )。<br/><br/>
-    <b>Receptionist:</b> ああ、ミラー様( a. でございます / b. でいらっしゃいます ) ね。<br/>
-    &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;お待ちして ( a. いました / b.おりました )。<br/><br/>
-    <b>Miller:</b> よろしく ( a. お願 (ねが) いいたします / b. お願 (ねが) いなさいます )。<br/><br/>
+    <b>Miller:</b> あの、私はミラーと {{1}}。<br/>
+    2時に山下先生に会うやくそくが<br/>
+    {{2}}。<br/><br/>
+    <b>Receptionist:</b> ああ、ミラー様{{3}} ね。<br/>
+    お待ちして {{4}}。<br/><br/>
+    <b>Miller:</b> よろしく {{5}}。<br/><br/>
     <b>Receptionist:</b> どうぞ、こちらへ。<br/>
-    &nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;ごあんない ( a. いたします / b. なさいます )。
-    """
-    story.append(Paragraph(dialogue, normal_style))
-
-    # --- ANSWER KEY PAGE ---
-    story.append(PageBreak())
-    story.append(Paragraph("ANSWER KEY: Lesson 20 Extra-modest", title_style))
-    
-    story.append(Paragraph("<b>I. Table</b>", header_style))
-    ans_table = """
-    いる &rarr; <b>おります</b><br/>
-    行く / 来る &rarr; <b>参 (まい) ります</b><br/>
-    言う &rarr; <b>申 (もう) します</b><br/>
-    する &rarr; <b>いたします</b><br/>
-    食べる / 飲む &rarr; <b>いただきます</b><br/>
-    ある &rarr; <b>ございます</b><br/>
-    〜ている &rarr; <b>〜ております</b><br/>
-    〜です &rarr; <b>〜でございます</b>
-    """
-    story.append(Paragraph(ans_table, normal_style))
-
-    story.append(Paragraph("<b>II. Q&A</b>", header_style))
-    ans_qa = """
-    1. 田中と<b>申 (もう) します</b>。<br/>
-    2. 駅へ<b>参 (まい) ります</b>。<br/>
-    3. あちらに<b>ございます</b>。<br/>
-    4. はい、学生<b>でございます</b>。
-    """
-    story.append(Paragraph(ans_qa, normal_style))
-
-    story.append(Paragraph("<b>III. Dialogue</b>", header_style))
-    ans_dialogue = """
-    1. <b>(b) 申します</b><br/>
-    2. <b>(a) ございます</b><br/>
-    3. <b>(b) でいらっしゃいます</b><br/>
-    4. <b>(b) おりました</b><br/>
-    5. <b>(a) お願いいたします</b><br/>
-    6. <b>(a) いたします</b>
-    """
-    story.append(Paragraph(ans_dialogue, normal_style))
-
-    # Build PDF
-    doc.build(story)
-    print(f"Generated successfully: {filename}")
+    ごあんない {{6}}。
+    """, 'choices': [
+        ['おっしゃいます', '{申|もう}します'],
+        ['ございます', 'あります'],
+        ['でございます', 'でいらっしゃいます'],
+        ['いました', 'おりました'],
+        ['お{願|ねが}いいたします', 'お{願|ねが}いなさいます'],
+        ['いたします', 'なさいます'],
+    ], 'answers': [1, 0, 1, 1, 0, 0]},
+]
+
+
+def create_worksheet(filename="Genki_L20_ExtraModest_Furigana.pdf"):
+    # Worksheet pages followed by the answer key page
+    write_outputs(extra_modest_content, styles, {'combined': filename})
+
+
+# --- DOCUMENTS (output name -> function that writes it; used by genki/build.py) ---
+DOCUMENTS = {
+    "Genki_L20_ExtraModest_Furigana.pdf": create_worksheet,
+}
 
 if __name__ == "__main__":
-    create_worksheet()
\ No newline at end of file
+    create_worksheet()
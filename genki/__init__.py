@@ -0,0 +1,9 @@
+"""
+Shared helpers for the Genki worksheet scripts in the Lesson NN/ folders.
+"""
+import os
+
+# Opt-in build profiling (see genki/phases.py); nothing is loaded without it
+if os.environ.get("GENKI_PROFILE"):
+    from genki import phases
+    phases._start_from_environment()
@@ -0,0 +1,413 @@
+"""
+Item bank: the sections of every worksheet spec in one SQLite file, indexed
+by lesson, grammar point, item type and difficulty, so new sheets can be
+assembled by query instead of copy-pasting spec lists between lessons.
+
+A bank item is one section of a spec (genki/spec.py): its header and the
+items under it, with its answers. A spec that puts its key in a trailing
+"ANSWER KEY" section of text items has each '<b>II. ...</b>' entry moved
+back under section II as an 'answer' item, so every bank item renders its
+own key. Scripts that build flowables directly
+(worksheet_story()) have no spec and are not imported.
+
+Each item is tagged on import; a spec item can set any of these itself
+('lesson', 'grammar' (a tag or a list), 'difficulty'), otherwise:
+
+    lesson      the script's Lesson NN folder
+    grammar     tags from the GRAMMAR patterns found in its text, plus
+                'keigo' for the honorific/humble ones
+    difficulty  1 recognition (drill, choice), 2 fill-in (blanks, circle,
+                table), 3 free production (everything else)
+
+Selection is one query: the indexes narrow the matches, a seeded ordering
+of their ids picks the sample inside SQLite, and only the chosen bodies are
+read. Every assembled sheet is recorded, so --fresh N leaves out items used
+on the last N sheets.
+
+    python -m genki.bank import                       # (re)import every spec
+    python -m genki.bank list --lesson 19-20 --grammar keigo
+    python -m genki.bank assemble --lesson 19-20 --grammar keigo --count 10 --fresh 3 --out review.pdf
+    python -m genki.bank bench --items 50000          # query times on a bank that size
+
+The bank lives in build/item_bank.sqlite; set GENKI_BANK to use another file.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL UNIQUE,     -- script:spec#section
+    lesson INTEGER,
+    type TEXT NOT NULL,
+    difficulty INTEGER NOT NULL,
+    title TEXT NOT NULL,             -- header text, without its numeral
+    body TEXT NOT NULL               -- the section's spec items, as JSON
+);
+CREATE INDEX IF NOT EXISTS items_query ON items (lesson, type, difficulty);
+CREATE TABLE IF NOT EXISTS tags (
+    tag TEXT NOT NULL,
+    lesson INTEGER NOT NULL,         -- the item's (0 if none), so tag + lessons is one index range
+    item INTEGER NOT NULL REFERENCES items (id) ON DELETE CASCADE,
+    PRIMARY KEY (tag, lesson, item)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tags_item ON tags (item);
+CREATE TABLE IF NOT EXISTS sheets (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    query TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sheet_items (
+    sheet INTEGER NOT NULL REFERENCES sheets (id) ON DELETE CASCADE,
+    item INTEGER NOT NULL,
+    PRIMARY KEY (sheet, item)
+) WITHOUT ROWID;
+"""
+
+# Grammar point -> pattern found in a section's text
+GRAMMAR = {
+    '尊敬語': r'尊敬語|[Hh]onorific|いらっしゃ|召し上が|おっしゃ|お\S+になります',
+    '謙譲語': r'謙譲語|丁重語|[Hh]umble|[Ee]xtra-[Mm]odest|参ります|申します|いたします|でございます',
+    'お〜ください': r'お〜ください|お \+ Stem \+ ください',
+    'お/ご': r"'お \(o\)' or 'ご \(go\)'",
+    'てくれて': r'てくれて',
+    'てよかった': r'てよかった|yokatta',
+    'はず': r'はず|hazu',
+}
+KEIGO = ('尊敬語', '謙譲語', 'お〜ください', 'お/ご')
+_GRAMMAR_RES = {tag: re.compile(pattern) for tag, pattern in GRAMMAR.items()}
+
+# Main item type of a section: the first of these it has
+TYPES = ('drill', 'choice', 'circle', 'blanks', 'table', 'answer', 'text')
+DIFFICULTY = {'drill': 1, 'choice': 1, 'circle': 2, 'blanks': 2, 'table': 2}
+
+_NUMERAL_RE = re.compile(r'^\s*([IVX]+)\.\s*')
+_KEY_HEADING_RE = re.compile(r'^\s*<b>\s*([IVX]+)\.[^<]*</b>\s*(?:<br/>)?')
+_ROMAN = [(10, 'X'), (9, 'IX'), (5, 'V'), (4, 'IV'), (1, 'I')]
+_PRIME = 2147483647
+
+
+def bank_path():
+    """The item bank file. Override with the GENKI_BANK environment variable."""
+    return os.environ.get("GENKI_BANK", os.path.join(REPO_ROOT, "build", "item_bank.sqlite"))
+
+
+def connect(path=None):
+    """Opens (and if needed creates) the item bank."""
+    path = path or bank_path()
+    if path != ':memory:':
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def roman(n):
+    out = ""
+    for value, numeral in _ROMAN:
+        while n >= value:
+            out += numeral
+            n -= value
+    return out
+
+
+# --- IMPORTING ---
+
+def _texts(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from _texts(v)
+
+
+def sections(content):
+    """
+    (numeral or None, items) for each header of a spec and the items under
+    it. Titles, name lines and page breaks are left out, and the entries of
+    an "ANSWER KEY" section become 'answer' items of the sections they answer.
+    """
+    found, by_numeral = [], {}
+    current = None
+    in_key = False
+    for item in content:
+        kind = item['type']
+        if kind in ('title', 'name', 'break'):
+            current = None
+            continue
+        if kind == 'header':
+            in_key = item['text'].strip().upper().startswith('ANSWER KEY')
+            if in_key:
+                current = None
+                continue
+            m = _NUMERAL_RE.match(item['text'])
+            current = [dict(item)]
+            found.append((m.group(1) if m else None, current))
+            if m:
+                by_numeral[m.group(1)] = current
+            continue
+        if in_key and kind == 'text':
+            m = _KEY_HEADING_RE.match(item['text'])
+            if m and m.group(1) in by_numeral:
+                answer = dict(item, type='answer', text=item['text'][m.end():])
+                by_numeral[m.group(1)].append(answer)
+                continue
+        if current is not None and not (kind == 'spacer' and current[-1]['type'] == 'header'):
+            current.append(dict(item))
+    return found
+
+
+def describe(items, lesson=None):
+    """(lesson, type, difficulty, tags) for a section's items, from their own keys or guessed."""
+    for item in items:
+        lesson = item.get('lesson', lesson)
+    kinds = {item['type'] for item in items}
+    kind = next((t for t in TYPES if t in kinds), 'text')
+    difficulty = next((item['difficulty'] for item in items if 'difficulty' in item), DIFFICULTY.get(kind, 3))
+
+    tags = []
+    for item in items:
+        given = item.get('grammar')
+        if given:
+            tags.extend([given] if isinstance(given, str) else given)
+    if not tags:
+        text = "\n".join(t for item in items for key, value in item.items()
+                         if key not in ('type', 'only', 'cells') for t in _texts(value))
+        tags = [tag for tag, pattern in _GRAMMAR_RES.items() if pattern.search(text)]
+    if any(tag in KEIGO for tag in tags):
+        tags.append('keigo')
+    return lesson, kind, difficulty, list(dict.fromkeys(tags))
+
+
+def add_item(conn, source, items, lesson=None):
+    """Adds or replaces one bank item (a section's spec items); returns its id."""
+    lesson, kind, difficulty, tags = describe(items, lesson)
+    title = _NUMERAL_RE.sub('', items[0]['text']) if items[0]['type'] == 'header' else ''
+    body = json.dumps(items, ensure_ascii=False)
+    conn.execute("""
+        INSERT INTO items (source, lesson, type, difficulty, title, body) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (source) DO UPDATE SET lesson = excluded.lesson, type = excluded.type,
+            difficulty = excluded.difficulty, title = excluded.title, body = excluded.body
+    """, (source, lesson, kind, difficulty, title, body))
+    item_id = conn.execute("SELECT id FROM items WHERE source = ?", (source,)).fetchone()[0]
+    conn.execute("DELETE FROM tags WHERE item = ?", (item_id,))
+    conn.executemany("INSERT INTO tags (tag, lesson, item) VALUES (?, ?, ?)",
+                     [(tag, lesson or 0, item_id) for tag in tags])
+    return item_id
+
+
+def import_specs(conn, lessons=None):
+    """Imports every *_content spec of the worksheet scripts; returns (specs, items) counts."""
+    from genki.build import discover, load_script
+    from genki.kanji import script_lesson
+    from genki.variants import spec_names
+
+    scripts = []
+    for script, _ in discover(lessons):
+        if script not in scripts:
+            scripts.append(script)
+    specs = items = 0
+    with conn:
+        for script in scripts:
+            module = load_script(script)
+            rel = os.path.relpath(script, REPO_ROOT)
+            for name in spec_names(script):
+                specs += 1
+                for n, (_, section) in enumerate(sections(getattr(module, name)), 1):
+                    add_item(conn, f"{rel}:{name}#{n}", section, script_lesson(script))
+                    items += 1
+    return specs, items
+
+
+# --- SELECTING ---
+
+def _where(lessons=None, grammar=None, types=None, difficulty=None, fresh=0):
+    clauses, params = [], []
+    if grammar and lessons:
+        clauses.append("id IN (SELECT item FROM tags WHERE tag = ? AND lesson BETWEEN ? AND ?)")
+        params.extend((grammar,) + tuple(lessons))
+    elif grammar:
+        clauses.append("id IN (SELECT item FROM tags WHERE tag = ?)")
+        params.append(grammar)
+    elif lessons:
+        clauses.append("lesson BETWEEN ? AND ?")
+        params.extend(lessons)
+    if types:
+        clauses.append(f"type IN ({', '.join('?' * len(types))})")
+        params.extend(types)
+    if difficulty:
+        clauses.append("difficulty BETWEEN ? AND ?")
+        params.extend(difficulty)
+    if fresh:
+        clauses.append("id NOT IN (SELECT item FROM sheet_items WHERE sheet IN "
+                       "(SELECT id FROM sheets ORDER BY id DESC LIMIT ?))")
+        params.append(fresh)
+    return " AND ".join(clauses) or "1", params
+
+
+def select(conn, **query):
+    """
+    Ids of the items matching a query: lessons and difficulty are (low, high)
+    ranges, grammar a tag, types a list of item types, fresh the number of
+    recent sheets whose items are left out.
+    """
+    where, params = _where(**query)
+    return [row[0] for row in conn.execute(f"SELECT id FROM items WHERE {where}", params)]
+
+
+def assemble(conn, count, title="Review Worksheet", seed=None, record=True, **query):
+    """
+    A worksheet spec of count items picked at random (seeded) from those
+    matching the query, in lesson order with their headers renumbered, and
+    the ids used. With record=True the sheet is remembered for later
+    fresh= queries.
+    """
+    # The seed picks a permutation of the ids (id * a + b mod a prime), so the
+    # sample is taken by SQLite's top-count sort without fetching every match
+    rng = random.Random(seed)
+    shuffle = (rng.randrange(1, _PRIME), rng.randrange(_PRIME))
+    where, params = _where(**query)
+    rows = conn.execute(f"""
+        SELECT id, lesson, body FROM items WHERE id IN
+            (SELECT id FROM items WHERE {where} ORDER BY (id * ? + ?) % {_PRIME} LIMIT ?)
+        ORDER BY lesson, id
+    """, params + list(shuffle) + [count]).fetchall()
+
+    spec = [{'type': 'title', 'text': title, 'key_text': 'ANSWER KEY: ' + title}, {'type': 'name'},
+            {'type': 'spacer', 'height': 12}]
+    for n, (_, _, body) in enumerate(rows, 1):
+        items = json.loads(body)
+        if items[0]['type'] == 'header':
+            items[0]['text'] = f"{roman(n)}. {_NUMERAL_RE.sub('', items[0]['text'])}"
+        spec.extend(items)
+    if record and rows:
+        with conn:
+            sheet = conn.execute("INSERT INTO sheets (created, query) VALUES (?, ?)",
+                                 (time.time(), json.dumps(dict(query, count=count, seed=seed)))).lastrowid
+            conn.executemany("INSERT INTO sheet_items (sheet, item) VALUES (?, ?)", [(sheet, row[0]) for row in rows])
+    return spec, [row[0] for row in rows]
+
+
+# --- COMMAND LINE ---
+
+def _range(text):
+    low, _, high = text.partition('-')
+    return int(low), int(high or low)
+
+
+def _add_query_args(parser):
+    parser.add_argument("--lesson", type=_range, metavar="N[-M]", help="Lesson or range of lessons")
+    parser.add_argument("--grammar", help=f"Grammar tag ({', '.join(list(GRAMMAR) + ['keigo'])})")
+    parser.add_argument("--type", action="append", choices=TYPES, help="Main item type (repeatable)")
+    parser.add_argument("--difficulty", type=_range, metavar="N[-M]", help="1 recognition .. 3 production")
+    parser.add_argument("--fresh", type=int, default=0, metavar="N", help="Skip items used on the last N sheets")
+
+
+def _query(args):
+    return dict(lessons=args.lesson, grammar=args.grammar, types=args.type, difficulty=args.difficulty, fresh=args.fresh)
+
+
+def _bench(items):
+    """Query times on an in-memory bank of about items items, cloned from the imported specs."""
+    conn = connect(':memory:')
+    import_specs(conn)
+    base = conn.execute("SELECT source, body FROM items").fetchall()
+    rng = random.Random(0)
+    start = time.perf_counter()
+    with conn:
+        for n in range(items - len(base)):
+            source, body = base[n % len(base)]
+            add_item(conn, f"bench:{n}:{source}", json.loads(body), rng.randint(1, 23))
+    print(f"{items} items built in {time.perf_counter() - start:.1f}s")
+    for n in range(5):
+        assemble(conn, 10, seed=n, lessons=(19, 20), grammar='keigo')
+    queries = [
+        ("L19-20 keigo, 10 items, fresh 3", dict(lessons=(19, 20), grammar='keigo', fresh=3)),
+        ("はず, any lesson", dict(grammar='はず')),
+        ("L1-23 drill/choice, difficulty 1", dict(lessons=(1, 23), types=['drill', 'choice'], difficulty=(1, 1))),
+        ("everything", {}),
+    ]
+    for label, query in queries:
+        runs = 20
+        start = time.perf_counter()
+        for seed in range(runs):
+            spec, ids = assemble(conn, 10, seed=seed, record=False, **query)
+        seconds = (time.perf_counter() - start) / runs
+        print(f"  {label:36} {len(select(conn, **query)):6} match  {seconds * 1000:6.2f}ms per sheet")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import worksheet sections into the item bank and assemble sheets from it.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("import", help="Import the *_content specs of the worksheet scripts")
+    run.add_argument("lessons", nargs="*", help="Lesson folders (default: all)")
+    show = sub.add_parser("list", help="Items matching a query")
+    _add_query_args(show)
+    make = sub.add_parser("assemble", help="Build a worksheet from items matching a query")
+    _add_query_args(make)
+    make.add_argument("--count", type=int, default=10, help="Number of items (default 10)")
+    make.add_argument("--title", default="Review Worksheet")
+    make.add_argument("--seed", type=int, help="Seed for the selection (default: random)")
+    make.add_argument("--out", default="Genki_Bank_Worksheet.pdf", help="Output PDF (the key goes next to it)")
+    make.add_argument("--dry-run", action="store_true", help="Print the chosen items without writing or recording")
+    bench = sub.add_parser("bench", help="Time queries on a large bank")
+    bench.add_argument("--items", type=int, default=50000)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        _bench(args.items)
+        return 0
+
+    conn = connect()
+    if args.command == "import":
+        start = time.perf_counter()
+        specs, items = import_specs(conn, args.lessons)
+        print(f"Imported {items} items from {specs} specs into {bank_path()} ({time.perf_counter() - start:.2f}s)")
+        return 0
+
+    if args.command == "list":
+        where, params = _where(**_query(args))
+        rows = conn.execute(f"SELECT id, lesson, type, difficulty, title, source FROM items WHERE {where} "
+                            "ORDER BY lesson, id", params).fetchall()
+        for item_id, lesson, kind, difficulty, title, source in rows:
+            tags = [row[0] for row in conn.execute("SELECT tag FROM tags WHERE item = ?", (item_id,))]
+            print(f"{item_id:5}  L{lesson}  {kind:7} {difficulty}  {title}  [{', '.join(tags)}]  {source}")
+        print(f"{len(rows)} items")
+        return 0
+
+    start = time.perf_counter()
+    spec, ids = assemble(conn, args.count, args.title, args.seed, record=not args.dry_run, **_query(args))
+    seconds = time.perf_counter() - start
+    if not ids:
+        print("No items match.")
+        return 1
+    print(f"Selected {len(ids)} items in {seconds * 1000:.1f}ms: {', '.join(map(str, ids))}")
+    if args.dry_run:
+        for item in spec:
+            if item['type'] == 'header':
+                print("  " + item['text'])
+        return 0
+
+    from genki.fonts import japanese_font
+    from genki.spec import make_styles, write_outputs
+
+    font_name = japanese_font()
+    lesson = max((row[0] for row in conn.execute(
+        f"SELECT lesson FROM items WHERE id IN ({', '.join('?' * len(ids))})", ids) if row[0]), default=None)
+    styles = make_styles(font_name, furigana=True, lesson=lesson)
+    stem = os.path.splitext(args.out)[0]
+    write_outputs(spec, styles, {'student': args.out, 'key': f"{stem}_key.pdf"})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""
+Benchmarks for the worksheet generators.
+
+Every document in the lessons' DOCUMENTS dicts (see genki/build.py) is a
+case, plus synthetic scale-ups of each spec: its tables and drills get 10x /
+100x the rows and its dialogue passages are repeated 10x / 100x. Each case
+runs in a fresh process:
+
+  * cold: importing the script (reportlab, font registration, styles) and
+    the first render, repeated over --cold separate processes
+  * warm: --warm more renders in the same process once everything is loaded
+
+For every case the report has wall times, the doc.build() share of them
+(the rest is story assembly), peak RSS, output bytes and pages/s. Results
+are written as JSON; pass an earlier file to --compare to see the change.
+
+    python -m genki.bench
+    python -m genki.bench --scale 10 100 --cold 5 --warm 20 --json build/bench/before.json
+    python -m genki.bench --no-font-cache --compare build/bench/before.json
+"""
+import io
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# --- SYNTHETIC SCALE-UPS ---
+
+def scale_spec(content, factor):
+    """
+    Copy of a spec with every 'table'/'drill' holding factor times the rows
+    and every 'blanks'/'circle' passage repeated factor times in one item, so
+    long dialogue blocks have to split across pages.
+    """
+    out = []
+    for item in content:
+        kind = item['type']
+        if kind in ('table', 'drill'):
+            item = dict(item, data=[item['data'][0]] + list(item['data'][1:]) * factor)
+        elif kind == 'blanks':
+            item = dict(item, text="<br/>".join([item['text']] * factor), answers=list(item['answers']) * factor)
+        elif kind == 'circle':
+            n = len(item['choices'])
+            parts = [re.sub(r"\{\{(\d+)\}\}", lambda m: "{{%d}}" % (int(m.group(1)) + k * n), item['text'])
+                     for k in range(factor)]
+            item = dict(item, text="<br/>".join(parts), choices=list(item['choices']) * factor,
+                        answers=list(item['answers']) * factor)
+        out.append(item)
+    return out
+
+
+# --- CASES ---
+
+def find_cases(lessons=None, scales=(10, 100)):
+    """Benchmark cases: every DOCUMENTS entry, then each spec at each scale."""
+    from genki.build import discover
+    from genki.variants import spec_names
+
+    cases = []
+    scripts = []
+    for script, name in discover(lessons):
+        lesson = os.path.basename(os.path.dirname(script))
+        cases.append({'id': f"{lesson}/{name}", 'script': script, 'document': name})
+        if script not in scripts:
+            scripts.append(script)
+    for script in scripts:
+        stem = os.path.splitext(os.path.basename(script))[0]
+        for spec in spec_names(script):
+            for factor in scales:
+                cases.append({'id': f"synthetic/{stem}.{spec}x{factor}", 'script': script,
+                              'spec': spec, 'scale': factor})
+    return cases
+
+
+def _runner(case, module):
+    """A function that renders the case to the filename it is given."""
+    if 'document' in case:
+        return module.DOCUMENTS[case['document']]
+    from genki.spec import write_outputs
+
+    content = scale_spec(getattr(module, case['spec']), case['scale'])
+    return lambda filename: write_outputs(content, module.styles, {'combined': filename}, verbose=False)
+
+
+def run_case(case, warm, out_dir, face_cache=True):
+    """
+    Runs in a fresh worker process: loads the script, renders the case once
+    (cold) and then warm more times. Returns the raw timings.
+    """
+    os.environ.pop("GENKI_INCREMENTAL", None)
+    if not face_cache:
+        os.environ["GENKI_FACE_CACHE"] = "0"
+    quiet = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(quiet):
+        from genki import incremental
+        from genki.build import load_script
+
+        module = load_script(case['script'])
+        load = time.perf_counter() - start
+        render = _runner(case, module)
+        out = os.path.join(out_dir, re.sub(r"[^\w.-]", "_", case['id']))
+        if not out.endswith(".pdf"):
+            out += ".pdf"
+
+        times, builds, pages = [], [], 0
+        for _ in range(1 + warm):
+            before = dict(incremental.build_stats)
+            t = time.perf_counter()
+            render(out)
+            times.append(time.perf_counter() - t)
+            builds.append(incremental.build_stats['seconds'] - before['seconds'])
+            pages = incremental.build_stats['pages'] - before['pages']
+    return {
+        'load': load,
+        'render': times,
+        'build': builds,
+        'pages': pages,
+        'bytes': os.path.getsize(out),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def _fresh_process(case, warm, out_dir, no_font_cache=False):
+    # A spawned single-use worker: nothing imported or cached from earlier runs
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(run_case, case, warm, out_dir, not no_font_cache).result()
+
+
+def bench_case(case, cold, warm, out_dir, no_font_cache=False):
+    """Cold and warm numbers for one case, summarized."""
+    runs = [_fresh_process(case, warm if i == 0 else 0, out_dir, no_font_cache) for i in range(cold)]
+    first = runs[0]
+    warm_times = first['render'][1:] or first['render'][:1]
+    warm_builds = first['build'][1:] or first['build'][:1]
+    median = statistics.median(warm_times)
+    return {
+        'id': case['id'],
+        'scale': case.get('scale', 1),
+        'cold_s': [r['load'] + r['render'][0] for r in runs],
+        'cold_load_s': [r['load'] for r in runs],
+        'warm_s': warm_times,
+        'warm_median_s': median,
+        'warm_build_median_s': statistics.median(warm_builds),
+        'warm_story_median_s': median - statistics.median(warm_builds),
+        'peak_rss_mb': max(r['peak_rss_kb'] for r in runs) / 1024,
+        'bytes': first['bytes'],
+        'pages': first['pages'],
+        'pages_per_s': first['pages'] / median if median else None,
+    }
+
+
+# --- REPORTING ---
+
+def environment():
+    import reportlab
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'commit': commit,
+        'python': platform.python_version(),
+        'reportlab': reportlab.Version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def print_report(results, previous=None):
+    before = {r['id']: r for r in (previous or {}).get('results', [])}
+    print(f"{'case':<62} {'cold':>8} {'warm':>8} {'build':>6} {'RSS MB':>7} {'kB':>6} {'pages/s':>8}")
+    for r in results:
+        line = (f"{r['id']:<62} {statistics.median(r['cold_s']) * 1000:>6.0f}ms "
+                f"{r['warm_median_s'] * 1000:>6.1f}ms {r['warm_build_median_s'] / r['warm_median_s']:>6.0%} "
+                f"{r['peak_rss_mb']:>7.1f} {r['bytes'] / 1e3:>6.0f} {r['pages_per_s'] or 0:>8.1f}")
+        old = before.get(r['id'])
+        if old:
+            line += f"  warm {r['warm_median_s'] / old['warm_median_s'] - 1:+.0%}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the worksheet generators.")
+    parser.add_argument("lessons", nargs="*", help="Lesson folders to include (default: all)")
+    parser.add_argument("--scale", type=int, nargs="*", default=[10, 100],
+                        help="Synthetic scale-up factors (default: 10 100; none to skip)")
+    parser.add_argument("--cold", type=int, default=3, help="Cold runs, each in a new process (default: 3)")
+    parser.add_argument("--warm", type=int, default=10, help="Warm renders after the first (default: 10)")
+    parser.add_argument("--match", help="Only run cases whose id contains this text")
+    parser.add_argument("--no-font-cache", action="store_true",
+                        help="Cold runs parse the TTF instead of using the parsed-font cache (GENKI_FACE_CACHE=0)")
+    parser.add_argument("--out", default=os.path.join(REPO_ROOT, "build", "bench"), help="Folder for the PDFs")
+    parser.add_argument("--json", help="Results file (default: <out>/bench-<time>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare warm times against")
+    args = parser.parse_args(argv)
+
+    cases = find_cases(args.lessons, args.scale)
+    if args.match:
+        cases = [c for c in cases if args.match in c['id']]
+    if not cases:
+        parser.error("no cases to run")
+    os.makedirs(args.out, exist_ok=True)
+
+    results = []
+    for case in cases:
+        results.append(bench_case(case, max(1, args.cold), max(0, args.warm), args.out, args.no_font_cache))
+        print(f"  {case['id']}: {results[-1]['warm_median_s'] * 1000:.1f}ms", file=sys.stderr)
+
+    report = {'environment': environment(), 'cold_runs': args.cold, 'warm_runs': args.warm, 'results': results}
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+    print_report(results, previous)
+
+    path = args.json or os.path.join(args.out, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+Builds every worksheet in the Lesson NN/ folders in one go.
+
+Each worksheet script lists what it can produce in a module-level DOCUMENTS
+dict (output name -> function taking the output filename). The documents are
+rendered in a process pool whose workers import all the scripts once up
+front, so fonts and styles are loaded once per worker rather than once per PDF.
+
+    python -m genki.build                 # everything, into build/
+    python -m genki.build "Lesson 20" -j 4 --out /tmp/sheets
+    python -m genki.build --incremental   # skip PDFs whose inputs haven't changed
+"""
+import os
+import re
+import ast
+import sys
+import glob
+import time
+import argparse
+import importlib.util
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Worksheet modules already imported in this process, keyed by script path.
+_modules = {}
+
+
+# --- DISCOVERY ---
+
+def lesson_dirs(names=None):
+    """The Lesson NN/ folders (all of them, or just the ones named)."""
+    dirs = sorted(glob.glob(os.path.join(REPO_ROOT, "Lesson *")))
+    if names:
+        wanted = {os.path.basename(os.path.normpath(n)) for n in names}
+        dirs = [d for d in dirs if os.path.basename(d) in wanted]
+    return [d for d in dirs if os.path.isdir(d)]
+
+
+def document_names(script):
+    """
+    Reads the keys of a script's DOCUMENTS dict without importing it,
+    so the parent process never has to load reportlab or the fonts.
+    """
+    with open(script, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=script)
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and isinstance(node.value, ast.Dict)
+                and any(isinstance(t, ast.Name) and t.id == "DOCUMENTS" for t in node.targets)):
+            return [k.value for k in node.value.keys if isinstance(k, ast.Constant)]
+    return []
+
+
+def discover(lessons=None):
+    """Returns (script path, output name) for every document in the lesson folders."""
+    jobs = []
+    for lesson in lesson_dirs(lessons):
+        for script in sorted(glob.glob(os.path.join(lesson, "*.py"))):
+            for name in document_names(script):
+                jobs.append((script, name))
+    return jobs
+
+
+def load_script(script):
+    """Imports a worksheet script by path (once per process) and returns the module."""
+    module = _modules.get(script)
+    if module is None:
+        rel = os.path.relpath(script, REPO_ROOT)
+        mod_name = "genki_ws_" + re.sub(r"\W", "_", os.path.splitext(rel)[0])
+        spec = importlib.util.spec_from_file_location(mod_name, script)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[script] = module
+    return module
+
+
+def unload_script(script):
+    """Forgets a script's module, so the next load_script() runs the (edited) file again."""
+    _modules.pop(script, None)
+
+
+def output_path(out_dir, script, name):
+    """Mirrors the lesson folder layout under out_dir."""
+    lesson = os.path.basename(os.path.dirname(script))
+    return os.path.join(out_dir, lesson, name)
+
+
+# --- RENDERING ---
+
+def warm_worker(scripts, incremental=False):
+    """Pool initializer: import every script so fonts and styles are loaded once."""
+    from genki import incremental as inc
+    from genki.fonts import japanese_font
+
+    if incremental:
+        inc.enable(deferred=True)
+
+    japanese_font()
+    for script in scripts:
+        load_script(script)
+
+
+def render(script, name, out_path):
+    """
+    Renders one document. Returns (script, name, out_path, seconds, status, records)
+    where status is 'hit'/'miss' in incremental mode (else 'built') and records
+    are the incremental manifest entries for the parent to write.
+    """
+    from genki import incremental
+
+    module = load_script(script)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    start = time.perf_counter()
+    module.DOCUMENTS[name](out_path)
+    seconds = time.perf_counter() - start
+    records = incremental.take_records()
+    status = records[-1][2] if records else "built"
+    return script, name, out_path, seconds, status, records
+
+
+def write_manifests(results):
+    """Writes the incremental manifest of each output folder once, from the parent."""
+    from genki import incremental
+
+    by_dir = {}
+    for result in results:
+        for record in result[5]:
+            by_dir.setdefault(os.path.dirname(record[0]), []).append(record)
+    for out_dir, records in by_dir.items():
+        incremental.update_manifest(out_dir, records)
+
+
+def build(jobs, out_dir, workers=None, incremental=False):
+    """Renders jobs into out_dir; returns the render() result for each one."""
+    scripts = sorted({script for script, _ in jobs})
+    results = []
+    if workers == 1:
+        warm_worker(scripts, incremental)
+        for script, name in jobs:
+            results.append(render(script, name, output_path(out_dir, script, name)))
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=warm_worker,
+                                 initargs=(scripts, incremental)) as pool:
+            futures = [pool.submit(render, script, name, output_path(out_dir, script, name))
+                       for script, name in jobs]
+            for future in as_completed(futures):
+                results.append(future.result())
+    if incremental:
+        write_manifests(results)
+    return results
+
+
+def print_report(results, wall):
+    print()
+    print(f"{'Document':<55} {'Time':>8}  Status")
+    for script, name, out_path, seconds, status, _ in sorted(results, key=lambda r: r[2]):
+        lesson = os.path.basename(os.path.dirname(script))
+        print(f"{lesson + '/' + name:<55} {seconds * 1000:>6.0f}ms  {status}")
+    total = sum(r[3] for r in results)
+    print(f"{len(results)} documents in {wall:.2f}s wall ({total:.2f}s of rendering)")
+    hits = sum(1 for r in results if r[4] == "hit")
+    misses = sum(1 for r in results if r[4] == "miss")
+    if hits or misses:
+        print(f"Incremental: {hits} up to date, {misses} rebuilt")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build every worksheet PDF in the Lesson NN/ folders.")
+    parser.add_argument("lessons", nargs="*", help="Lesson folders to build (default: all)")
+    parser.add_argument("--out", default=os.path.join(REPO_ROOT, "build"), help="Output folder (default: build/)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument("--incremental", action="store_true", help="Skip PDFs whose inputs haven't changed")
+    args = parser.parse_args(argv)
+
+    jobs = discover(args.lessons)
+    if not jobs:
+        print("No worksheet documents found.")
+        return 1
+
+    start = time.perf_counter()
+    results = build(jobs, args.out, args.jobs, args.incremental)
+    print_report(results, time.perf_counter() - start)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+Class packs: one PDF holding a personalized copy of a worksheet for every
+student on a roster, each starting on a new page.
+
+Because the whole class is one document, the Japanese font subset, the
+styles and the other page resources are embedded once for the pack instead
+of once per file, and there is a single print job. Copies differ by the name
+on the "Name:" line and, with --variants, by a per-student shuffle (see
+genki/variants.py) seeded from the student's name, so a student keeps the
+same variant however the roster is ordered.
+
+    python -m genki.classpack "Lesson 19/Genki_Honorifics_Worksheet.py" --roster class_3b.txt
+    python -m genki.classpack "Lesson 20/L20_worksheet1.py" --count 40 --variants --key --compare
+"""
+import os
+import sys
+import copy
+import time
+import zlib
+import argparse
+import tempfile
+
+from reportlab.platypus import PageBreak
+
+from genki.spec import build_story, new_doc, render_item, write_outputs
+from genki.incremental import build_pdf
+from genki.variants import make_variant, spec_names
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# --- ROSTERS ---
+
+def read_roster(path):
+    """One student name per line; blank lines and lines starting with # are skipped."""
+    with open(path, encoding="utf-8") as f:
+        names = [line.strip() for line in f]
+    return [name for name in names if name and not name.startswith('#')]
+
+
+def student_seed(name):
+    """Variant seed for a student; depends only on the name."""
+    return zlib.crc32(name.encode('utf-8'))
+
+
+def personalize(content, name):
+    """
+    Copy of content with name on the 'name' line (one is added under the
+    title if the spec has none) and in the answer-key heading.
+    """
+    out = []
+    has_name = any(item['type'] == 'name' for item in content)
+    for item in content:
+        if item['type'] == 'name':
+            item = dict(item, name=name)
+        elif item['type'] == 'title':
+            key_text = item.get('key_text', 'ANSWER KEY: ' + item['text'])
+            out.append(dict(item, key_text=f"{key_text} ({name})"))
+            if not has_name:
+                out.append({'type': 'name', 'name': name})
+            continue
+        out.append(item)
+    return out
+
+
+# --- STORIES ---
+
+def _shared_story(content, styles, names):
+    """
+    Student copies of one spec that only differ by name. Every item except
+    the name line renders the same for everyone, so its flowables are built
+    once and every copy gets shallow copies of them: the parsed Paragraph text
+    is shared, but each copy keeps its own layout state (platypus marks a
+    flowable it has pushed to the next page, so one object can't be placed twice).
+    """
+    rendered = {}
+    story = []
+    for n, name in enumerate(names):
+        if n:
+            story.append(PageBreak())
+        for i, item in enumerate(personalize(content, name)):
+            if item.get('only') == 'key':
+                continue
+            if item['type'] == 'name':
+                story.extend(render_item(item, styles, 'student'))
+                continue
+            if i not in rendered:
+                rendered[i] = render_item(item, styles, 'student')
+            story.extend(copy.copy(f) for f in rendered[i])
+    return story
+
+
+def class_pack_story(content, styles, names, variants=False, key=False):
+    """
+    Flowables for the whole class: one student copy per name, then (with
+    key) the answer keys. Without variants every copy has the same answers,
+    so a single key is enough; with variants each student gets their own.
+    """
+    if variants:
+        specs = [personalize(make_variant(content, student_seed(name)), name) for name in names]
+        story = []
+        for n, spec in enumerate(specs):
+            if n:
+                story.append(PageBreak())
+            story.extend(build_story(spec, styles, 'student'))
+    else:
+        specs = [content]
+        story = _shared_story(content, styles, names)
+    if key:
+        for spec in specs:
+            story.append(PageBreak())
+            story.extend(build_story(spec, styles, 'key'))
+    return story
+
+
+def write_class_pack(content, styles, names, filename, variants=False, key=False):
+    """Renders the class pack for names into filename; returns the build status."""
+    return build_pdf(new_doc(filename), class_pack_story(content, styles, names, variants, key))
+
+
+def write_standalone(content, styles, names, out_dir, variants=False, key=False):
+    """The same pages as separate PDFs, the way they would otherwise be printed (used by --compare)."""
+    files = []
+    mode = 'combined' if key and variants else 'student'
+    for n, name in enumerate(names, 1):
+        spec = make_variant(content, student_seed(name)) if variants else content
+        files.append(os.path.join(out_dir, f"student_{n:03d}.pdf"))
+        write_outputs(personalize(spec, name), styles, {mode: files[-1]}, verbose=False)
+    if key and not variants:
+        files.append(os.path.join(out_dir, "key.pdf"))
+        write_outputs(content, styles, {'key': files[-1]}, verbose=False)
+    return files
+
+
+# --- COMMAND LINE ---
+
+def main(argv=None):
+    from genki.build import load_script
+
+    parser = argparse.ArgumentParser(description="Render one PDF with a personalized worksheet for every student.")
+    parser.add_argument("script", help="Worksheet script, e.g. 'Lesson 19/Genki_Honorifics_Worksheet.py'")
+    parser.add_argument("--spec", help="Name of the content list in the script (default: its only *_content list)")
+    who = parser.add_mutually_exclusive_group(required=True)
+    who.add_argument("--roster", help="Text file with one student name per line")
+    who.add_argument("--count", type=int, help="Number of unnamed copies ('Student 1', 'Student 2', ...)")
+    parser.add_argument("--variants", action="store_true", help="Give every student their own shuffled variant")
+    parser.add_argument("--key", action="store_true", help="Append the answer key(s) after the student copies")
+    parser.add_argument("--out", help="Output PDF (default: build/classpack/<script>_class.pdf)")
+    parser.add_argument("--compare", action="store_true",
+                        help="Also time N standalone PDFs and report the size/time saving")
+    args = parser.parse_args(argv)
+
+    script = os.path.abspath(args.script)
+    names = spec_names(script)
+    spec_name = args.spec or (names[0] if len(names) == 1 else None)
+    if spec_name not in names:
+        parser.error(f"pick a spec with --spec (found: {', '.join(names) or 'none'})")
+    students = read_roster(args.roster) if args.roster else [f"Student {n}" for n in range(1, args.count + 1)]
+    if not students:
+        parser.error("the roster is empty")
+
+    stem = os.path.splitext(os.path.basename(script))[0]
+    out = args.out or os.path.join(REPO_ROOT, "build", "classpack", f"{stem}_class.pdf")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+
+    module = load_script(script)
+    content = getattr(module, spec_name)
+    if args.variants:
+        try:
+            make_variant(content, 0)
+        except ValueError as e:
+            parser.error(f"--variants: {spec_name}: {e}")
+
+    start = time.perf_counter()
+    status = write_class_pack(content, module.styles, students, out, args.variants, args.key)
+    pack_time = time.perf_counter() - start
+    pack_size = os.path.getsize(out)
+    if status != "hit":
+        print(f"Generated: {out}")
+    print(f"{len(students)} students in {pack_time:.2f}s, {pack_size / 1e3:.0f} kB")
+
+    if args.compare:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            files = write_standalone(content, module.styles, students, tmp, args.variants, args.key)
+            solo_time = time.perf_counter() - start
+            solo_size = sum(os.path.getsize(f) for f in files)
+        print(f"{len(files)} standalone PDFs in {solo_time:.2f}s, {solo_size / 1e3:.0f} kB")
+        print(f"Class pack: {pack_size / solo_size:.0%} of the size, {pack_time / solo_time:.0%} of the time")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,454 @@
+"""
+Exports a worksheet spec to several formats in one pass: the PDFs, a static
+HTML page for phones, and a flashcard deck (Anki .apkg, or CSV for Anki's
+text import) of its prompt/answer pairs.
+
+Each spec item is prepared once (romaji and readings filled in, see
+genki/spec.py prepare_item()) and resolved into blocks, the spec's own
+intermediate form: ('para', style, markup), ('table', rows, ...), ('break',)
+and ('spacer', height). The cards come from the same prepared items, under
+the question ids genki/grading.py uses ('II.3'); only drill, blanks, choice
+and circle items have any, so a spec of text and tables gets an empty deck
+(and a warning). Every backend reads that one stream, so a format costs
+only its own writing, never another parse or conjugation:
+
+    pdf     the sheet and its key (the same flowables write_outputs() makes)
+    html    one page, the key folded away under it; ruby as <ruby>
+    apkg    an Anki package: one note per blank, front and back in HTML
+    csv     the same cards as tab-separated text with Anki's import headers
+
+A format is a class in BACKENDS, made with (output path without extension,
+styles, title, lesson folder), with add(student blocks, key blocks, cards)
+and close() returning the paths it wrote.
+
+    python -m genki.export "Lesson 19/lesson_19_worksheetes.py"                # every spec in it, every format
+    python -m genki.export "Lesson 20/L20_worksheet1.py" --formats html apkg --out /tmp/phone
+"""
+import os
+import re
+import csv
+import sys
+import json
+import time
+import sqlite3
+import zipfile
+import hashlib
+import argparse
+import tempfile
+from html import escape, unescape
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_TAG_RE = re.compile(r'<[^>]*>')
+_FONT_RE = re.compile(r'<font\b([^>]*)>')
+_ATTR_RE = re.compile(r'''(\w+)\s*=\s*("[^"]*"|'[^']*'|[^\s>]+)''')
+_RENAMED_TAGS = {'super': 'sup', 'strike': 's', 'para': 'span'}
+_RENAMED_RE = re.compile(r'<(/?)(%s)\b' % '|'.join(_RENAMED_TAGS))
+_LINE_RE = re.compile(r'<br\s*/?>')
+_SPACE_RE = re.compile(r'\s+')
+
+
+# --- MARKUP ---
+
+def to_html(markup):
+    """reportlab paragraph markup as HTML: {base|reading} becomes <ruby>, <font> a <span>."""
+    from genki.ruby import RUBY_RE
+
+    html = RUBY_RE.sub(r'<ruby>\1<rt>\2</rt></ruby>', markup)
+    html = _FONT_RE.sub(_font_span, html).replace('</font>', '</span>')
+    html = _RENAMED_RE.sub(lambda m: f"<{m.group(1)}{_RENAMED_TAGS[m.group(2)]}", html)
+    return _LINE_RE.sub('<br>', html)
+
+
+def _font_span(m):
+    css = []
+    for name, value in _ATTR_RE.findall(m.group(1)):
+        value = value.strip('"\'')
+        if name == 'size':
+            css.append(f"font-size:{value}pt")
+        elif name == 'color':
+            css.append(f"color:{value}")
+    return f'<span style="{";".join(css)}">' if css else '<span>'
+
+
+def plain_text(markup):
+    """The words of a piece of markup: no tags, ruby bases only, entities resolved."""
+    from genki.ruby import plain
+
+    return unescape(_TAG_RE.sub('', plain(markup))).replace('\xa0', ' ').strip()
+
+
+# --- INTERMEDIATE FORM ---
+
+def _literal(text):
+    """A table cell reportlab draws as is (not a Paragraph) as markup."""
+    return escape(str(text), quote=False).replace('\n', '<br/>')
+
+
+def _lines(text):
+    return [line.strip() for line in _LINE_RE.split(text)]
+
+
+def _line_with(text, mark):
+    """The line of a passage holding mark (a numbered blank), or the whole passage."""
+    for line in _lines(text):
+        if mark in line:
+            return line
+    return text.strip()
+
+
+def _cards(item):
+    """(front, back) for each gradable blank of a prepared item, in grading.questions() order."""
+    from genki.spec import CHOICE_LETTERS, circle_options
+
+    kind = item['type']
+    if kind == 'drill':
+        col = item.get('answer_col', -1)
+        cell = str if item.get('cells') == 'paragraph' else _literal
+        header = item['data'][0]
+        for row in item['data'][1:]:
+            cells = [cell(c) for i, c in enumerate(row) if i != col % len(row)]
+            yield "<br/>".join(cells + [f"→ {cell(header[col])}"]), row[col]
+    elif kind == 'blanks':
+        for number, (answer, note) in enumerate(item['answers'], item.get('start', 1)):
+            back = f"{answer}<br/><font size=9 color=grey>{note}</font>" if note else answer
+            yield _line_with(item['text'], f"({number})"), back
+    elif kind == 'choice':
+        options = "".join(f"<br/>{letter}) {c}" for letter, c in zip(CHOICE_LETTERS, item['choices']))
+        letter = CHOICE_LETTERS[item['answer']]
+        yield item['prompt'] + options, f"({letter}) {item['choices'][item['answer']]}"
+    elif kind == 'circle':
+        for number, (choices, answer) in enumerate(zip(item['choices'], item['answers']), 1):
+            line = _line_with(item['text'], "{{%d}}" % number)
+            for n, options in enumerate(item['choices'], 1):
+                line = line.replace("{{%d}}" % n, circle_options(options) if n == number else "(…)")
+            yield line, f"({CHOICE_LETTERS[answer]}) {choices[answer]}"
+
+
+def parse(content, styles):
+    """
+    The spec as the backends read it: (student blocks, key blocks, cards)
+    for each item, where cards are (question id, front, back) in markup.
+    Each item is prepared once for all of them.
+    """
+    from genki.grading import questions
+    from genki.spec import item_blocks, prepare_item
+
+    items = [prepare_item(item, styles) for item in content]
+    ids = questions(items)
+    for item in items:
+        only = item.get('only')
+        student = item_blocks(item, 'student') if only != 'key' else []
+        key = item_blocks(item, 'key') if only != 'student' else []
+        cards = [(qid, front, back) for (front, back), (qid, _, _, _) in zip(_cards(item), ids)]
+        yield student, key, cards
+
+
+# --- BACKENDS ---
+
+class PdfExport:
+    """The student sheet and the answer key as PDFs, from the blocks' flowables."""
+
+    def __init__(self, base, styles, title, lesson=None):
+        self.paths = {'student': base + '.pdf', 'key': base + '_key.pdf'}
+        self.styles = styles
+        self.stories = {'student': [], 'key': []}
+
+    def add(self, student, key, cards):
+        from genki.spec import block_flowables
+
+        for mode, blocks in (('student', student), ('key', key)):
+            for block in blocks:
+                self.stories[mode].extend(block_flowables(block, self.styles))
+
+    def close(self):
+        from genki.incremental import build_pdf
+        from genki.spec import new_doc
+
+        for mode, path in self.paths.items():
+            build_pdf(new_doc(path), self.stories[mode])
+        return list(self.paths.values())
+
+
+_HTML_HEAD = """<!DOCTYPE html>
+<html lang="ja">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style>
+body {{ font-family: "Klee One", "Hiragino Sans", "Noto Sans JP", sans-serif; max-width: 42em; margin: 0 auto; padding: 1em; line-height: 1.6; }}
+h1 {{ font-size: 1.4em; text-align: center; }}
+h1.key_title {{ color: darkblue; }}
+h2 {{ font-size: 1.15em; color: darkblue; margin-top: 1.5em; }}
+.answer, .table_answer {{ color: red; }}
+table {{ border-collapse: collapse; width: 100%; margin-bottom: 1em; }}
+td, th {{ border: 1px solid black; padding: 0.3em; }}
+tr:first-child td {{ background: lightgrey; }}
+.table_text, .table_answer {{ text-align: center; }}
+rt {{ font-size: 0.5em; }}
+hr.break {{ border: 0; border-top: 1px dashed grey; margin: 2em 0; }}
+details {{ margin-top: 2em; }}
+summary {{ font-weight: bold; cursor: pointer; }}
+</style>
+</head>
+<body>
+"""
+
+_HEADING_TAGS = {'title': 'h1', 'key_title': 'h1', 'header': 'h2'}
+
+
+def _cell_html(cell):
+    if isinstance(cell, tuple):
+        return f'<td class="{cell[0]}">{to_html(cell[1])}</td>'
+    if not isinstance(cell, str):
+        # A flowable the script put in the table itself (a Paragraph has its markup in .text)
+        text = getattr(cell, 'text', None)
+        return f'<td>{to_html(text) if isinstance(text, str) else escape(str(cell))}</td>'
+    return f'<td>{to_html(_literal(cell))}</td>'
+
+
+def blocks_html(blocks):
+    """HTML for a list of blocks."""
+    out = []
+    for block in blocks:
+        kind = block[0]
+        if kind == 'para':
+            tag = _HEADING_TAGS.get(block[1], 'p')
+            out.append(f'<{tag} class="{block[1]}">{to_html(block[2])}</{tag}>')
+        elif kind == 'table':
+            rows = "\n".join(f"<tr>{''.join(map(_cell_html, row))}</tr>" for row in block[1])
+            out.append(f"<table>\n{rows}\n</table>")
+        elif kind == 'break':
+            out.append('<hr class="break">')
+        elif kind == 'spacer':
+            out.append(f'<div style="height:{block[1]}pt"></div>')
+    return out
+
+
+class HtmlExport:
+    """One page: the sheet, written as it streams in, then the key folded under <details>."""
+
+    def __init__(self, base, styles, title, lesson=None):
+        self.path = base + '.html'
+        self.file = open(self.path, 'w', encoding='utf-8')
+        self.file.write(_HTML_HEAD.format(title=escape(title)))
+        self.key = []
+
+    def add(self, student, key, cards):
+        for line in blocks_html(student):
+            self.file.write(line + "\n")
+        self.key.extend(blocks_html(key))
+
+    def close(self):
+        with self.file:
+            self.file.write('<details class="key">\n<summary>Answer key</summary>\n')
+            self.file.write("\n".join(self.key))
+            self.file.write("\n</details>\n</body>\n</html>\n")
+        return [self.path]
+
+
+class _Deck:
+    """Collects the cards; front and back in HTML, tagged with the lesson and section."""
+
+    def __init__(self, base, styles, title, lesson=None):
+        self.base = base
+        self.name = "::".join(p for p in ("Genki", lesson, title) if p)
+        self.tags = [lesson.replace(' ', '_')] if lesson else []
+        self.notes = []     # (question id, front, back, tags)
+
+    def add(self, student, key, cards):
+        for qid, front, back in cards:
+            front, back = (_SPACE_RE.sub(' ', to_html(side)).strip() for side in (front, back))
+            self.notes.append((qid, front, back, self.tags + ['section_' + qid.split('.')[0]]))
+
+
+class CsvDeck(_Deck):
+    """Tab-separated text with the header lines Anki's File > Import reads."""
+
+    def close(self):
+        path = self.base + '.csv'
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(f"#separator:tab\n#html:true\n#deck:{self.name}\n#tags column:3\n")
+            writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+            for _, front, back, tags in self.notes:
+                writer.writerow([front, back, " ".join(tags)])
+        return [path]
+
+
+# Anki's collection schema (version 11), which an .apkg carries as collection.anki2
+_ANKI_SCHEMA = """
+CREATE TABLE col (id integer primary key, crt integer not null, mod integer not null, scm integer not null,
+    ver integer not null, dty integer not null, usn integer not null, ls integer not null, conf text not null,
+    models text not null, decks text not null, dconf text not null, tags text not null);
+CREATE TABLE notes (id integer primary key, guid text not null, mid integer not null, mod integer not null,
+    usn integer not null, tags text not null, flds text not null, sfld integer not null, csum integer not null,
+    flags integer not null, data text not null);
+CREATE TABLE cards (id integer primary key, nid integer not null, did integer not null, ord integer not null,
+    mod integer not null, usn integer not null, type integer not null, queue integer not null, due integer not null,
+    ivl integer not null, factor integer not null, reps integer not null, lapses integer not null,
+    left integer not null, odue integer not null, odid integer not null, flags integer not null, data text not null);
+CREATE TABLE revlog (id integer primary key, cid integer not null, usn integer not null, ease integer not null,
+    ivl integer not null, lastIvl integer not null, factor real not null, time integer not null, type integer not null);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+CREATE INDEX ix_notes_usn on notes (usn);
+CREATE INDEX ix_cards_usn on cards (usn);
+CREATE INDEX ix_revlog_usn on revlog (usn);
+CREATE INDEX ix_cards_nid on cards (nid);
+CREATE INDEX ix_cards_sched on cards (did, queue, due);
+CREATE INDEX ix_revlog_cid on revlog (cid);
+CREATE INDEX ix_notes_csum on notes (csum);
+"""
+
+_ANKI_CSS = (".card { font-family: 'Klee One', 'Hiragino Sans', 'Noto Sans JP', sans-serif; font-size: 22px;"
+             " text-align: center; } rt { font-size: 0.5em; }")
+
+_ANKI_DCONF = {"1": {
+    "id": 1, "name": "Default", "mod": 0, "usn": 0, "maxTaken": 60, "autoplay": True, "timer": 0, "replayq": True,
+    "new": {"bury": True, "delays": [1, 10], "initialFactor": 2500, "ints": [1, 4, 7], "order": 1, "perDay": 20,
+            "separate": True},
+    "rev": {"bury": True, "ease4": 1.3, "fuzz": 0.05, "ivlFct": 1, "maxIvl": 36500, "minSpace": 1, "perDay": 100},
+    "lapse": {"delays": [10], "leechAction": 0, "leechFails": 8, "minInt": 1, "mult": 0},
+}}
+
+
+def _anki_id(text):
+    """A stable positive 53-bit id, so re-exporting a deck updates it instead of duplicating it."""
+    return int(hashlib.sha1(text.encode('utf-8')).hexdigest()[:13], 16)
+
+
+def _deck_json(did, name, now):
+    return {"id": did, "name": name, "mod": now, "usn": -1, "desc": "", "dyn": 0, "conf": 1, "collapsed": False,
+            "extendNew": 10, "extendRev": 50, "newToday": [0, 0], "revToday": [0, 0], "lrnToday": [0, 0],
+            "timeToday": [0, 0]}
+
+
+class AnkiDeck(_Deck):
+    """An Anki package: a Front/Back note type, one deck, a note and a card per blank."""
+
+    def close(self):
+        path = self.base + '.apkg'
+        now = int(time.time())
+        did, mid = _anki_id('deck:' + self.name), _anki_id('model:genki-basic')
+        model = {
+            "id": mid, "name": "Genki worksheet card", "type": 0, "mod": now, "usn": -1, "sortf": 0, "did": did,
+            "flds": [{"name": field, "ord": n, "sticky": False, "rtl": False, "font": "Arial", "size": 20, "media": []}
+                     for n, field in enumerate(("Front", "Back"))],
+            "tmpls": [{"name": "Card 1", "ord": 0, "qfmt": "{{Front}}", "afmt": "{{FrontSide}}<hr id=answer>{{Back}}",
+                       "did": None, "bqfmt": "", "bafmt": ""}],
+            "css": _ANKI_CSS, "latexPre": "", "latexPost": "", "latexsvg": False, "req": [[0, "any", [0]]],
+            "tags": [], "vers": [],
+        }
+        conf = {"activeDecks": [1], "curDeck": 1, "curModel": str(mid), "newSpread": 0, "nextPos": len(self.notes) + 1,
+                "collapseTime": 1200, "timeLim": 0, "estTimes": True, "dueCounts": True, "sortType": "noteFld",
+                "sortBackwards": False, "addToCur": True}
+        decks = {"1": _deck_json(1, "Default", now), str(did): _deck_json(did, self.name, now)}
+
+        fd, db_path = tempfile.mkstemp(suffix='.anki2')
+        os.close(fd)
+        try:
+            conn = sqlite3.connect(db_path)
+            with conn:
+                conn.executescript(_ANKI_SCHEMA)
+                conn.execute("INSERT INTO col VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, ?, ?, ?, '{}')",
+                             (now, now * 1000, now * 1000, json.dumps(conf), json.dumps({str(mid): model}),
+                              json.dumps(decks), json.dumps(_ANKI_DCONF)))
+                for due, (qid, front, back, tags) in enumerate(self.notes):
+                    nid = _anki_id(f"note:{self.name}:{qid}")
+                    sort_field = plain_text(front)
+                    conn.execute("INSERT INTO notes VALUES (?, ?, ?, ?, -1, ?, ?, ?, ?, 0, '')",
+                                 (nid, format(nid, 'x'), mid, now, f" {' '.join(tags)} ", f"{front}\x1f{back}",
+                                  sort_field, int(hashlib.sha1(sort_field.encode('utf-8')).hexdigest()[:8], 16)))
+                    conn.execute("INSERT INTO cards VALUES (?, ?, ?, 0, ?, -1, 0, 0, ?, 0, 0, 0, 0, 0, 0, 0, 0, '')",
+                                 (_anki_id(f"card:{self.name}:{qid}"), nid, did, now, due + 1))
+            conn.close()
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+                z.write(db_path, 'collection.anki2')
+                z.writestr('media', '{}')
+        finally:
+            os.remove(db_path)
+        return [path]
+
+
+BACKENDS = {'pdf': PdfExport, 'html': HtmlExport, 'apkg': AnkiDeck, 'csv': CsvDeck}
+DECKS = ('apkg', 'csv')
+
+
+# --- PIPELINE ---
+
+def export(content, styles, base, formats=tuple(BACKENDS), lesson=None):
+    """
+    Writes content to base + each format's extension in one pass. Returns
+    (paths written, {'parse' or format: seconds}, number of cards).
+    """
+    title = next((plain_text(item['text']) for item in content if item['type'] == 'title'),
+                 os.path.basename(base))
+    backends = []
+    for fmt in formats:
+        cls = BACKENDS.get(fmt)
+        if cls is None:
+            raise ValueError(f"Unknown export format {fmt!r} (have: {', '.join(BACKENDS)})")
+        backends.append((fmt, cls(base, styles, title, lesson)))
+
+    timing = dict.fromkeys(['parse'] + list(formats), 0.0)
+    cards = 0
+    entries = parse(content, styles)
+    while True:
+        start = time.perf_counter()
+        entry = next(entries, None)
+        timing['parse'] += time.perf_counter() - start
+        if entry is None:
+            break
+        cards += len(entry[2])
+        for fmt, backend in backends:
+            start = time.perf_counter()
+            backend.add(*entry)
+            timing[fmt] += time.perf_counter() - start
+
+    paths = []
+    for fmt, backend in backends:
+        start = time.perf_counter()
+        paths += backend.close()
+        timing[fmt] += time.perf_counter() - start
+    return paths, timing, cards
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export worksheet specs to PDF, HTML and flashcard decks in one pass.")
+    parser.add_argument("script", help="Worksheet script, e.g. 'Lesson 19/lesson_19_worksheetes.py'")
+    parser.add_argument("--spec", action="append", help="Content list to export (default: every *_content list)")
+    parser.add_argument("--formats", nargs="+", default=list(BACKENDS), choices=list(BACKENDS),
+                        help="Formats to write (default: all)")
+    parser.add_argument("--out", default=os.path.join(REPO_ROOT, "build", "export"), help="Output folder")
+    args = parser.parse_args(argv)
+
+    from genki.build import load_script
+    from genki.variants import spec_names
+
+    script = os.path.abspath(args.script)
+    names = spec_names(script)
+    specs = args.spec or names
+    missing = [name for name in specs if name not in names]
+    if not specs or missing:
+        parser.error(f"pick a spec with --spec (found: {', '.join(names) or 'none'})")
+
+    module = load_script(script)
+    lesson = os.path.basename(os.path.dirname(script))
+    stem = os.path.splitext(os.path.basename(script))[0]
+    os.makedirs(args.out, exist_ok=True)
+    for name in specs:
+        content = getattr(module, name)
+        paths, timing, cards = export(content, module.styles, os.path.join(args.out, f"{stem}.{name}"),
+                                      args.formats, lesson)
+        print(f"{lesson}/{stem}.py {name}: {len(content)} items, {cards} cards")
+        if not cards and any(fmt in DECKS for fmt in args.formats):
+            print(f"WARNING: {name} has no drill, blanks, choice or circle items, so its deck is empty.")
+        for phase, seconds in timing.items():
+            print(f"  {phase:<6} {seconds * 1000:>7.1f}ms")
+        for path in paths:
+            print(f"  -> {os.path.relpath(path)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,403 @@
+import os
+import json
+import mmap
+import pickle
+import hashlib
+import tempfile
+from fnmatch import fnmatch
+from weakref import WeakKeyDictionary
+
+import reportlab
+from reportlab import rl_config
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont, TTFontFace, TTEncoding
+
+# Bump this when the layout of the cached face data changes.
+CACHE_FORMAT = 1
+
+# Parsed faces already loaded in this process, keyed by font file hash.
+_faces = {}
+
+# Font file hashes already computed in this process (or read from the cache's
+# hash index), keyed by (path, size, mtime).
+_hashes = {}
+_hash_index_loaded = []
+
+# Font name returned by japanese_font(), keyed by (name, filename).
+_registered = {}
+
+# Where each font can be fetched from. 'sha256' pins the exact file: local
+# copies and downloads that don't match it are rejected. While it is None a
+# download must be a TrueType font whose name table gives 'family' (so an
+# error page, a truncated file or another font is refused), its digest is
+# printed as a warning so it can be pinned here, and using a local copy
+# prints a warning too.
+FONT_SOURCES = {
+    "KleeOne-Regular.ttf": {
+        "url": "https://github.com/fontworks-fonts/Klee/raw/master/fonts/ttf/KleeOne-Regular.ttf",
+        "sha256": None,
+        "family": "Klee One",
+    },
+}
+
+# Tried (from the current folder or a mirror only) when the main font is missing.
+FALLBACK_FONTS = ["NotoSansJP-Regular.ttf"]
+
+# First four bytes of a TrueType font or collection. ('OTTO' CFF fonts are not
+# supported by reportlab.)
+_TTF_MAGIC = (b"\x00\x01\x00\x00", b"true", b"ttcf")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def font_cache_dir():
+    """
+    Where parsed fonts are kept between runs.
+    Override with the GENKI_FONT_CACHE environment variable.
+    """
+    default = os.path.join(os.path.expanduser("~"), ".cache", "genki_worksheets", "fonts")
+    return os.environ.get("GENKI_FONT_CACHE", default)
+
+
+def face_cache_enabled():
+    """
+    False when GENKI_FACE_CACHE=0: load_face() then parses every TTF and
+    neither reads nor writes the pickled faces. Finding and downloading fonts
+    (which also use font_cache_dir()) is unaffected.
+    """
+    return os.environ.get("GENKI_FACE_CACHE", "1") != "0"
+
+
+def _map_file(path):
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def font_file_hash(path):
+    """SHA-256 of the font file, used as the cache key."""
+    if os.path.getsize(path) == 0:
+        return hashlib.sha256().hexdigest()
+    data = _map_file(path)
+    try:
+        return hashlib.sha256(data).hexdigest()
+    finally:
+        data.close()
+
+
+def _hash_index_path():
+    return os.path.join(font_cache_dir(), "hashes.json")
+
+
+def _load_hash_index():
+    _hash_index_loaded.append(True)
+    try:
+        with open(_hash_index_path(), encoding="utf-8") as f:
+            index = json.load(f)
+        for path, (size, mtime, digest) in index.items():
+            _hashes.setdefault((path, size, mtime), digest)
+    except (OSError, ValueError, TypeError):
+        pass
+
+
+def _save_hash_index():
+    index = {path: [size, mtime, digest] for (path, size, mtime), digest in _hashes.items()}
+    path = _hash_index_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def cached_font_hash(path):
+    """
+    font_file_hash(), remembered for as long as the file's size and mtime
+    don't change. The hashes are also kept in the font cache, so a new
+    process doesn't read the whole font to find its cache entry.
+    """
+    st = os.stat(path)
+    key = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+    digest = _hashes.get(key)
+    if digest is None and not _hash_index_loaded:
+        _load_hash_index()
+        digest = _hashes.get(key)
+    if digest is None:
+        digest = _hashes[key] = font_file_hash(path)
+        _save_hash_index()
+    return digest
+
+
+def _pdf_scale(units_per_em):
+    # Same arithmetic as TTFontFile.extractInfo, which stores a lambda we can't pickle.
+    if units_per_em == 1000:
+        return lambda x: x
+    mult = 1000 / units_per_em
+    return lambda x: x * mult
+
+
+def _cache_path(digest):
+    tag = "rl%s-v%d" % (reportlab.Version, CACHE_FORMAT)
+    return os.path.join(font_cache_dir(), "%s-%s.pickle" % (digest, tag))
+
+
+def _save_face(face, path):
+    info = dict(face.__dict__)
+    # The raw font bytes are memory-mapped from the .ttf on load instead of pickled.
+    for key in ("_ttf_data", "_pdfScale", "_pos", "filename"):
+        info.pop(key, None)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(info, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError as e:
+        # A read-only cache just means we parse again next time.
+        print(f"Font cache not written ({e})")
+
+
+def _load_face(font_path, path):
+    with open(path, "rb") as f:
+        info = pickle.load(f)
+    face = TTFontFace.__new__(TTFontFace)
+    face.__dict__.update(info)
+    face.filename = font_path
+    face._ttf_data = _map_file(font_path)
+    face._pos = 0
+    face._pdfScale = _pdf_scale(face.unitsPerEm)
+    return face
+
+
+def load_face(font_path):
+    """
+    Returns the parsed TTFontFace for font_path.
+
+    The first run parses the TTF as usual and stores the metrics and table
+    directory in the font cache. Later runs unpickle those and memory-map the
+    font file for the glyph data, so nothing is parsed again. With the face
+    cache off (see face_cache_enabled) the TTF is parsed every time.
+    """
+    digest = cached_font_hash(font_path)
+    face = _faces.get(digest)
+    if face is not None:
+        return face
+
+    if not face_cache_enabled():
+        face = _faces[digest] = TTFontFace(font_path)
+        return face
+
+    path = _cache_path(digest)
+    face = None
+    if os.path.exists(path):
+        try:
+            face = _load_face(font_path, path)
+        except Exception as e:
+            print(f"Ignoring broken font cache {path}: {e}")
+    if face is None:
+        face = TTFontFace(font_path)
+        _save_face(face, path)
+
+    _faces[digest] = face
+    return face
+
+
+def cached_ttfont(name, font_path):
+    """Drop-in replacement for TTFont(name, font_path) backed by the font cache."""
+    font = TTFont.__new__(TTFont)
+    # Mirrors TTFont.__init__, minus the TTFontFace parse.
+    font.fontName = name
+    font.face = load_face(font_path)
+    font.encoding = TTEncoding()
+    font.state = WeakKeyDictionary()
+    font._asciiReadable = rl_config.ttfAsciiReadable
+    font.shapable = not any(fnmatch(name, g) for g in rl_config.unShapedFontGlob)
+    return font
+
+
+def register_font(name, font_path):
+    """pdfmetrics.registerFont(TTFont(name, font_path)), using the font cache."""
+    font = cached_ttfont(name, font_path)
+    pdfmetrics.registerFont(font)
+    return font
+
+
+# --- FINDING & DOWNLOADING FONTS ---
+
+def mirror_dirs():
+    """
+    Local folders searched for fonts before anything is downloaded.
+    GENKI_FONT_MIRROR (a path list, like PATH) is searched first, then the
+    Lesson NN/ folders of this repo.
+    """
+    dirs = [d for d in os.environ.get("GENKI_FONT_MIRROR", "").split(os.pathsep) if d]
+    for name in sorted(os.listdir(REPO_ROOT)):
+        if name.startswith("Lesson ") and os.path.isdir(os.path.join(REPO_ROOT, name)):
+            dirs.append(os.path.join(REPO_ROOT, name))
+    return dirs
+
+
+def check_font_file(path, sha256=None):
+    """Returns None if path is a usable TTF (matching sha256 if given), else the reason it isn't."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(512)
+    except OSError as e:
+        return str(e)
+    if head[:4] not in _TTF_MAGIC:
+        if head.lstrip().startswith(b"<"):
+            return "got HTML instead of TTF"
+        return "not a TrueType font"
+    if sha256 is not None:
+        digest = font_file_hash(path)
+        if digest != sha256:
+            return f"sha256 {digest} does not match pinned {sha256}"
+    return None
+
+
+def find_font(filename, sha256=None, search_cache=True):
+    """
+    Looks for a usable copy of filename in the current folder, the mirror
+    folders and (optionally) the font cache. Returns its path or None.
+    """
+    candidates = [filename] + [os.path.join(d, filename) for d in mirror_dirs()]
+    if search_cache:
+        candidates.append(os.path.join(font_cache_dir(), filename))
+    for path in candidates:
+        if not os.path.exists(path):
+            continue
+        problem = check_font_file(path, sha256)
+        if problem is None:
+            return path
+        print(f"Skipping {path}: {problem}")
+    return None
+
+
+def font_family(path):
+    """The family name in a TTF's name table ('Klee One'), or None if it can't be read."""
+    try:
+        return TTFontFace(path).familyName.decode("latin-1")
+    except Exception:
+        return None
+
+
+def download_font(url, dest, sha256=None, family=None, chunk_size=64 * 1024):
+    """
+    Streams url into dest + '.part' and renames it to dest once verified:
+    against sha256 if given, else by its family name if that is given.
+
+    An existing .part file from an interrupted run is resumed with an HTTP
+    Range request. A bad download is deleted and raises ValueError.
+    """
+    import requests
+
+    part = dest + ".part"
+    hasher = hashlib.sha256()
+    offset = 0
+    if os.path.exists(part):
+        offset = os.path.getsize(part)
+        with open(part, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                hasher.update(chunk)
+
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with requests.get(url, headers=headers, stream=True, allow_redirects=True, timeout=30) as response:
+        # 416 means the .part file already holds the whole font.
+        if response.status_code != 416:
+            response.raise_for_status()
+            if offset and response.status_code != 206:
+                # Server ignored the Range header; start over.
+                offset = 0
+                hasher = hashlib.sha256()
+            with open(part, "ab" if offset else "wb") as f:
+                for chunk in response.iter_content(chunk_size):
+                    hasher.update(chunk)
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+
+    digest = hasher.hexdigest()
+    problem = check_font_file(part)
+    if problem is None and sha256 is not None and digest != sha256:
+        problem = f"sha256 {digest} does not match pinned {sha256}"
+    if problem is None and sha256 is None and family is not None and font_family(part) != family:
+        problem = f"font family is {font_family(part)!r}, not {family!r}"
+    if problem is not None:
+        os.remove(part)
+        raise ValueError(f"Download failed ({problem}).")
+
+    os.replace(part, dest)
+    if sha256 is None:
+        print(f"WARNING: downloaded an unpinned font; its sha256 is {digest}. "
+              f"Pin it in FONT_SOURCES.")
+    return dest
+
+
+def get_japanese_font(filename="KleeOne-Regular.ttf"):
+    """
+    Returns the path of a usable Japanese TTF, or None.
+
+    Local copies are preferred: the current folder, then the mirror folders,
+    then the font cache. Only if none of those has a good copy is the font
+    downloaded (into the font cache), verified as FONT_SOURCES says.
+    """
+    source = FONT_SOURCES.get(filename, {})
+    sha256 = source.get("sha256")
+
+    path = find_font(filename, sha256)
+    if path:
+        if source.get("url") and sha256 is None:
+            print(f"WARNING: using {path} unverified: FONT_SOURCES has no sha256 for {filename}.")
+        return path
+
+    url = source.get("url")
+    if url:
+        dest = os.path.join(font_cache_dir(), filename)
+        print(f"Downloading font: {filename}...")
+        try:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            download_font(url, dest, sha256, source.get("family"))
+            print("Font downloaded successfully.")
+            return dest
+        except Exception as e:
+            print(f"Error downloading font: {e}")
+
+    for fallback in FALLBACK_FONTS:
+        path = find_font(fallback, search_cache=False)
+        if path:
+            print(f"Using fallback font: {path}")
+            return path
+
+    print(f"Please manually download {filename} and place it in this folder.")
+    return None
+
+
+def japanese_font(filename="KleeOne-Regular.ttf", name="JapaneseFont"):
+    """
+    Finds (or downloads) filename, registers it as name and returns name;
+    returns 'Helvetica' instead, with a warning, if no usable font is found.
+
+    This is the font set-up every worksheet script starts with. It runs
+    once per process, so scripts loaded side by side (genki/build.py,
+    genki/serve.py) share one registration.
+    """
+    key = (name, filename)
+    font_name = _registered.get(key)
+    if font_name is not None:
+        return font_name
+
+    font_name = "Helvetica"
+    path = get_japanese_font(filename)
+    if path:
+        try:
+            register_font(name, path)
+            font_name = name
+        except Exception as e:
+            print(f"Font Error: {e}")
+            print("Try deleting the .ttf file and running this script again.")
+    else:
+        print(f"Warning: {filename} not found. Japanese text will not display.")
+    _registered[key] = font_name
+    return font_name
@@ -0,0 +1,486 @@
+"""
+Automatic furigana: fills in {base|reading} ruby markup (genki/ruby.py) for
+the kanji in worksheet text, from a local reading dictionary.
+
+    annotate('銀行は閉まっているはずです')
+        -> '{銀行|ぎんこう}は{閉|し}まっているはずです'
+
+The words come from genki/data/readings.tsv (written form, tab, reading) and
+from any files listed in GENKI_DICT (os.pathsep separated), either in the same
+format or UTF-8 EDICT lines ("表記 [よみ] /gloss/"). Earlier sources win, so the
+shipped list overrides an imported dictionary.
+
+The sources are compiled into a double-array trie (one int32 base/check/value
+triple per cell, plus a table mapping each character to a dense code) and
+written to the reading cache (~/.cache/genki_worksheets/readings, override
+with GENKI_READING_CACHE). Loading it is a single mmap, so it is ready
+at once and worker processes share its pages; it is rebuilt when a source
+file changes.
+
+Verbs and adjectives are keyed by their stem (借り for 借りる), so the longest
+match at each kanji covers any okurigana that follows (お借りしました, 借りて).
+Text inside <tags>, &entities; and existing {base|reading} markup is left
+alone, so a reading typed by hand always wins. Kanji the dictionary doesn't
+know are left bare and counted (stats['unknown']).
+
+Spec items opt in with make_styles(..., furigana=True) (genki/spec.py);
+scripts that build their own Paragraphs use FuriganaParagraph. Either can
+be limited to the kanji a class hasn't learned yet (genki/kanji.py):
+make_styles(..., lesson=19) / FuriganaParagraph.for_lesson(19).
+
+    python -m genki.furigana compile                 # build the cache, show its size
+    python -m genki.furigana lookup 召し上がります 来ない
+    python -m genki.furigana annotate                # every spec in the workbook, timed
+"""
+import os
+import re
+import sys
+import mmap
+import time
+import struct
+import hashlib
+import argparse
+import tempfile
+from array import array
+from collections import Counter
+
+from genki.kanji import unlearned_re
+from genki.kinsoku import KinsokuParagraph
+from genki.ruby import RUBY_RE, ruby
+
+# Bump this when the layout of the compiled file changes.
+CACHE_FORMAT = 1
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+READINGS = os.path.join(REPO_ROOT, "genki", "data", "readings.tsv")
+
+_MAGIC = b"GKDA"
+_HEADER = struct.Struct("=4sIII")    # magic, format, cells, blob bytes
+_CHARS = 0x10000                     # the char -> code table covers the BMP
+
+# Okurigana dropped from the key, so every conjugation of the word matches
+_ENDINGS = "うくぐすつぬぶむるい"
+
+_SEG, _WORD = "\x1f", "\x1e"    # between base and reading, between segments
+
+_dic = {}          # the loaded dictionary: 'path', 'map', 'chars', 'base', 'check', 'value', 'blob'
+_values = {}       # blob offset -> segments
+_annotated = {}    # (text, lesson, kana) -> annotated text
+_warned = set()    # kanji already reported as having no reading
+_lesson_classes = {}    # (lesson, kana) -> FuriganaParagraph subclass
+stats = {'strings': 0, 'readings': 0, 'unknown': Counter()}
+
+# Markup the annotator steps over: tags, entities and readings already given
+_SKIP_RE = re.compile(r'<[^>]*>|&#?\w+;|' + RUBY_RE.pattern)
+_KANJI_RE = re.compile('[㐀-䶿一-鿿豈-﫿々〆ヶ]')
+
+
+def is_kanji(ch):
+    return _KANJI_RE.match(ch) is not None
+
+
+# --- SOURCES ---
+
+def reading_cache_dir():
+    """
+    Where the compiled dictionary is kept.
+    Override with the GENKI_READING_CACHE environment variable.
+    """
+    default = os.path.join(os.path.expanduser("~"), ".cache", "genki_worksheets", "readings")
+    return os.environ.get("GENKI_READING_CACHE", default)
+
+
+def sources():
+    """The word lists, highest priority first."""
+    extra = [p for p in os.environ.get("GENKI_DICT", "").split(os.pathsep) if p]
+    return [READINGS] + extra
+
+
+def _read_source(path):
+    """Yields (written form, reading, exact) from a readings.tsv or (UTF-8) EDICT file."""
+    with open(path, encoding="utf-8-sig", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line or line.startswith("#"):
+                continue
+            if "\t" in line:
+                fields = line.split("\t")
+                yield fields[0].strip(), fields[1].strip(), fields[2:3] == ["exact"]
+                continue
+            # EDICT: 表記;表記2 [よみ;よみ2] /gloss/...
+            m = re.match(r'(\S+) \[([^\]]+)\] /', line)
+            if m:
+                reading = re.sub(r'\(.*?\)', '', m.group(2).split(";")[0])
+                for surface in m.group(1).split(";"):
+                    yield re.sub(r'\(.*?\)', '', surface), reading, False
+
+
+def _align(surface, reading):
+    """
+    Splits a word into (text, reading) segments: kanji runs with their part
+    of the reading, kana with '' (e.g. 召し上がる -> 召/め し 上/あ がる). A word
+    whose kana don't line up with the reading is one segment.
+    """
+    runs = re.findall(f'{_KANJI_RE.pattern}+|(?:(?!{_KANJI_RE.pattern}).)+', surface)
+    pattern = "".join("(.+?)" if is_kanji(run[0]) else f"({re.escape(run)})" for run in runs)
+    m = re.fullmatch(pattern, reading)
+    if m is None:
+        return [(surface, reading)]
+    return [(run, part if is_kanji(run[0]) else "") for run, part in zip(runs, m.groups())]
+
+
+def _entry(surface, reading, exact=False):
+    """(key, segments) for one word, or None if it has no kanji to look up."""
+    if not reading or not _KANJI_RE.search(surface) or any(ord(ch) >= _CHARS for ch in surface):
+        return None
+    segments = _align(surface, reading)
+    # Lookups start at a kanji: drop a leading お / ご
+    if not segments[0][1] and len(segments) > 1:
+        segments = segments[1:]
+    text, part = segments[-1]
+    if not exact and not part and len(segments) > 1 and text[-1] in _ENDINGS:
+        segments = segments[:-1] + ([(text[:-1], "")] if len(text) > 1 else [])
+    return "".join(text for text, _ in segments), segments
+
+
+# --- COMPILE ---
+
+def _build_trie(entries):
+    """(chars, base, check, value) arrays of the double-array trie for {key: value index}."""
+    chars = array("H", bytes(2 * _CHARS))
+    for code, ch in enumerate(sorted({ch for key in entries for ch in key}), 1):
+        chars[ord(ch)] = code
+
+    # Plain nested-dict trie first: node -> {code: child}, value under None
+    root = {}
+    for key, value in entries.items():
+        node = root
+        for ch in key:
+            node = node.setdefault(chars[ord(ch)], {})
+        node[None] = value
+
+    base, check, value = array("i", [0]), array("i", [0]), array("i", [-1])
+    used = bytearray(b"\x01")    # cells taken (the root is cell 0)
+
+    def grow(size):
+        while len(base) < size:
+            base.append(0)
+            check.append(-1)
+            value.append(-1)
+            used.append(0)
+
+    pending = [(0, root)]
+    while pending:
+        cell, node = pending.pop()
+        if None in node:
+            value[cell] = node[None]
+        codes = sorted(code for code in node if code is not None)
+        if not codes:
+            continue
+        # First base at which every child's cell is free
+        start = 1
+        while True:
+            free = used.find(0, start + codes[0])
+            at = (free if free >= 0 else len(used)) - codes[0]
+            grow(at + codes[-1] + 1)
+            if all(not used[at + code] for code in codes):
+                break
+            start = at + 1
+        base[cell] = at
+        for code in codes:
+            used[at + code] = 1
+            check[at + code] = cell
+            pending.append((at + code, node[code]))
+    return chars, base, check, value
+
+
+def compile_dictionary(paths, out):
+    """Compiles the word lists into the trie file at out. Returns the number of words."""
+    entries, blob = {}, bytearray()
+    for path in paths:
+        for surface, reading, exact in _read_source(path):
+            entry = _entry(surface, reading, exact)
+            if entry is None or entry[0] in entries:
+                continue
+            key, segments = entry
+            data = _WORD.join(f"{text}{_SEG}{part}" for text, part in segments).encode("utf-8")
+            entries[key] = len(blob)
+            blob += struct.pack("=H", len(data)) + data
+
+    chars, base, check, value = _build_trie(entries)
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(out), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, CACHE_FORMAT, len(base), len(blob)))
+        for table in (chars, base, check, value):
+            table.tofile(f)
+        f.write(blob)
+    os.replace(tmp, out)
+    return len(entries)
+
+
+def _cache_path(paths):
+    """The compiled file for these sources; a changed source gets a new name."""
+    digest = hashlib.sha256()
+    for path in paths:
+        st = os.stat(path)
+        digest.update(f"{os.path.realpath(path)}\0{st.st_size}\0{st.st_mtime_ns}\0".encode())
+    tag = "%s-v%d" % (sys.byteorder, CACHE_FORMAT)
+    return os.path.join(reading_cache_dir(), "%s-%s.dic" % (digest.hexdigest()[:32], tag))
+
+
+# --- LOOKUP ---
+
+def load(path=None):
+    """Maps the compiled dictionary (compiling it first if needed). Returns its path."""
+    if path is None:
+        paths = sources()
+        path = _cache_path(paths)
+        if not os.path.exists(path):
+            compile_dictionary(paths, path)
+    if _dic.get('path') == path:
+        return path
+
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(data)
+    magic, version, cells, blob_size = _HEADER.unpack_from(view)
+    if magic != _MAGIC or version != CACHE_FORMAT:
+        raise ValueError(f"Not a reading dictionary (format {CACHE_FORMAT}): {path}")
+    pos = _HEADER.size
+    tables = {'path': path, 'map': data}
+    for name, fmt, count in (('chars', 'H', _CHARS), ('base', 'i', cells), ('check', 'i', cells),
+                             ('value', 'i', cells)):
+        size = count * struct.calcsize(fmt)
+        tables[name] = view[pos:pos + size].cast(fmt)
+        pos += size
+    tables['blob'] = view[pos:pos + blob_size]
+    _dic.clear()
+    _dic.update(tables)
+    _values.clear()
+    _annotated.clear()
+    return path
+
+
+def _segments(offset):
+    segments = _values.get(offset)
+    if segments is None:
+        blob = _dic['blob']
+        size, = struct.unpack_from("=H", blob, offset)
+        data = bytes(blob[offset + 2:offset + 2 + size]).decode("utf-8")
+        segments = _values[offset] = tuple(tuple(s.split(_SEG)) for s in data.split(_WORD))
+    return segments
+
+
+def longest_match(text, pos=0, end=None):
+    """(end, segments) for the longest dictionary word starting at text[pos], or None."""
+    if not _dic:
+        load()
+    chars, base, check, value = _dic['chars'], _dic['base'], _dic['check'], _dic['value']
+    cells = len(base)
+    cell, best = 0, None
+    for i in range(pos, len(text) if end is None else end):
+        code = ord(text[i])
+        if code >= _CHARS or not chars[code]:
+            break
+        nxt = base[cell] + chars[code]
+        if nxt >= cells or check[nxt] != cell:
+            break
+        cell = nxt
+        if value[cell] >= 0:
+            best = (i + 1, value[cell])
+    if best is None:
+        return None
+    return best[0], _segments(best[1])
+
+
+def _annotate_run(text, out, unlearned=None, kana=False):
+    pos = 0
+    while True:
+        m = _KANJI_RE.search(text, pos)
+        if m is None:
+            out.append(text[pos:])
+            return
+        start = m.start()
+        out.append(text[pos:start])
+        match = longest_match(text, start)
+        if match is None:
+            ch = text[start]
+            if unlearned is None or unlearned.match(ch):
+                stats['unknown'][ch] += 1
+                if ch not in _warned:
+                    _warned.add(ch)
+                    print(f"Warning: no reading for {ch}; add its word to {os.path.relpath(READINGS, REPO_ROOT)}")
+            out.append(ch)
+            pos = start + 1
+            continue
+        pos, segments = match
+        if unlearned is not None and not unlearned.search(text, start, pos):
+            out.append(text[start:pos])
+            continue
+        for base, reading in segments:
+            if not reading:
+                out.append(base)
+            elif kana:
+                out.append(reading)
+                stats['readings'] += 1
+            else:
+                out.append(ruby(base, reading))
+                stats['readings'] += 1
+
+
+def annotate(text, lesson=None, kana=False):
+    """
+    text with {base|reading} markup added for every kanji word the dictionary
+    knows. Given a lesson, only words with kanji not taught by then get
+    readings (genki/kanji.py); kana=True writes those words in kana instead.
+    """
+    key = (text, lesson, kana)
+    done = _annotated.get(key)
+    if done is not None:
+        return done
+    unlearned = None if lesson is None else unlearned_re(lesson)
+    if (unlearned or _KANJI_RE).search(text) is None:
+        done = text
+    else:
+        if not _dic:
+            load()
+        out, pos = [], 0
+        for m in _SKIP_RE.finditer(text):
+            _annotate_run(text[pos:m.start()], out, unlearned, kana)
+            out.append(m.group())
+            pos = m.end()
+        _annotate_run(text[pos:], out, unlearned, kana)
+        done = "".join(out)
+    stats['strings'] += 1
+    _annotated[key] = done
+    return done
+
+
+# Spec item fields that aren't text shown in a Paragraph
+_ITEM_SKIP = ('type', 'only', 'cells', 'widths', 'padding', 'answer_col', 'blank', 'name', 'height',
+              'number', 'answer', 'start')
+
+
+def _annotate_value(value, lesson, kana):
+    if isinstance(value, str):
+        return annotate(value, lesson, kana)
+    if isinstance(value, (list, tuple)):
+        return type(value)(_annotate_value(v, lesson, kana) for v in value)
+    return value
+
+
+def annotate_item(item, lesson=None, kana=False):
+    """
+    A copy of a spec item (genki/spec.py) with its text annotated. Table cells
+    are plain strings unless the item has 'cells': 'paragraph', so only those
+    (and a drill's answer column, which the key sets as Paragraphs) get readings.
+    """
+    out = {}
+    for key, value in item.items():
+        if key == 'data':
+            if item.get('cells') == 'paragraph':
+                value = _annotate_value(value, lesson, kana)
+            elif item['type'] == 'drill':
+                col = item.get('answer_col', -1)
+                rows = [value[0]]
+                for row in value[1:]:
+                    row = list(row)
+                    row[col] = annotate(row[col], lesson, kana)
+                    rows.append(row)
+                value = rows
+        elif key not in _ITEM_SKIP:
+            value = _annotate_value(value, lesson, kana)
+        out[key] = value
+    return out
+
+
+class FuriganaParagraph(KinsokuParagraph):
+    """KinsokuParagraph (ruby and Japanese line breaking) that annotates its text with readings first."""
+
+    lesson = None    # see for_lesson()
+    kana = False
+
+    def __init__(self, text, style=None, bulletText=None, frags=None, caseSensitive=1, encoding='utf8'):
+        if isinstance(text, str) and frags is None:
+            text = annotate(text, self.lesson, self.kana)
+        KinsokuParagraph.__init__(self, text, style, bulletText, frags, caseSensitive, encoding)
+
+    @classmethod
+    def for_lesson(cls, lesson, kana=False):
+        """A FuriganaParagraph class that only annotates kanji not taught by the end of lesson."""
+        key = (lesson, kana)
+        sub = _lesson_classes.get(key)
+        if sub is None:
+            sub = _lesson_classes[key] = type(f"FuriganaParagraphL{lesson}", (cls,), {'lesson': lesson, 'kana': kana})
+        return sub
+
+
+# --- COMMAND LINE ---
+
+def _spec_strings(lessons):
+    """Every spec item of every worksheet script (see genki/workbook.py)."""
+    from genki.build import discover, load_script
+    from genki.variants import spec_names
+
+    items, scripts = [], []
+    for script, _ in discover(lessons):
+        if script not in scripts:
+            scripts.append(script)
+    for script in scripts:
+        module = load_script(script)
+        for name in spec_names(script):
+            items.extend(getattr(module, name))
+    return items
+
+
+def main(argv=None):
+    # Under -m this file is __main__; the worksheets use the genki.furigana copy
+    from genki import furigana
+
+    parser = argparse.ArgumentParser(description="Compile the reading dictionary, look words up, or time annotation.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("compile", help="Build the compiled dictionary and show its size")
+    lookup = sub.add_parser("lookup", help="Annotate the given text")
+    lookup.add_argument("text", nargs="+")
+    run = sub.add_parser("annotate", help="Annotate every spec in the workbook and time it")
+    run.add_argument("lessons", nargs="*", help="Lesson folders (default: all)")
+    run.add_argument("--repeat", type=int, default=1, help="Annotate everything N times, uncached (default: 1)")
+    for command in (lookup, run):
+        command.add_argument("--lesson", type=int, help="Only kanji not taught by the end of this lesson")
+        command.add_argument("--kana", action="store_true", help="Write those words in kana instead")
+    args = parser.parse_args(argv)
+
+    if args.command == "compile":
+        paths = furigana.sources()
+        path = furigana._cache_path(paths)
+        start = time.perf_counter()
+        words = furigana.compile_dictionary(paths, path)
+        seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        furigana.load(path)
+        print(f"{words} words from {len(paths)} source(s) in {seconds * 1000:.1f}ms: {path}")
+        print(f"{len(furigana._dic['base'])} cells, {os.path.getsize(path) / 1e3:.1f} kB, "
+              f"mapped in {(time.perf_counter() - start) * 1e6:.0f}us")
+    elif args.command == "lookup":
+        for text in args.text:
+            print(furigana.annotate(text, args.lesson, args.kana))
+    else:
+        items = _spec_strings(args.lessons)
+        furigana.load()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            furigana._annotated.clear()
+            for item in items:
+                furigana.annotate_item(item, args.lesson, args.kana)
+        seconds = time.perf_counter() - start
+        unknown = furigana.stats['unknown']
+        print(f"{len(items)} items x {args.repeat}: {furigana.stats['strings']} strings, "
+              f"{furigana.stats['readings']} readings in {seconds * 1000:.1f}ms")
+        if unknown:
+            print("No reading for: " + " ".join(f"{ch}({n // args.repeat})" for ch, n in unknown.most_common()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,343 @@
+"""
+Auto-grading: each answer key compiled into an index of normalized accepted
+answers, and whole batches of submissions scored against it across a
+process pool.
+
+    python -m genki.grading key "Lesson 19/Genki_Honorifics_Worksheet.py"      # what the key accepts
+    python -m genki.grading grade "Lesson 20/L20_worksheet1.py" answers.csv --out results.csv
+    python -m genki.grading bench "Lesson 20/L20_worksheet1.py" --students 200000 -j 4
+
+compile_key() numbers the gradable blanks of a spec by section ('II.3' is
+the third blank under header II.): drill rows, 'blanks', 'choice' and
+'circle' items ('answer' items are free text and are not graded). For each
+blank it accepts:
+
+  * every alternative the key spells out: 'X or Y', 'X (or Z)', and
+    the bold part of a sentence on its own (田中と<b>申します</b>)
+  * with and without any other part in parentheses ('(駅まで) むかえに...')
+  * the kana reading of its kanji (from {base|reading} markup and
+    genki/furigana.py), so 参ります and まいります both count
+  * for choices, the letter as well as the text
+
+Keys and answers both go through normalize(): NFKC (full-width ASCII and
+half-width kana folded), katakana to hiragana, lower case, and markup,
+spaces and punctuation dropped. Each distinct answer string is normalized
+once per worker, so a school's worth of the same answers costs a dict
+lookup each.
+
+Submissions are CSV (a 'student' column, optionally a 'variant' column with
+the seed of the student's genki/variants.py sheet, and one column per
+question id) or JSON (a list of {"student": ..., "variant": ...,
+"answers": {id: answer}}).
+"""
+import os
+import re
+import csv
+import sys
+import json
+import time
+import random
+import argparse
+import unicodedata
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHOICE_LETTERS = 'abcdefgh'
+
+_MARKUP_RE = re.compile(r'<[^>]*>|&\w+;')
+_NUMERAL_RE = re.compile(r'^\s*([IVX]+)\.')
+_BOLD_RE = re.compile(r'<b>(.*?)</b>')
+_OR_RE = re.compile(r'\s+or\s+')
+_OR_PAREN_RE = re.compile(r'[(（]\s*or\s+([^()（）]*)[)）]')
+_PAREN_RE = re.compile(r'[(（]([^()（）]*)[)）]')
+_DROP_RE = re.compile(r'[\s。、，．.,!?！？・~〜「」『』"\'()\[\]:;]+')
+_KATAKANA = str.maketrans({chr(code): chr(code - 0x60) for code in range(0x30A1, 0x30F7)})
+_TO_KATAKANA = str.maketrans({chr(code - 0x60): chr(code) for code in range(0x30A1, 0x30F7)})
+_TO_FULL_WIDTH = str.maketrans({chr(code): chr(code + 0xFEE0) for code in range(0x21, 0x7F)})
+
+_normalized = {}    # answer as given -> normalized
+_worker = {}        # content, compiled keys by variant seed: set by _init_worker
+
+
+# --- NORMALIZING ---
+
+def normalize(text):
+    """The form answers are compared in: no markup, spaces or punctuation; kana in hiragana; NFKC."""
+    done = _normalized.get(text)
+    if done is None:
+        from genki.ruby import plain
+
+        folded = _MARKUP_RE.sub(' ', plain(unicodedata.normalize('NFKC', text)))
+        done = _normalized[text] = _DROP_RE.sub('', folded.translate(_KATAKANA).lower())
+    return done
+
+
+def _optional(text):
+    """text with and without each part in parentheses."""
+    m = _PAREN_RE.search(text)
+    if m is None:
+        return [text]
+    head = text[:m.start()]
+    rest = _optional(text[m.end():])
+    return [head + r for r in rest] + [head + m.group(1) + r for r in rest]
+
+
+def alternatives(answer):
+    """The answers a key entry accepts, as written: '<b>A</b> (or B)' -> ['A', 'B']."""
+    text = _MARKUP_RE.sub(' ', answer)
+    # The bold part of a sentence is what goes in the blank: 田中と<b>申します</b>
+    found = [_MARKUP_RE.sub(' ', bold).strip() for bold in _BOLD_RE.findall(answer)]
+    for part in _OR_RE.split(text):
+        found.extend(m.strip() for m in _OR_PAREN_RE.findall(part))
+        found.extend(option.strip() for option in _optional(_OR_PAREN_RE.sub('', part)))
+    return list(dict.fromkeys(a for a in found if a))
+
+
+def accepted(answer, extra=()):
+    """Normalized forms accepted for one key entry: its alternatives, in kanji and in kana."""
+    from genki.furigana import annotate
+    from genki.ruby import plain
+
+    forms = set()
+    for alt in list(alternatives(answer)) + list(extra):
+        forms.add(normalize(alt))
+        forms.add(normalize(plain(annotate(plain(alt, readings=True), kana=True))))
+        forms.add(normalize(plain(annotate(alt, kana=True), readings=True)))
+    forms.discard('')
+    return frozenset(forms)
+
+
+# --- KEYS ---
+
+def questions(content):
+    """(id, prompt, key entry, extra accepted answers) for every gradable blank of a spec, in order."""
+    section, sections, n = '0', 0, 0
+    for item in content:
+        kind = item['type']
+        if kind == 'header':
+            sections += 1
+            m = _NUMERAL_RE.match(item['text'])
+            section, n = (m.group(1) if m else str(sections)), 0
+        elif kind == 'drill':
+            col = item.get('answer_col', -1)
+            for row in item['data'][1:]:
+                n += 1
+                yield f"{section}.{n}", row[0], row[col], ()
+        elif kind == 'blanks':
+            for number, (answer, _) in enumerate(item['answers'], item.get('start', 1)):
+                n += 1
+                yield f"{section}.{n}", f"({number})", answer, ()
+        elif kind == 'choice':
+            n += 1
+            letter = CHOICE_LETTERS[item['answer']]
+            yield f"{section}.{n}", item['prompt'], item['choices'][item['answer']], (letter, f"({letter})")
+        elif kind == 'circle':
+            for number, (choices, answer) in enumerate(zip(item['choices'], item['answers']), 1):
+                n += 1
+                letter = CHOICE_LETTERS[answer]
+                yield f"{section}.{n}", f"({number})", choices[answer], (letter, f"({letter})")
+
+
+def compile_key(content):
+    """question id -> frozenset of normalized accepted answers, for a spec."""
+    return {qid: accepted(answer, extra) for qid, _, answer, extra in questions(content)}
+
+
+def grade(key, answers):
+    """(score, {question id: True/False}) for one submission's {question id: answer}."""
+    marks = {}
+    for qid, forms in key.items():
+        given = answers.get(qid)
+        marks[qid] = bool(given) and normalize(given) in forms
+    return sum(marks.values()), marks
+
+
+# --- BATCHES ---
+
+def read_submissions(path):
+    """[(student, variant seed or None, {question id: answer})] from a CSV or JSON file."""
+    if path.endswith('.json'):
+        with open(path, encoding="utf-8") as f:
+            return [(s['student'], s.get('variant'), s.get('answers', {})) for s in json.load(f)]
+    out = []
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            student = row.pop('student')
+            variant = row.pop('variant', None)
+            out.append((student, int(variant) if variant else None, row))
+    return out
+
+
+def _init_worker(script, spec_name):
+    from genki.build import load_script
+
+    _worker['content'] = getattr(load_script(script), spec_name)
+    _worker['keys'] = {None: compile_key(_worker['content'])}
+
+
+def _key_for(variant):
+    key = _worker['keys'].get(variant)
+    if key is None:
+        from genki.variants import make_variant
+
+        key = _worker['keys'][variant] = compile_key(make_variant(_worker['content'], variant))
+    return key
+
+
+def _grade_chunk(submissions):
+    """Scores and per-question tallies (attempts, correct, wrong answers) for a chunk."""
+    results, tallies = [], {}
+    for student, variant, answers in submissions:
+        key = _key_for(variant)
+        score, marks = grade(key, answers)
+        results.append((student, variant, score, len(key), marks))
+        for qid, right in marks.items():
+            tally = tallies.get(qid)
+            if tally is None:
+                tally = tallies[qid] = [0, 0, Counter()]
+            given = answers.get(qid)
+            if given:
+                tally[0] += 1
+            if right:
+                tally[1] += 1
+            elif given:
+                tally[2][normalize(given)] += 1
+    return results, tallies
+
+
+def grade_all(script, spec_name, submissions, workers=None, chunk=2000):
+    """
+    Grades every submission across a process pool (each worker compiles the
+    key once). Returns (results, tallies): (student, variant, score, out of,
+    marks) per submission, and question id -> [attempts, correct, Counter
+    of normalized wrong answers].
+    """
+    chunks = [submissions[i:i + chunk] for i in range(0, len(submissions), chunk)]
+    results, tallies = [], {}
+    if workers == 1:
+        _init_worker(script, spec_name)
+        batches = map(_grade_chunk, chunks)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(script, spec_name))
+        batches = pool.map(_grade_chunk, chunks)
+    try:
+        for batch, batch_tallies in batches:
+            results.extend(batch)
+            for qid, (attempts, correct, wrong) in batch_tallies.items():
+                tally = tallies.setdefault(qid, [0, 0, Counter()])
+                tally[0] += attempts
+                tally[1] += correct
+                tally[2].update(wrong)
+    finally:
+        if workers != 1:
+            pool.shutdown()
+    return results, tallies
+
+
+def write_results(path, results, qids):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        out = csv.writer(f)
+        out.writerow(['student', 'variant', 'score', 'out_of'] + qids)
+        for student, variant, score, total, marks in results:
+            out.writerow([student, '' if variant is None else variant, score, total] + [int(marks[q]) for q in qids])
+
+
+def print_stats(script, spec_name, tallies, count):
+    from genki.build import load_script
+
+    prompts = {qid: prompt for qid, prompt, _, _ in questions(getattr(load_script(script), spec_name))}
+    print(f"{'item':6} {'prompt':22} {'answered':>8} {'correct':>8}  most common wrong answers")
+    for qid, (attempts, correct, wrong) in tallies.items():
+        prompt = normalize(prompts.get(qid, ''))[:20]
+        common = ", ".join(f"{answer} ({n})" for answer, n in wrong.most_common(3))
+        print(f"{qid:6} {prompt:22} {attempts / count:8.0%} {correct / count:8.0%}  {common}")
+
+
+# --- COMMAND LINE ---
+
+def _synthetic(content, count, seed=0):
+    """count made-up submissions: mostly right (as keyed, in kana, katakana or full-width), some wrong or blank."""
+    from genki.ruby import plain
+
+    rng = random.Random(seed)
+    entries = [(qid, alternatives(answer) + list(extra)) for qid, _, answer, extra in questions(content)]
+    wrong = [alt for _, alts in entries for alt in alts]
+    spellings = [
+        lambda a: a,
+        lambda a: plain(a, readings=True),
+        lambda a: plain(a, readings=True).translate(_TO_KATAKANA),
+        lambda a: a.translate(_TO_FULL_WIDTH) + '。',
+    ]
+    out = []
+    for n in range(count):
+        answers = {}
+        for qid, alts in entries:
+            roll = rng.random()
+            if roll < 0.75:
+                answers[qid] = rng.choice(spellings)(rng.choice(alts))
+            elif roll < 0.95:
+                answers[qid] = rng.choice(wrong)
+        out.append((f"student{n:06d}", None, answers))
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade worksheet submissions against the spec's answer key.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help in (("key", "Show the compiled key"), ("grade", "Grade a CSV or JSON file of submissions"),
+                       ("bench", "Grade made-up submissions, for throughput")):
+        command = sub.add_parser(name, help=help)
+        command.add_argument("script", help="Worksheet script, e.g. 'Lesson 20/L20_worksheet1.py'")
+        command.add_argument("--spec", help="Name of the content list in the script (default: its only *_content list)")
+        if name == "grade":
+            command.add_argument("submissions", help="CSV or JSON file")
+            command.add_argument("--out", help="Results CSV (default: <submissions>_graded.csv)")
+        if name == "bench":
+            command.add_argument("--students", type=int, default=100000)
+        if name != "key":
+            command.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes (default: one per core)")
+    args = parser.parse_args(argv)
+
+    from genki.build import load_script
+    from genki.variants import spec_names
+
+    script = os.path.abspath(args.script)
+    names = spec_names(script)
+    spec_name = args.spec or (names[0] if len(names) == 1 else None)
+    if spec_name not in names:
+        parser.error(f"pick a spec with --spec (found: {', '.join(names) or 'none'})")
+
+    if args.command == "key":
+        start = time.perf_counter()
+        content = getattr(load_script(script), spec_name)
+        key = compile_key(content)
+        seconds = time.perf_counter() - start
+        for qid, prompt, answer, _ in questions(content):
+            print(f"{qid:6} {normalize(prompt)[:20]:22} {' | '.join(sorted(key[qid]))}")
+        print(f"{len(key)} questions ({seconds * 1000:.1f}ms)")
+        return 0
+
+    if args.command == "bench":
+        submissions = _synthetic(getattr(load_script(script), spec_name), args.students)
+    else:
+        submissions = read_submissions(args.submissions)
+
+    start = time.perf_counter()
+    results, tallies = grade_all(script, spec_name, submissions, args.jobs)
+    wall = time.perf_counter() - start
+
+    if args.command == "grade":
+        out = args.out or os.path.splitext(args.submissions)[0] + "_graded.csv"
+        write_results(out, results, list(tallies))
+        print(f"Wrote {out}")
+    print_stats(script, spec_name, tallies, len(results))
+    total = sum(r[3] for r in results)
+    mean = sum(r[2] for r in results) / total if total else 0
+    print(f"{len(results)} submissions ({total} answers) graded in {wall:.2f}s: "
+          f"{len(results) / wall:.0f} submissions/s, mean score {mean:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
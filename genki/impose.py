@@ -0,0 +1,448 @@
+"""
+Print imposition: merges generated PDFs into one packet, 2-up or in booklet
+order, ready to print double-sided.
+
+    merge     the pages one after another, as they are
+    2up       two pages side by side on each sheet (A4 pages -> A4 landscape)
+    booklet   2-up in saddle-stitch order: print duplex (flip on the short
+              edge), fold, staple. --signature N splits a long packet into
+              folded sections of N pages
+
+Every source page becomes a form XObject that the packet's pages draw,
+scaled into their slot. Objects are copied with their references renumbered
+and written once per distinct content: a font, font file, resource dict or
+page that several files (or several --copies of one) embed comes out as a
+single object, so a class packet costs about one copy's fonts.
+
+Pages are streamed: the source files are memory-mapped and read through
+their cross-reference tables, each sheet's pages are read and written as the
+sheet is made, and nothing is kept but the object number maps. The reader
+handles the PDFs reportlab writes (cross-reference tables, not streams).
+
+    python -m genki.impose --layout booklet         # the L19/L20 packet from build/ (python -m genki.build first)
+    python -m genki.impose a.pdf b.pdf --layout 2up --copies 30 --out class_packet.pdf
+"""
+import os
+import re
+import sys
+import mmap
+import time
+import zlib
+import base64
+import hashlib
+import argparse
+from collections import namedtuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAYOUTS = ('merge', '2up', 'booklet')
+
+# The L19/L20 print packet, as genki/build.py lays out build/
+PACKET = [
+    "Lesson 19/Genki_L19_Worksheet_Interact.pdf",
+    "Lesson 19/Genki_L19_Worksheet_Reflect.pdf",
+    "Lesson 19/Genki_Honorifics_Worksheet.pdf",
+    "Lesson 19/Genki_Honorifics_AnswerKey.pdf",
+    "Lesson 20/Genki_L19_20_Review_Worksheet.pdf",
+]
+
+Ref = namedtuple('Ref', 'num gen')
+
+
+class Name(str):
+    """A PDF name (/Font), kept as its raw characters."""
+
+
+class Raw(bytes):
+    """A number, string or keyword token, written back out as read."""
+
+
+_DELIMS = rb'\s/<>\[\]()%{}'
+_TOKEN_RE = re.compile(rb'(?:\s|%[^\r\n]*)*(<<|>>|\[|\]|\(|<[0-9A-Fa-f\s]*>|/[^' + _DELIMS + rb']*|[^' + _DELIMS + rb']+)')
+_REF_RE = re.compile(rb'\s+(\d+)\s+R(?=[' + _DELIMS + rb']|$)')
+_OBJ_RE = re.compile(rb'\s*(\d+)\s+(\d+)\s+obj')
+_STREAM_RE = re.compile(rb'\s*stream\r?\n')
+_XREF_SECTION_RE = re.compile(rb'\s*(\d+)\s+(\d+)\s*')
+_XREF_ENTRY_RE = re.compile(rb'(\d{10}) (\d{5}) ([nf])')
+
+
+# --- READING ---
+
+class PdfReader:
+    """Random access to the objects of one PDF, read from a memory map on demand."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.offsets = {}
+        self.trailer = {}
+        start = self.buf.rfind(b'startxref')
+        if start < 0:
+            raise ValueError(f"{path}: not a PDF (no startxref)")
+        pos = int(_TOKEN_RE.match(self.buf, start + 9).group(1))
+        while pos is not None:
+            trailer = self._read_xref(pos)
+            for key, value in trailer.items():
+                self.trailer.setdefault(key, value)
+            prev = trailer.get('Prev')
+            pos = int(prev) if prev is not None else None
+
+    def _read_xref(self, pos):
+        if self.buf[pos:pos + 4] != b'xref':
+            raise ValueError(f"{self.path}: cross-reference streams are not supported (write it with reportlab)")
+        pos += 4
+        while True:
+            m = _XREF_SECTION_RE.match(self.buf, pos)
+            if m is None:
+                break
+            first, count = int(m.group(1)), int(m.group(2))
+            pos = m.end()
+            for num in range(first, first + count):
+                entry = _XREF_ENTRY_RE.search(self.buf, pos)
+                pos = entry.end()
+                if entry.group(3) == b'n':
+                    self.offsets.setdefault(num, int(entry.group(1)))
+        trailer = self.buf.find(b'trailer', pos)
+        return self.parse(trailer + 7)[0]
+
+    def parse(self, pos):
+        """The value at pos and the position after it."""
+        m = _TOKEN_RE.match(self.buf, pos)
+        if m is None:
+            raise ValueError(f"{self.path}: unreadable PDF object at byte {pos}")
+        token, pos = m.group(1), m.end()
+        if token == b'<<':
+            value = {}
+            while True:
+                m = _TOKEN_RE.match(self.buf, pos)
+                if m.group(1) == b'>>':
+                    return value, m.end()
+                key, pos = self.parse(pos)
+                value[key], pos = self.parse(pos)
+        if token == b'[':
+            value = []
+            while True:
+                m = _TOKEN_RE.match(self.buf, pos)
+                if m.group(1) == b']':
+                    return value, m.end()
+                item, pos = self.parse(pos)
+                value.append(item)
+        if token == b'(':
+            return self._string(m.start(1), pos)
+        if token.startswith(b'/'):
+            return Name(token[1:].decode('latin-1')), pos
+        if token.isdigit():
+            ref = _REF_RE.match(self.buf, pos)
+            if ref is not None:
+                return Ref(int(token), int(ref.group(1))), ref.end()
+        return Raw(token), pos
+
+    def _string(self, start, pos):
+        buf, depth = self.buf, 1
+        while depth:
+            c = buf[pos]
+            if c == 0x5C:       # backslash escapes the next byte
+                pos += 1
+            elif c == 0x28:
+                depth += 1
+            elif c == 0x29:
+                depth -= 1
+            pos += 1
+        return Raw(buf[start:pos]), pos
+
+    def object(self, num):
+        """(value, stream data or None) of object num."""
+        pos = self.offsets.get(num)
+        if pos is None:
+            return Raw(b'null'), None
+        m = _OBJ_RE.match(self.buf, pos)
+        if m is None or int(m.group(1)) != num:
+            raise ValueError(f"{self.path}: object {num} is not at its cross-reference offset")
+        value, pos = self.parse(m.end())
+        stream = _STREAM_RE.match(self.buf, pos)
+        if stream is None:
+            return value, None
+        length = int(self.resolve(value['Length']))
+        return value, self.buf[stream.end():stream.end() + length]
+
+    def resolve(self, value):
+        while isinstance(value, Ref):
+            value = self.object(value.num)[0]
+        return value
+
+    def pages(self, node=None, inherited=None):
+        """Yields (page object number, page dict) in order, with inherited Resources/MediaBox filled in."""
+        if node is None:
+            node = self.resolve(self.trailer['Root'])['Pages']
+        inherited = dict(inherited or {})
+        value = self.resolve(node)
+        for key in ('Resources', 'MediaBox', 'CropBox'):
+            if key in value:
+                inherited[key] = value[key]
+        if value.get('Type') == 'Pages' or 'Kids' in value:
+            for kid in self.resolve(value['Kids']):
+                yield from self.pages(kid, inherited)
+        else:
+            yield node.num if isinstance(node, Ref) else None, {**inherited, **value}
+
+    def close(self):
+        self.buf.close()
+
+
+def _decode(stream_dict, data):
+    """Stream data with its filters undone (the ones reportlab uses)."""
+    filters = stream_dict.get('Filter', [])
+    for name in [filters] if isinstance(filters, Name) else filters:
+        if name == 'FlateDecode':
+            data = zlib.decompress(data)
+        elif name == 'ASCII85Decode':
+            data = base64.a85decode(data.strip(), adobe=data.lstrip().startswith(b'<~'))
+        else:
+            raise ValueError(f"can't decode a /{name} content stream")
+    return data
+
+
+# --- WRITING ---
+
+def serialize(value, renumber):
+    """A value as PDF bytes, each reference passed through renumber (Ref -> new object number)."""
+    if isinstance(value, Ref):
+        return b'%d 0 R' % renumber(value)
+    if isinstance(value, Name):
+        return b'/' + value.encode('latin-1')
+    if isinstance(value, dict):
+        return b'<< ' + b' '.join(b'/' + key.encode('latin-1') + b' ' + serialize(item, renumber)
+                                  for key, item in value.items()) + b' >>'
+    if isinstance(value, list):
+        return b'[ ' + b' '.join(serialize(item, renumber) for item in value) + b' ]'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (b'%d' % value) if isinstance(value, int) else (b'%.4f' % value).rstrip(b'0').rstrip(b'.')
+    return bytes(value)
+
+
+class PdfWriter:
+    """Writes objects as they come, each distinct one once, and the cross-reference table at the end."""
+
+    def __init__(self, f):
+        self.f = f
+        self.offsets = [None]       # object number -> byte offset
+        self.digests = {}           # sha1 of an object's bytes -> its number
+        self.copied = {}            # (source index, object number) -> number here
+        self.busy = set()
+        self.deduplicated = 0
+        f.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def reserve(self):
+        self.offsets.append(None)
+        return len(self.offsets) - 1
+
+    def write(self, value, stream=None, num=None, dedupe=True):
+        """Writes value (with its stream data) and returns its object number."""
+        if stream is not None:
+            value = {**value, 'Length': len(stream)}
+        body = serialize(value, lambda ref: ref.num)
+        if dedupe:
+            digest = hashlib.sha1(body + b'\0' + bytes(stream or b'')).digest()
+            found = self.digests.get(digest)
+            if found is not None:
+                self.deduplicated += 1
+                return found
+        if num is None:
+            num = self.reserve()
+        if dedupe:
+            self.digests[digest] = num
+        self.offsets[num] = self.f.tell()
+        self.f.write(b'%d 0 obj\n' % num + body)
+        if stream is not None:
+            self.f.write(b'\nstream\n' + bytes(stream) + b'\nendstream')
+        self.f.write(b'\nendobj\n')
+        return num
+
+    def copy(self, source, reader, value):
+        """value from reader (source is its index) with every object it references copied here."""
+        if isinstance(value, Ref):
+            key = (source, value.num)
+            num = self.copied.get(key)
+            if num is None:
+                if key in self.busy:
+                    raise ValueError(f"{reader.path}: reference cycle through object {value.num}")
+                self.busy.add(key)
+                obj, stream = reader.object(value.num)
+                num = self.copied[key] = self.write(self.copy(source, reader, obj), stream)
+                self.busy.discard(key)
+            return Ref(num, 0)
+        if isinstance(value, dict):
+            return {key: self.copy(source, reader, item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.copy(source, reader, item) for item in value]
+        return value
+
+    def close(self, root, info=None):
+        xref = self.f.tell()
+        lines = [b'xref\n0 %d\n0000000000 65535 f \n' % len(self.offsets)]
+        lines += [b'%010d 00000 n \n' % offset for offset in self.offsets[1:]]
+        trailer = {'Size': len(self.offsets), 'Root': Ref(root, 0)}
+        if info is not None:
+            trailer['Info'] = Ref(info, 0)
+        lines.append(b'trailer\n' + serialize(trailer, lambda ref: ref.num) + b'\nstartxref\n%d\n%%%%EOF\n' % xref)
+        self.f.write(b''.join(lines))
+
+
+# --- IMPOSITION ---
+
+# One source page: (source index, page object number, page dict)
+Page = namedtuple('Page', 'source num page')
+
+
+def _box(page):
+    return [float(v) for v in page.get('CropBox', page['MediaBox'])]
+
+
+def page_form(writer, readers, page):
+    """The object number of a form XObject drawing page (written on first use)."""
+    key = (page.source, 'form', page.num)
+    num = writer.copied.get(key)
+    if num is not None:
+        return num
+    reader = readers[page.source]
+    contents = page.page.get('Contents', [])
+    streams = [reader.object(contents.num)] if isinstance(contents, Ref) else []
+    if streams and isinstance(streams[0][0], list):
+        contents, streams = streams[0][0], []
+    if not streams:
+        streams = [reader.object(part.num) for part in contents]
+    form = {'Type': Name('XObject'), 'Subtype': Name('Form'), 'FormType': 1, 'BBox': _box(page.page),
+            'Resources': writer.copy(page.source, reader, page.page.get('Resources', {}))}
+    if len(streams) == 1:
+        # One content stream: copied as it is, filters and all
+        stream_dict, data = streams[0]
+        for key in ('Filter', 'DecodeParms'):
+            if key in stream_dict:
+                form[key] = writer.copy(page.source, reader, stream_dict[key])
+    else:
+        data = zlib.compress(b'\n'.join(_decode(*stream) for stream in streams))
+        form['Filter'] = Name('FlateDecode')
+    num = writer.copied[key] = writer.write(form, data)
+    return num
+
+
+def sheets(pages, layout, signature=None):
+    """The packet's sheet sides: lists of the pages on each (None for an empty slot)."""
+    if layout == 'merge':
+        return [[page] for page in pages]
+    if layout == '2up':
+        pages = pages + [None] * (len(pages) % 2)
+        return [pages[i:i + 2] for i in range(0, len(pages), 2)]
+    sides = []
+    size = signature or len(pages)
+    for start in range(0, len(pages), size):
+        section = pages[start:start + size]
+        section += [None] * (-len(section) % 4)
+        n = len(section)
+        for i in range(n // 4):
+            sides.append([section[n - 1 - 2 * i], section[2 * i]])
+            sides.append([section[2 * i + 1], section[n - 2 - 2 * i]])
+    return sides
+
+
+def impose(inputs, out, layout='2up', signature=None, copies=1):
+    """
+    Writes inputs (PDF paths) to out as one packet, each of copies starting
+    on a new sheet: a copy with an odd number of sides gets a blank back, so
+    the next one doesn't start on it when printed duplex. Returns the counts
+    and sizes for the report.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout {layout!r} (have: {', '.join(LAYOUTS)})")
+    if signature is not None and (signature <= 0 or signature % 4):
+        raise ValueError("a booklet signature must be a multiple of 4 pages")
+    paths = list(dict.fromkeys(inputs))
+    readers = [PdfReader(path) for path in paths]
+    try:
+        packet = [Page(paths.index(path), num, page)
+                for path in inputs for num, page in readers[paths.index(path)].pages()]
+        if not packet:
+            raise ValueError("no pages to impose")
+        sides = sheets(packet, layout, signature)
+        if copies > 1 and len(sides) % 2:
+            sides.append([None] * len(sides[-1]))
+        sides = sides * copies
+
+        x0, y0, x1, y1 = _box(packet[0].page)
+        width, height = x1 - x0, y1 - y0
+        if layout != 'merge':
+            # Two portrait pages on the same paper turned sideways
+            width, height = max(width, height), min(width, height)
+
+        with open(out, 'wb') as f:
+            writer = PdfWriter(f)
+            pages_num = writer.reserve()
+            kids = []
+            for side in sides:
+                slot = width / len(side)
+                names, ops = {}, []
+                for n, page in enumerate(side):
+                    if page is None:
+                        continue
+                    bx0, by0, bx1, by1 = _box(page.page)
+                    scale = min(slot / (bx1 - bx0), height / (by1 - by0), 1)
+                    tx = n * slot + (slot - (bx1 - bx0) * scale) / 2 - bx0 * scale
+                    ty = (height - (by1 - by0) * scale) / 2 - by0 * scale
+                    name = f'P{n}'
+                    names[name] = Ref(page_form(writer, readers, page), 0)
+                    ops.append(b'q %s 0 0 %s %s %s cm /%s Do Q' % (
+                        *(serialize(v, None) for v in (scale, scale, tx, ty)), name.encode()))
+                contents = writer.write({}, b'\n'.join(ops))
+                kids.append(writer.write({
+                    'Type': Name('Page'), 'Parent': Ref(pages_num, 0), 'MediaBox': [0, 0, width, height],
+                    'Resources': {'XObject': names, 'ProcSet': [Name('PDF')]}, 'Contents': Ref(contents, 0),
+                }, dedupe=False))
+            writer.write({'Type': Name('Pages'), 'Count': len(kids), 'Kids': [Ref(k, 0) for k in kids]},
+                         num=pages_num, dedupe=False)
+            root = writer.write({'Type': Name('Catalog'), 'Pages': Ref(pages_num, 0)}, dedupe=False)
+            writer.close(root)
+    finally:
+        for reader in readers:
+            reader.close()
+    return {
+        'pages': len(packet) * copies, 'sheets': len(sides), 'objects': len(writer.offsets) - 1,
+        'deduplicated': writer.deduplicated, 'bytes': os.path.getsize(out),
+        'input_bytes': sum(os.path.getsize(path) for path in inputs) * copies,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge worksheet PDFs into a 2-up or booklet print packet.")
+    parser.add_argument("inputs", nargs="*", help="PDFs in packet order (default: the L19/L20 packet from --from)")
+    parser.add_argument("--layout", choices=LAYOUTS, default='2up', help="Page layout (default: 2up)")
+    parser.add_argument("--signature", type=int, help="Booklet section size in pages, a multiple of 4 (default: one section)")
+    parser.add_argument("--copies", type=int, default=1, help="Copies of the whole packet, each starting on a new sheet")
+    parser.add_argument("--from", dest="build_dir", default=os.path.join(REPO_ROOT, "build"),
+                        help="Build folder the default packet is read from (default: build/)")
+    parser.add_argument("--out", default=os.path.join(REPO_ROOT, "build", "packet.pdf"), help="PDF to write")
+    args = parser.parse_args(argv)
+
+    inputs = args.inputs or [os.path.join(args.build_dir, name) for name in PACKET]
+    missing = [path for path in inputs if not os.path.exists(path)]
+    if missing:
+        print(f"Missing: {', '.join(missing)}")
+        if not args.inputs:
+            print("Build them first: python -m genki.build")
+        return 1
+
+    start = time.perf_counter()
+    try:
+        stats = impose(inputs, args.out, args.layout, args.signature, args.copies)
+    except ValueError as e:
+        print(e)
+        return 1
+    seconds = time.perf_counter() - start
+    print(f"{stats['pages']} pages on {stats['sheets']} {args.layout} sheet sides -> {args.out}")
+    print(f"{stats['bytes'] / 1e3:.0f} kB ({stats['input_bytes'] / 1e3:.0f} kB of input), "
+          f"{stats['objects']} objects written, {stats['deduplicated']} duplicates shared, in {seconds * 1000:.0f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+Incremental builds: skip doc.build(story) when nothing that affects the PDF changed.
+
+The scripts call build_pdf(doc, story) instead of doc.build(story). With
+incremental mode off (the default) that is exactly doc.build(story). With it
+on (GENKI_INCREMENTAL=1, or `python -m genki.build --incremental`) the story is
+fingerprinted first:
+
+  * every flowable's text / table data, recursively
+  * every ParagraphStyle and TableStyle parameter
+  * page size and margins
+  * the SHA-256 of each TrueType font the story uses
+
+and the build is skipped if the output file already exists and the manifest
+next to it (.genki-build.json) recorded the same fingerprint for it.
+"""
+import os
+import json
+import time
+import hashlib
+import tempfile
+import types
+
+import reportlab
+from reportlab import rl_config
+from reportlab.lib.colors import Color
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Paragraph
+
+from genki.fonts import cached_font_hash
+from genki.stream import StreamingStory
+
+MANIFEST_NAME = ".genki-build.json"
+
+# Bump this when the fingerprint recipe changes, so old manifests stop matching.
+FINGERPRINT_VERSION = 1
+
+# Attributes that are derived from the ones we already hash, or hold layout
+# state that only exists after a build.
+_SKIP_ATTRS = {"frags", "_frames", "_calc", "canv", "_doc", "_parentFrame"}
+
+_FONT_ATTRS = {"fontName", "fontname", "bulletFontName"}
+
+_enabled = os.environ.get("GENKI_INCREMENTAL") == "1"
+_deferred = False
+_records = []
+
+# Running totals of the doc.build() calls made by build_pdf in this process
+# (read by genki/bench.py to split story assembly from layout and writing).
+build_stats = {"builds": 0, "seconds": 0.0, "pages": 0}
+
+
+def enable(deferred=False):
+    """
+    Turns incremental mode on for this process. With deferred=True the
+    manifest is not written here; the caller collects take_records() and
+    writes it once (genki.build does this for its worker processes).
+    """
+    global _enabled, _deferred
+    _enabled = True
+    _deferred = deferred
+
+
+def is_enabled():
+    return _enabled
+
+
+# --- FINGERPRINTS ---
+
+class _Hasher:
+    def __init__(self):
+        self.sha = hashlib.sha256()
+        self.fonts = set()
+        self._seen = {}
+
+    def add(self, obj):
+        update = self.sha.update
+        if obj is None or isinstance(obj, (bool, int, float, str, bytes)):
+            update(repr(obj).encode("utf8"))
+        elif isinstance(obj, (list, tuple)):
+            update(b"[")
+            for item in obj:
+                self.add(item)
+                update(b",")
+            update(b"]")
+        elif isinstance(obj, dict):
+            update(b"{")
+            for key in sorted(obj, key=repr):
+                if key in _SKIP_ATTRS:
+                    continue
+                value = obj[key]
+                if key in _FONT_ATTRS and isinstance(value, str):
+                    self.fonts.add(value)
+                update(repr(key).encode("utf8"))
+                update(b":")
+                self.add(value)
+                update(b",")
+            update(b"}")
+        elif isinstance(obj, (set, frozenset)):
+            self.add(sorted(obj, key=repr))
+        elif isinstance(obj, Color):
+            update(repr(obj).encode("utf8"))
+        elif isinstance(obj, Paragraph):
+            update(b"Paragraph(")
+            self.add((obj.text, obj.bulletText, obj.caseSensitive))
+            self.add(obj.style)
+            update(b")")
+        elif isinstance(obj, (types.FunctionType, types.MethodType, types.BuiltinFunctionType)):
+            update(getattr(obj, "__qualname__", type(obj).__name__).encode("utf8"))
+        elif hasattr(obj, "__dict__"):
+            # Styles are shared by many flowables; hash each one once.
+            key = id(obj)
+            if key in self._seen:
+                update(self._seen[key])
+                return
+            update(type(obj).__name__.encode("utf8"))
+            self.add(vars(obj))
+            self._seen[key] = ("<%s#%d>" % (type(obj).__name__, len(self._seen))).encode("utf8")
+        else:
+            update(type(obj).__name__.encode("utf8"))
+
+
+def fingerprint(doc, story):
+    """A hex digest of everything in doc's setup and story that ends up in the PDF."""
+    h = _Hasher()
+    h.add((FINGERPRINT_VERSION, reportlab.Version, rl_config.invariant))
+    h.add((type(doc).__name__, tuple(doc.pagesize), doc.leftMargin, doc.rightMargin,
+           doc.topMargin, doc.bottomMargin, doc.title, doc.author, doc.subject, doc.creator))
+    for flowable in story:
+        h.add(flowable)
+    for name in sorted(h.fonts):
+        try:
+            font = pdfmetrics.getFont(name)
+        except KeyError:
+            h.add((name, None))
+            continue
+        if isinstance(font, TTFont):
+            h.add((name, cached_font_hash(font.face.filename)))
+        else:
+            h.add((name, type(font).__name__))
+    return h.sha.hexdigest()
+
+
+# --- MANIFEST ---
+
+def manifest_path(out_dir):
+    return os.path.join(out_dir, MANIFEST_NAME)
+
+
+def read_manifest(out_dir):
+    try:
+        with open(manifest_path(out_dir), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"documents": {}}
+
+
+def update_manifest(out_dir, records):
+    """Merges [(filename, fingerprint, status, size), ...] into out_dir's manifest."""
+    manifest = read_manifest(out_dir)
+    docs = manifest.setdefault("documents", {})
+    for filename, digest, status, size in records:
+        docs[os.path.basename(filename)] = {"fingerprint": digest, "size": size, "status": status}
+    manifest["hits"] = sum(1 for d in docs.values() if d["status"] == "hit")
+    manifest["misses"] = sum(1 for d in docs.values() if d["status"] == "miss")
+    fd, tmp = tempfile.mkstemp(dir=out_dir or ".", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True, ensure_ascii=False)
+    os.replace(tmp, manifest_path(out_dir))
+
+
+def take_records():
+    """Returns and clears the (filename, fingerprint, status, size) records made so far."""
+    records = _records[:]
+    del _records[:]
+    return records
+
+
+def is_up_to_date(filename, digest):
+    entry = read_manifest(os.path.dirname(filename)).get("documents", {}).get(os.path.basename(filename))
+    if not entry or entry.get("fingerprint") != digest:
+        return False
+    try:
+        return os.path.getsize(filename) == entry.get("size")
+    except OSError:
+        return False
+
+
+# --- BUILD ---
+
+def _timed_build(doc, story, **kw):
+    start = time.perf_counter()
+    doc.build(story, **kw)
+    build_stats["builds"] += 1
+    build_stats["seconds"] += time.perf_counter() - start
+    build_stats["pages"] += doc.page
+
+
+def build_pdf(doc, story, **kw):
+    """
+    doc.build(story, **kw), skipped in incremental mode when the existing
+    output already matches (printing 'Up to date: <file>'). Returns 'hit', 'miss',
+    or 'built' (mode off); callers print their own 'Generated' line unless it was a hit.
+
+    story may also be a generator of flowables, which is streamed into the
+    build (genki/stream.py). Incremental mode has to fingerprint the whole
+    story first, so there it is collected into a list.
+    """
+    if not isinstance(story, list):
+        story = list(story) if _enabled else StreamingStory(story)
+    filename = doc.filename
+    if not _enabled or not isinstance(filename, str):
+        _timed_build(doc, story, **kw)
+        return "built"
+
+    digest = fingerprint(doc, story)
+    if is_up_to_date(filename, digest):
+        status = "hit"
+        print(f"Up to date: {filename}")
+    else:
+        status = "miss"
+        _timed_build(doc, story, **kw)
+    record = (filename, digest, status, os.path.getsize(filename))
+    if _deferred:
+        _records.append(record)
+    else:
+        update_manifest(os.path.dirname(filename), [record])
+    return status
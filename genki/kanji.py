@@ -0,0 +1,164 @@
+"""
+Which Genki lesson teaches each kanji, and which kanji in a piece of
+worksheet text the class hasn't learned yet.
+
+The lesson of every kanji (genki/data/kanji_lessons.tsv) is loaded once into
+a table indexed by character code, so lesson_of() is one lookup. For each
+target lesson a regex of the kanji not yet taught by then is compiled once,
+so scanning a string runs in the regex engine:
+
+    unlearned('駅へ参ります', 19)     -> ['駅', '参']   (駅 is taught in L22, 参 not in Genki)
+
+Kanji missing from the list count as never taught. Worksheets rewrite
+what they find with genki/furigana.py: make_styles(..., lesson=19) gives
+readings (or kana, furigana='kana') to unlearned kanji only.
+
+    python -m genki.kanji lesson 駅 参 先生       # where each kanji is taught
+    python -m genki.kanji check                   # flag unlearned kanji in every spec, timed
+    python -m genki.kanji check "Lesson 19" --lesson 12
+"""
+import os
+import re
+import sys
+import time
+import argparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LESSONS = os.path.join(REPO_ROOT, "genki", "data", "kanji_lessons.tsv")
+
+KANJI = '㐀-䶿一-鿿豈-﫿々〆ヶ'    # character class body for any kanji
+
+_KANJI_RE = re.compile(f'[{KANJI}]')
+
+_table = bytearray()    # character code -> lesson (0: not taught); BMP only
+_by_lesson = {}         # lesson -> its kanji
+_unlearned_res = {}     # lesson -> compiled regex matching one unlearned kanji
+
+
+def _load():
+    table = bytearray(0x10000)
+    with open(LESSONS, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            lesson, kanji = line.rstrip("\n").split("\t")
+            _by_lesson[int(lesson)] = kanji.strip()
+            for ch in kanji.strip():
+                table[ord(ch)] = int(lesson)
+    _table[:] = table
+
+
+def lesson_of(ch):
+    """The lesson that teaches ch, or None if Genki doesn't."""
+    if not _table:
+        _load()
+    code = ord(ch)
+    return (_table[code] or None) if code < 0x10000 else None
+
+
+def is_unlearned(ch, lesson):
+    """True if ch is a kanji not taught by the end of lesson."""
+    taught = lesson_of(ch)
+    return (taught is None or taught > lesson) and _KANJI_RE.match(ch) is not None
+
+
+def unlearned_re(lesson):
+    """Compiled regex matching any one kanji not taught by the end of lesson."""
+    pattern = _unlearned_res.get(lesson)
+    if pattern is None:
+        if not _table:
+            _load()
+        taught = "".join(kanji for n, kanji in _by_lesson.items() if n <= lesson)
+        pattern = _unlearned_res[lesson] = re.compile(f'(?![{re.escape(taught) or "_"}])[{KANJI}]')
+    return pattern
+
+
+def unlearned(text, lesson):
+    """The kanji in text not taught by the end of lesson, in order of appearance."""
+    return list(dict.fromkeys(unlearned_re(lesson).findall(text)))
+
+
+def script_lesson(script):
+    """The lesson a worksheet script belongs to, from its Lesson NN/ folder (None if it has none)."""
+    m = re.search(r'Lesson (\d+)', os.path.basename(os.path.dirname(os.path.abspath(script))))
+    return int(m.group(1)) if m else None
+
+
+# --- CHECKING SPECS ---
+
+def _strings(value, path):
+    if isinstance(value, str):
+        yield path, value
+    elif isinstance(value, (list, tuple)):
+        for i, v in enumerate(value):
+            yield from _strings(v, f"{path}[{i}]")
+
+
+def check(content, lesson):
+    """
+    Flags for a spec (genki/spec.py): (where, kanji) for every string in it
+    with kanji not taught by the end of lesson, e.g. ("[3]['data'][2][0]", ['寝']).
+    """
+    pattern = unlearned_re(lesson)
+    flags = []
+    for n, item in enumerate(content):
+        for key, value in item.items():
+            if key in ('type', 'only', 'cells'):
+                continue
+            for where, text in _strings(value, f"[{n}][{key!r}]"):
+                if pattern.search(text):
+                    flags.append((where, unlearned(text, lesson)))
+    return flags
+
+
+# --- COMMAND LINE ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look up kanji lessons, or flag unlearned kanji in the worksheet specs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    lookup = sub.add_parser("lesson", help="The lesson each kanji is taught in")
+    lookup.add_argument("kanji", nargs="+")
+    run = sub.add_parser("check", help="Flag kanji above each sheet's lesson")
+    run.add_argument("lessons", nargs="*", help="Lesson folders (default: all)")
+    run.add_argument("--lesson", type=int, help="Target lesson (default: each script's Lesson NN folder)")
+    run.add_argument("--quiet", action="store_true", help="Only print the totals")
+    args = parser.parse_args(argv)
+
+    if args.command == "lesson":
+        for word in args.kanji:
+            for ch in word:
+                taught = lesson_of(ch)
+                print(f"{ch}  Lesson {taught}" if taught else f"{ch}  not in Genki")
+        return 0
+
+    from genki.build import discover, load_script
+    from genki.variants import spec_names
+
+    scripts = []
+    for script, _ in discover(args.lessons):
+        if script not in scripts:
+            scripts.append(script)
+    specs = []
+    for script in scripts:
+        lesson = args.lesson or script_lesson(script)
+        module = load_script(script)
+        for name in spec_names(script):
+            specs.append((os.path.relpath(script, REPO_ROOT), name, getattr(module, name), lesson))
+
+    start = time.perf_counter()
+    results = [(script, name, lesson, check(content, lesson)) for script, name, content, lesson in specs]
+    seconds = time.perf_counter() - start
+    total = 0
+    for script, name, lesson, flags in results:
+        total += len(flags)
+        if args.quiet:
+            continue
+        for where, kanji in flags:
+            found = " ".join(f"{ch}(L{lesson_of(ch)})" if lesson_of(ch) else ch for ch in kanji)
+            print(f"{script} {name}{where}: {found}  [above L{lesson}]")
+    print(f"{total} strings with unlearned kanji in {len(specs)} specs ({seconds * 1000:.1f}ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,327 @@
+"""
+Keigo conjugation: honorific, humble and extra-modest forms and the Lesson
+19-20 patterns built on them, generated from the verb list in
+genki/data/verbs.tsv so a drill table and its answer key come from one place.
+
+    conjugate('読む', 'honorific', 'masu')      -> 'お読みになります'
+    conjugate('行く', 'extra_modest', 'masu')   -> '参ります'
+    conjugate('切符を取る', 'request')           -> '切符をお取りください'
+    conjugate('閉まる', 'teiru', 'hazu')         -> '閉まっているはずです'
+
+A phrase is whatever comes before its verb plus the longest verb from the
+list it ends with. Every form but the last turns the verb into another verb
+('honorific', 'humble', 'extra_modest', 'potential', 'teiru'); the last one
+may be any of FORMS. The parts of each verb (masu stem, nai form, te form,
+...) come from lookup tables per class (the godan ending rows, the special
+keigo verbs, the irregulars) and are computed once; whole conjugations are
+memoized too, so a drill row costs a few dict lookups.
+
+drill_rows() fills the rows of a 'table' or 'drill' item (genki/spec.py)
+and numbered() an answer-key text:
+
+    drill_rows([('行く', '来る'), '言う'], ['verbs', 'meaning', 'honorific'])
+    -> [['行く / 来る', 'to go/come', 'いらっしゃる'], ['言う', 'to say', 'おっしゃる']]
+
+    python -m genki.keigo 読む 行く           # every form of each verb
+    python -m genki.keigo --bench 100000      # drill rows per second from the whole list
+"""
+import os
+import sys
+import time
+import argparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VERBS = os.path.join(REPO_ROOT, "genki", "data", "verbs.tsv")
+
+# --- LOOKUP TABLES ---
+
+# Godan ending -> (nai row, masu row, e row, te ending)
+_GODAN = {
+    'う': ('わ', 'い', 'え', 'って'),
+    'く': ('か', 'き', 'け', 'いて'),
+    'ぐ': ('が', 'ぎ', 'げ', 'いで'),
+    'す': ('さ', 'し', 'せ', 'して'),
+    'つ': ('た', 'ち', 'て', 'って'),
+    'ぬ': ('な', 'に', 'ね', 'んで'),
+    'ぶ': ('ば', 'び', 'べ', 'んで'),
+    'む': ('ま', 'み', 'め', 'んで'),
+    'る': ('ら', 'り', 'れ', 'って'),
+}
+_ARU = ('ら', 'い', 'れ', 'って')    # いらっしゃる, なさる, ござる...
+
+# Parts that don't follow the verb's class
+_IRREGULAR = {
+    '行く': {'te': '行って', 'ta': '行った'},
+    'ある': {'nai': 'ない', 'nakute': 'なくて'},
+    'いい': {'nai': 'よくない', 'nakute': 'よくなくて', 'te': 'よくて', 'ta': 'よかった'},
+}
+
+# Special verbs (Genki L19-20); verbs not listed take お + stem + になる / する
+HONORIFIC = {
+    '行く': 'いらっしゃる', '来る': 'いらっしゃる', 'いる': 'いらっしゃる',
+    '食べる': '召し上がる', '飲む': '召し上がる',
+    'する': 'なさる', '言う': 'おっしゃる', '見る': 'ご覧になる', '寝る': 'お休みになる',
+    'くれる': 'くださる', 'ている': 'ていらっしゃる', 'です': 'でいらっしゃる',
+}
+HUMBLE = {
+    '行く': '伺う', '聞く': '伺う', '来る': '参る', '見る': '拝見する',
+    'あげる': '差し上げる', 'もらう': 'いただく', '食べる': 'いただく', '飲む': 'いただく',
+    'する': 'いたす', '言う': '申し上げる', 'いる': 'おる',
+}
+EXTRA_MODEST = {
+    '行く': '参る', '来る': '参る', 'いる': 'おる', '言う': '申す', 'する': 'いたす',
+    '食べる': 'いただく', '飲む': 'いただく', 'もらう': 'いただく', 'ある': 'ござる',
+    'ている': 'ておる', 'です': 'でござる',
+}
+
+# Last forms: form -> (part, ending)
+_ENDINGS = {
+    'dict': ('dict', ''),
+    'stem': ('stem', ''),
+    'masu': ('stem', 'ます'),
+    'mashita': ('stem', 'ました'),
+    'masen': ('stem', 'ません'),
+    'te': ('te', ''),
+    'ta': ('ta', ''),
+    'nai': ('nai', ''),
+    'nakute': ('nakute', ''),
+    'kudasai': ('te', 'ください'),
+    'kurete': ('te', 'くれてありがとう'),
+    'yokatta': ('te', 'よかったです'),
+    'nakute_yokatta': ('nakute', 'よかったです'),
+    'hazu': ('dict', 'はずです'),
+    'nai_hazu': ('nai', 'はずです'),
+}
+VERB_FORMS = ('honorific', 'humble', 'extra_modest', 'potential', 'teiru')
+FORMS = tuple(_ENDINGS) + ('request',) + VERB_FORMS
+ADJECTIVE_FORMS = ('dict', 'te', 'ta', 'nai', 'nakute', 'yokatta', 'nakute_yokatta', 'hazu', 'nai_hazu')
+
+_lexicon = {}        # dictionary form -> (reading, class, meaning)
+_longest = 0         # longest dictionary form in _lexicon
+_parts = {}          # (dictionary form, class) -> {part: form}
+_split_cache = {}    # phrase -> (prefix, verb, class)
+_conjugated = {}     # (phrase, forms) -> conjugated phrase
+
+
+def _load():
+    global _longest
+    with open(VERBS, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            verb, reading, cls, meaning = line.rstrip("\n").split("\t")
+            _lexicon[verb] = (reading, cls, meaning)
+    _longest = max(map(len, _lexicon))
+
+
+def lexicon():
+    """dictionary form -> (reading, class, meaning) for every word in genki/data/verbs.tsv."""
+    if not _lexicon:
+        _load()
+    return _lexicon
+
+
+def _split(phrase):
+    """(prefix, verb, class) for a phrase ending in a verb from the list."""
+    found = _split_cache.get(phrase)
+    if found is None:
+        words = lexicon()
+        for n in range(min(_longest, len(phrase)), 0, -1):
+            entry = words.get(phrase[-n:])
+            if entry is not None:
+                found = _split_cache[phrase] = (phrase[:-n], phrase[-n:], entry[1])
+                break
+        else:
+            raise ValueError(f"No verb from {os.path.relpath(VERBS, REPO_ROOT)} at the end of {phrase!r}")
+    return found
+
+
+def _verb_parts(verb, cls):
+    """The parts every form is built from, for one verb (computed once)."""
+    parts = _parts.get((verb, cls))
+    if parts is not None:
+        return parts
+    if cls in ('u', 'aru'):
+        nai, stem, e, te = _GODAN[verb[-1]] if cls == 'u' else _ARU
+        head = verb[:-1]
+        parts = {'stem': head + stem, 'nai': head + nai + 'ない', 'te': head + te, 'potential': head + e + 'る'}
+    elif cls == 'ru':
+        head = verb[:-1]
+        parts = {'stem': head, 'nai': head + 'ない', 'te': head + 'て', 'potential': head + 'られる'}
+    elif cls == 'suru':
+        head = verb[:-2]
+        parts = {'stem': head + 'し', 'nai': head + 'しない', 'te': head + 'して', 'potential': head + 'できる'}
+    elif cls == 'kuru':
+        head = verb[:-2]
+        ki, ko = ('来', '来') if verb[-2] == '来' else ('き', 'こ')
+        parts = {'stem': head + ki, 'nai': head + ko + 'ない', 'te': head + ki + 'て', 'potential': head + ko + 'られる'}
+    elif cls == 'i':
+        head = verb[:-1]
+        parts = {'nai': head + 'くない', 'te': head + 'くて', 'ta': head + 'かった'}
+    else:
+        parts = {}    # です: only its keigo forms (でいらっしゃる, でござる)
+    if parts:
+        parts['dict'] = verb
+    if 'te' in parts and 'ta' not in parts:
+        te = parts['te']
+        parts['ta'] = te[:-1] + ('だ' if te.endswith('で') else 'た')
+    if 'nai' in parts:
+        parts['nakute'] = parts['nai'][:-1] + 'くて'
+    parts.update(_IRREGULAR.get(verb, ()))
+    _parts[verb, cls] = parts
+    return parts
+
+
+def _part(verb, cls, part):
+    form = _verb_parts(verb, cls).get(part)
+    if form is None:
+        raise ValueError(f"{verb} ({cls}) has no {part} form")
+    return form
+
+
+def _to_verb(prefix, verb, cls, form):
+    """(prefix, verb, class) after a verb-to-verb form."""
+    if cls == 'i':
+        raise ValueError(f"{verb} is an adjective; it has no {form} form")
+    if form in ('honorific', 'humble', 'extra_modest'):
+        special = {'honorific': HONORIFIC, 'humble': HUMBLE, 'extra_modest': EXTRA_MODEST}[form].get(verb)
+        if special is not None:
+            head, verb, cls = _split(special)
+            return prefix + head, verb, cls
+        if form == 'extra_modest' or cls not in ('u', 'ru'):
+            raise ValueError(f"{verb} has no {form.replace('_', '-')} form")
+        stem = 'お' + _part(verb, cls, 'stem')
+        if form == 'honorific':
+            return prefix + stem + 'に', 'なる', 'u'
+        return prefix + stem, 'する', 'suru'
+    if form == 'potential':
+        return prefix, _part(verb, cls, 'potential'), 'ru'
+    if form == 'teiru':
+        return prefix + _part(verb, cls, 'te'), 'いる', 'ru'
+    raise ValueError(f"Unknown verb form: {form!r} (expected one of {', '.join(VERB_FORMS)})")
+
+
+def conjugate(phrase, *forms):
+    """
+    phrase with its verb put through forms in turn: conjugate('読む',
+    'honorific', 'masu'). With no forms, the phrase as it is.
+    """
+    key = (phrase, forms)
+    done = _conjugated.get(key)
+    if done is not None:
+        return done
+    prefix, verb, cls = _split(phrase)
+    *steps, last = forms or ('dict',)
+    for form in steps:
+        prefix, verb, cls = _to_verb(prefix, verb, cls, form)
+
+    if last in VERB_FORMS:
+        prefix, verb, cls = _to_verb(prefix, verb, cls, last)
+        done = prefix + verb
+    elif last == 'request':
+        # お + stem + ください; special honorific verbs use their te form (召し上がってください)
+        special = HONORIFIC.get(verb) if cls != 'copula' else None
+        if special is not None:
+            head, verb, cls = _split(special)
+            done = prefix + head + _part(verb, cls, 'te') + 'ください'
+        elif cls in ('u', 'ru'):
+            done = prefix + 'お' + _part(verb, cls, 'stem') + 'ください'
+        else:
+            raise ValueError(f"{verb} has no request form")
+    else:
+        ending = _ENDINGS.get(last)
+        if ending is None:
+            raise ValueError(f"Unknown form: {last!r} (expected one of {', '.join(FORMS)})")
+        if cls == 'i' and last not in ADJECTIVE_FORMS:
+            raise ValueError(f"{verb} is an adjective; it has no {last} form")
+        done = prefix + _part(verb, cls, ending[0]) + ending[1]
+    _conjugated[key] = done
+    return done
+
+
+def conjugate_many(phrases, *forms):
+    """conjugate() for every phrase, as a list."""
+    return [conjugate(phrase, *forms) for phrase in phrases]
+
+
+def reading(phrase):
+    """Reading of the phrase's verb (just the verb: '切符を取る' -> 'とる')."""
+    return lexicon()[_split(phrase)[1]][0]
+
+
+def meaning(group):
+    """Meaning of a verb, or of a group of verbs as one: ('行く', '来る') -> 'to go/come'."""
+    if isinstance(group, str):
+        group = (group,)
+    meanings = [lexicon()[_split(phrase)[1]][2] for phrase in group]
+    return "/".join([meanings[0]] + [m[3:] if m.startswith('to ') else m for m in meanings[1:]])
+
+
+# --- DRILL TABLES ---
+
+def _cell(group, column):
+    if callable(column):
+        return column(group)
+    if column == 'verbs':
+        return " / ".join(group)
+    if column == 'meaning':
+        return meaning(group)
+    if column == 'reading':
+        return " / ".join(reading(phrase) for phrase in group)
+    forms = (column,) if isinstance(column, str) else tuple(column)
+    return conjugate(group[0], *forms)
+
+
+def drill_rows(groups, columns):
+    """
+    Rows for a 'table' or 'drill' item: one per group (a phrase, or a tuple
+    of phrases sharing their answers), one cell per column. A column is
+    'verbs' (the group, ' / '-joined), 'meaning', 'reading', a form or
+    tuple of forms for conjugate() (of the group's first phrase), or a
+    function of the group.
+    """
+    groups = [(group,) if isinstance(group, str) else tuple(group) for group in groups]
+    return [[_cell(group, column) for column in columns] for group in groups]
+
+
+def numbered(lines, start=1):
+    """'1. X<br/>2. Y...' for an answer-key text item."""
+    return "<br/>".join(f"{n}. {line}" for n, line in enumerate(lines, start))
+
+
+# --- COMMAND LINE ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Conjugate verbs into their keigo forms.")
+    parser.add_argument("phrases", nargs="*", help="Verbs or phrases ending in one (dictionary form)")
+    parser.add_argument("--bench", type=int, metavar="N", help="Time N drill rows built from the whole verb list")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        verbs = [verb for verb, (_, cls, _) in lexicon().items() if cls in ('u', 'ru')]
+        columns = ['verbs', 'meaning', ('honorific', 'masu'), ('humble', 'mashita'), 'request',
+                   'kurete', 'nakute_yokatta', ('teiru', 'hazu'), ('potential', 'nai')]
+        groups = (verbs * (args.bench // len(verbs) + 1))[:args.bench]
+        start = time.perf_counter()
+        drill_rows(groups[:len(verbs)], columns)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        rows = drill_rows(groups, columns)
+        seconds = time.perf_counter() - start
+        print(f"{len(verbs)} verbs, first pass {cold * 1000:.1f}ms")
+        print(f"{len(rows)} rows x {len(columns)} columns in {seconds * 1000:.0f}ms ({len(rows) / seconds:.0f} rows/s)")
+        return 0
+
+    for phrase in args.phrases:
+        print(phrase)
+        for form in FORMS + (('honorific', 'masu'), ('humble', 'masu'), ('extra_modest', 'masu')):
+            forms = (form,) if isinstance(form, str) else form
+            try:
+                print(f"  {' + '.join(forms):24} {conjugate(phrase, *forms)}")
+            except ValueError:
+                pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
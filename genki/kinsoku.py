@@ -0,0 +1,415 @@
+"""
+Japanese line breaking (kinsoku shori) for worksheet paragraphs.
+
+reportlab breaks lines at spaces and cuts a run of Japanese wherever it
+overflows, so a line can start with 。 or っ or end with 「. KinsokuParagraph
+(the Paragraph the spec renderer and FuriganaParagraph use) breaks lines
+itself instead:
+
+  * between any two Japanese characters, except before closing brackets,
+    、。, small kana, ー and the like, and after opening brackets
+  * at spaces in Latin text, never inside a word or a ________ blank
+  * never inside a ruby base ({召|め}し, genki/ruby.py) or between a base
+    and its reading, nor inside a reading written in brackets, 切符(きっぷ)
+  * a line that starts with a speaker label (<b>Student:</b> ...) hangs:
+    its wrapped lines, and the lines after a <br/> until the next label or
+    an empty line, start where the speech does
+
+Every character's break class comes from a table built once (one entry per
+BMP code point), so a whole string is classified with one str.translate().
+The places a line may break are then found with a regex over the class
+string. Widths come from the per-font glyph tables in genki/ruby.py, and
+lines are filled with the unbreakable runs between those places rather
+than one character at a time.
+
+    python -m genki.kinsoku "先生、こんにちは。どちらにいらっしゃいますか。" --width 80
+    python -m genki.kinsoku --bench 2000    # the dialogue paragraphs, against reportlab's own wrap
+"""
+import re
+import sys
+import time
+import argparse
+from itertools import accumulate, chain
+
+from reportlab.pdfbase.pdfmetrics import getAscentDescent
+from reportlab.platypus.paragraph import ParaLines, FragLine
+from reportlab.rl_config import _FUZZ
+
+from genki.ruby import RubyParagraph, glyph_widths, is_ruby_marker
+
+# --- BREAK CLASSES ---
+
+# One character per class, so that classifying a string is str.translate()
+OTHER = 'o'           # kana, kanji and anything not listed: breaks either side
+OPEN = '('            # opening brackets and quotes: never end a line
+CLOSE = ')'           # closing brackets, 、。, small kana, ー...: never start a line
+WORD = 'w'            # Latin letters, digits, ASCII symbols: no break inside a run
+SPACE = ' '           # breaks after, never before
+GLUE = 'g'            # no-break space, word joiner: never breaks either side
+DASH = '-'            # ―…‥: no break inside a run
+LATIN_OPEN = '['      # ([{ : never end a line, no break between a word and it
+LATIN_CLOSE = '.'     # .,;:!?)]}% : never start a line, no break between it and a word
+
+CLASSES = (OTHER, OPEN, CLOSE, WORD, SPACE, GLUE, DASH, LATIN_OPEN, LATIN_CLOSE)
+
+_CHARS = (
+    (' \t\n\r\f\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u200b', SPACE),
+    ('\u00a0\u202f\u2060\ufeff', GLUE),
+    ('([{', LATIN_OPEN),
+    (').,;:!?]}%', LATIN_CLOSE),
+    ('（「『【〔〈《［｛〘〖〝‘“｟«', OPEN),
+    ('）」』】〕〉》］｝〙〗〟’”｠»'
+     '、。，．・：；？！‼⁇⁈⁉ゝゞヽヾ々〻ー〜゠‐–℃°′″％'
+     'ぁぃぅぇぉっゃゅょゎゕゖァィゥェォッャュョヮヵヶㇰㇱㇲㇳㇴㇵㇶㇷㇸㇹㇺㇻㇼㇽㇾㇿ', CLOSE),
+    ('―—…‥', DASH),
+)
+
+
+def _allowed(before, after):
+    """May a line break between a character of class before and one of class after?"""
+    if after in (CLOSE, LATIN_CLOSE, SPACE, GLUE) or before in (OPEN, LATIN_OPEN, GLUE):
+        return False
+    if before == WORD and after in (WORD, LATIN_OPEN):
+        return False
+    if before == LATIN_CLOSE and after == WORD:
+        return False
+    return not (before == DASH and after == DASH)
+
+
+def _class_table():
+    table = [OTHER] * 0x10000
+    for lo, hi in ((0x21, 0x7f), (0xc0, 0x250), (0xff10, 0xff1a), (0xff21, 0xff3b), (0xff41, 0xff5b)):
+        table[lo:hi] = [WORD] * (hi - lo)
+    for chars, cls in _CHARS:
+        for ch in chars:
+            table[ord(ch)] = cls
+    return ''.join(table)
+
+
+def _break_re():
+    # One lookbehind/lookahead pair per group of classes that may break before the same classes
+    groups = {}
+    for before in CLASSES:
+        after = ''.join(c for c in CLASSES if _allowed(before, c))
+        if after:
+            groups[after] = groups.get(after, '') + before
+    return re.compile('|'.join(f'(?<=[{re.escape(b)}])(?=[{re.escape(a)}])' for a, b in groups.items()))
+
+
+_CLASS_TABLE = _class_table()      # code point -> class; astral characters count as OTHER
+_BREAK_RE = _break_re()            # zero-width matches where the class string may break
+_NOT_CLASS_RE = re.compile(f'[^{re.escape("".join(CLASSES))}]')
+
+# A reading in brackets straight after its word: 切符(きっぷ), 駅（えき）
+_BRACKETED_READING_RE = re.compile('[(（][ぁ-ゖァ-ヺー・]+[)）]')
+
+_LABEL_ENDS = (':', '：')
+_LABEL_TAGS = ('b', 'strong')
+MAX_LABEL = 1 / 3     # widest speaker label that hangs, as a share of the line
+
+_metrics = {}         # (font name, size) -> (ascent, descent)
+
+
+def classify(text):
+    """The break class of every character of text, as a string of the same length."""
+    classes = text.translate(_CLASS_TABLE)
+    if not classes.isascii():
+        classes = _NOT_CLASS_RE.sub(OTHER, classes)
+    return classes
+
+
+def break_positions(text, keep=()):
+    """Offsets in text before which a line may break, except those in keep (runs kept together)."""
+    positions = [m.start() for m in _BREAK_RE.finditer(classify(text))]
+    if keep:
+        positions = [p for p in positions if p not in keep]
+    return positions
+
+
+# --- LINE BREAKING ---
+
+class _Run:
+    """One logical line: the fragments up to a <br/> (or the end), with their text joined up."""
+
+    def __init__(self, frags, line_break):
+        self.frags = frags              # text fragments and ruby markers
+        self.line_break = line_break    # the <br/> fragment ending the run, or None
+        self.pieces = []                # (start, end, frag) of each text fragment
+        self.markers = []               # (offset of the end of the base, marker frag)
+        keep = set()
+        parts = []
+        widths = []
+        pos = 0
+        for frag in frags:
+            if is_ruby_marker(frag):
+                self.markers.append((pos, frag))
+                # The base is the text fragment just before its marker
+                if self.pieces:
+                    keep.update(range(self.pieces[-1][0] + 1, pos))
+                continue
+            text = frag.text
+            self.pieces.append((pos, pos + len(text), frag))
+            parts.append(text)
+            widths.append(map((frag.fontSize / 1000).__mul__, map(glyph_widths(frag.fontName).__getitem__, text)))
+            pos += len(text)
+        self.text = text = ''.join(parts)
+        # Width of text[:i] is ends[i]
+        self.ends = [0]
+        self.ends += accumulate(chain.from_iterable(widths))
+        if '(' in text or '（' in text:
+            for m in _BRACKETED_READING_RE.finditer(text):
+                keep.update(range(m.start(), m.end()))
+        self.keep = keep
+
+    def width(self, start, end):
+        """Width in points of text[start:end]."""
+        return self.ends[end] - self.ends[start]
+
+    def label_end(self, start):
+        """End of a speaker label (<b>Name:</b> then a space) at start, or None."""
+        text = self.text
+        end = start
+        for p_start, p_end, frag in self.pieces:
+            if p_end <= start:
+                continue
+            # reportlab marks every fragment of a font without a bold face bold, so go by the tag
+            if getattr(frag, '__tag__', None) not in _LABEL_TAGS:
+                break
+            end = p_end
+        label = text[start:end].rstrip(' ')
+        if not label.endswith(_LABEL_ENDS):
+            return None
+        end = start + len(label)
+        if end >= len(text) or text[end] != ' ':
+            return None
+        while end < len(text) and text[end] == ' ':
+            end += 1
+        return end
+
+    def frags_between(self, start, end, last):
+        """The fragments of text[start:end] (sliced where needed), ruby markers included."""
+        words = []
+        markers = iter(self.markers)
+        marker = next(markers, None)
+        for p_start, p_end, frag in self.pieces:
+            while marker is not None and marker[0] <= p_start:
+                if start < marker[0] <= end:
+                    words.append(marker[1])
+                marker = next(markers, None)
+            if p_end <= start or p_start >= end:
+                continue
+            if p_start >= start and p_end <= end:
+                words.append(frag)
+            else:
+                words.append(frag.clone(text=self.text[max(start, p_start):min(end, p_end)]))
+        while marker is not None:
+            if start < marker[0] <= end:
+                words.append(marker[1])
+            marker = next(markers, None)
+        if last and self.line_break is not None:
+            words.append(self.line_break)
+        return words
+
+
+def _runs(frags):
+    runs, current = [], []
+    for frag in frags:
+        if getattr(frag, 'lineBreak', False):
+            runs.append(_Run(current, frag))
+            current = []
+        else:
+            current.append(frag)
+    runs.append(_Run(current, None))
+    return runs
+
+
+def _metrics_of(frag):
+    key = (frag.fontName, frag.fontSize)
+    metrics = _metrics.get(key)
+    if metrics is None:
+        metrics = _metrics[key] = getAscentDescent(frag.fontName, frag.fontSize)
+    return metrics
+
+
+def _frag_line(words, max_width, used, line_break):
+    font_size = ascent = descent = 0
+    for frag in words:
+        if not hasattr(frag, 'cbDefn'):
+            a, d = _metrics_of(frag)
+            font_size = max(font_size, frag.fontSize)
+            ascent = max(ascent, a)
+            descent = min(descent, d)
+    if not font_size and words:
+        font_size = words[-1].fontSize
+        ascent, descent = _metrics_of(words[-1])
+    return FragLine(kind=1, extraSpace=max_width - used, wordCount=1, words=words, fontSize=font_size,
+                    ascent=ascent, descent=descent, maxWidth=max_width, currentWidth=used,
+                    lineBreak=line_break)
+
+
+def break_lines(frags, max_widths, hang=0):
+    """
+    Breaks a paragraph's fragments into lines of at most max_widths[0]
+    (the first line) and max_widths[-1] points. hang is the indent already
+    in effect (for the rest of a paragraph split across pages). Returns the
+    ParaLines and the indent of every line.
+    """
+    lines, offsets = [], []
+
+    def emit(run, start, end, used, offset, last):
+        max_width = (max_widths[0] if not lines else max_widths[-1]) - offset
+        words = run.frags_between(start, end, last)
+        lines.append(_frag_line(words, max_width, used, last and run.line_break is not None))
+        offsets.append(offset)
+
+    for run in _runs(frags):
+        text = run.text
+        start = len(text) - len(text.lstrip(' '))
+        if start == len(text):
+            # An empty line ends a speaker's turn
+            hang = 0
+            emit(run, start, start, 0, 0, True)
+            continue
+
+        offset = hang
+        label = run.label_end(start)
+        if label is not None:
+            width = run.width(start, label)
+            hang = width if width <= max_widths[-1] * MAX_LABEL else 0
+            offset = 0
+
+        stops = break_positions(text, run.keep)
+        stops.append(len(text))
+        line_start, used, pending = start, 0, 0
+        avail = (max_widths[0] if not lines else max_widths[-1]) - offset
+        seg_start = start
+        for stop in stops:
+            if stop <= seg_start:
+                continue
+            core_end = seg_start + len(text[seg_start:stop].rstrip(' '))
+            core = run.width(seg_start, core_end)
+            if line_start < seg_start and pending + core > avail + _FUZZ:
+                emit(run, line_start, seg_start, used, offset, False)
+                offset = hang
+                avail = max_widths[-1] - offset
+                line_start, used, pending = seg_start, 0, 0
+            if line_start == seg_start and core > avail + _FUZZ:
+                # Longer than a whole line: cut it wherever it overflows
+                ends = run.ends
+                for pos in range(seg_start + 1, core_end + 1):
+                    if pos - 1 > line_start and ends[pos] - ends[line_start] > avail + _FUZZ:
+                        emit(run, line_start, pos - 1, ends[pos - 1] - ends[line_start], offset, False)
+                        offset = hang
+                        avail = max_widths[-1] - offset
+                        line_start = pos - 1
+                used = run.width(line_start, core_end)
+                pending = run.width(line_start, stop)
+            else:
+                used = pending + core
+                pending += core + run.width(core_end, stop)
+            seg_start = stop
+        emit(run, line_start, len(text), used, offset, True)
+
+    return ParaLines(kind=1, lines=lines, kinsoku=True), offsets
+
+
+def _join_lines(blPara, start, stop):
+    """The fragments of lines start to stop, for the paragraph that continues after a split."""
+    return [frag for line in blPara.lines[start:stop] for frag in line.words]
+
+
+# --- PARAGRAPH ---
+
+class KinsokuParagraph(RubyParagraph):
+    """RubyParagraph whose lines are broken by break_lines(); otherwise identical to Paragraph."""
+
+    def breakLines(self, width):
+        if hasattr(self, 'blPara') and getattr(self, '_splitpara', 0):
+            return self.blPara
+        style = self.style
+        if (style.wordWrap or self.bulletText or style.endDots
+                or any(hasattr(f, 'cbDefn') and not is_ruby_marker(f) for f in self.frags)):
+            return RubyParagraph.breakLines(self, width)
+        widths = width if isinstance(width, (list, tuple)) else [width]
+        blPara, self._offsets = break_lines(self.frags, widths, self.__dict__.get('_hang', 0))
+        return blPara
+
+    def _get_split_blParaFunc(self):
+        if getattr(self.blPara, 'kinsoku', False):
+            return _join_lines
+        return RubyParagraph._get_split_blParaFunc(self)
+
+    def split(self, availWidth, availHeight):
+        parts = RubyParagraph.split(self, availWidth, availHeight)
+        offsets = self.__dict__.get('_offsets')
+        if len(parts) == 2 and offsets:
+            first, rest = parts
+            n = len(first.blPara.lines)
+            first._offsets = offsets[:n]
+            rest._hang = offsets[n] if n < len(offsets) else 0
+        return parts
+
+
+# --- COMMAND LINE ---
+
+def _dialogues():
+    """The dialogue passages of the worksheet specs (the paragraphs with speaker labels)."""
+    from genki.build import discover, load_script
+
+    texts = []
+    for script in sorted({script for script, _ in discover()}):
+        module = load_script(script)
+        for value in vars(module).values():
+            if isinstance(value, list) and value and isinstance(value[0], dict) and 'type' in value[0]:
+                texts += [item['text'] for item in value if ':</b>' in item.get('text', '')]
+    return texts
+
+
+def _bench(rounds, width):
+    from genki import layout
+    from genki.fonts import japanese_font
+    from genki.styles import style_set
+
+    layout.configure(enabled=False)
+    style = style_set(japanese_font())['normal']
+    texts = _dialogues()
+    results = {}
+    for name, cls in (("reportlab", RubyParagraph), ("kinsoku", KinsokuParagraph)):
+        paragraphs = [cls(text, style) for text in texts]
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for p in paragraphs:
+                p.wrap(width, 10000)
+        results[name] = (time.perf_counter() - start) / (rounds * len(texts))
+        print(f"{name:<10} {results[name] * 1e6:8.1f}us per paragraph "
+              f"({sum(len(p.blPara.lines) for p in paragraphs)} lines for {len(texts)} dialogues)")
+    print(f"kinsoku / reportlab: {results['kinsoku'] / results['reportlab']:.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show where Japanese text breaks into lines.")
+    parser.add_argument("text", nargs="?", help="Paragraph markup to break")
+    parser.add_argument("--width", type=float, default=451, help="Line width in points (default: 451, an A4 column)")
+    parser.add_argument("--bench", type=int, metavar="ROUNDS",
+                        help="Time wrapping the worksheets' dialogue paragraphs, against reportlab's wrap")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        _bench(args.bench, args.width)
+        return 0
+    if not args.text:
+        parser.error("give a text to break, or --bench")
+
+    from genki.fonts import japanese_font
+    from genki.styles import style_set
+
+    p = KinsokuParagraph(args.text, style_set(japanese_font())['normal'])
+    p.wrap(args.width, 10000)
+    for line, offset in zip(p.blPara.lines, p._offsets):
+        text = ''.join(getattr(w, 'text', '') for w in line.words)
+        print(f"{' ' * round(offset / 5)}{text}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
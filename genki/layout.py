@@ -0,0 +1,200 @@
+"""
+Layout cache for Paragraphs.
+
+The worksheets repeat the same markup all the time: blank answer cells,
+&nbsp; indentation runs, header rows, and the whole sheet again for every
+variant or class-pack copy. CachedParagraph is a drop-in Paragraph that
+keeps, per process:
+
+  * the parsed fragments, keyed by text, style and bullet text, so the
+    mini-HTML parser runs once per distinct string
+  * the wrap result (the broken lines and height), keyed by the parse key
+    and the available width, so an identical paragraph in an identical
+    column is not broken into lines again
+
+Both caches are LRU-bounded (MAXSIZE entries each, see configure()) and count
+hits and misses (cache_info()). They live as long as the process, so batch
+and variant workers reuse them across every document they build. Set
+GENKI_LAYOUT_CACHE=0 to turn them off.
+
+Cached fragments and lines are shared between paragraphs, which is safe
+because layout only reads them, with one exception: splitting a paragraph
+across pages edits its lines in place, so a paragraph re-wraps privately
+before it splits.
+
+    python -m genki.layout      # render everything with and without the cache
+"""
+import os
+import sys
+import time
+import argparse
+from collections import OrderedDict
+
+from reportlab.platypus import Paragraph
+from reportlab.rl_config import _FUZZ
+
+MAXSIZE = 4096
+
+_settings = {'enabled': os.environ.get("GENKI_LAYOUT_CACHE", "1") != "0", 'maxsize': MAXSIZE}
+_parsed = OrderedDict()    # parse key -> (text, style, frags, bulletText)
+_wrapped = OrderedDict()   # (parse key, availWidth) -> (blPara, height, wrap widths, line offsets)
+stats = {'parse_hits': 0, 'parse_misses': 0, 'wrap_hits': 0, 'wrap_misses': 0, 'evictions': 0}
+
+# Style attributes that don't change how a paragraph parses or lays out
+_STYLE_SKIP = ('name', 'parent')
+
+
+# --- CACHE ---
+
+def configure(maxsize=None, enabled=None):
+    """Changes the LRU bound (entries per cache) and/or turns the cache on or off."""
+    if maxsize is not None:
+        _settings['maxsize'] = maxsize
+        for cache in (_parsed, _wrapped):
+            while len(cache) > maxsize:
+                cache.popitem(last=False)
+                stats['evictions'] += 1
+    if enabled is not None:
+        _settings['enabled'] = enabled
+
+
+def clear():
+    """Empties both caches and zeroes the counters."""
+    _parsed.clear()
+    _wrapped.clear()
+    for key in stats:
+        stats[key] = 0
+
+
+def cache_info():
+    """The counters plus current sizes and hit rates."""
+    info = dict(stats, parse_size=len(_parsed), wrap_size=len(_wrapped), maxsize=_settings['maxsize'])
+    for kind in ('parse', 'wrap'):
+        total = stats[f'{kind}_hits'] + stats[f'{kind}_misses']
+        info[f'{kind}_hit_rate'] = stats[f'{kind}_hits'] / total if total else 0.0
+    return info
+
+
+def _get(cache, key):
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+
+def _put(cache, key, value):
+    cache[key] = value
+    if len(cache) > _settings['maxsize']:
+        cache.popitem(last=False)
+        stats['evictions'] += 1
+
+
+def _parse_key(text, style, bulletText, caseSensitive):
+    """None when the paragraph can't be cached (e.g. a style holding unhashable values)."""
+    try:
+        fingerprint = tuple(sorted((k, v) for k, v in style.__dict__.items() if k not in _STYLE_SKIP))
+        key = (text, fingerprint, bulletText, caseSensitive)
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+# --- PARAGRAPH ---
+
+class CachedParagraph(Paragraph):
+    """Paragraph that takes its parse and wrap results from the layout cache when it can."""
+
+    def __init__(self, text, style=None, bulletText=None, frags=None, caseSensitive=1, encoding='utf8'):
+        key = None
+        if _settings['enabled'] and frags is None and style is not None and isinstance(text, str):
+            bulletText = bulletText or getattr(style, 'bulletText', None)
+            if bulletText is None or isinstance(bulletText, str):
+                key = _parse_key(text, style, bulletText, caseSensitive)
+        self._layout_key = key
+        if key is None:
+            Paragraph.__init__(self, text, style, bulletText, frags, caseSensitive, encoding)
+            return
+
+        hit = _get(_parsed, key)
+        if hit is None:
+            stats['parse_misses'] += 1
+            Paragraph.__init__(self, text, style, bulletText, None, caseSensitive, encoding)
+            _put(_parsed, key, (self.text, self.style, self.frags, self.bulletText))
+        else:
+            stats['parse_hits'] += 1
+            # What Paragraph._setup leaves behind after parsing
+            self.caseSensitive = caseSensitive
+            self.encoding = encoding
+            self.text, self.style, self.frags, self.bulletText = hit
+            self.debug = 0
+
+    def wrap(self, availWidth, availHeight):
+        key = self._layout_key
+        if (key is None or not _settings['enabled'] or availWidth < _FUZZ
+                or self.style.wordWrap == 'RTL' or 'autoLeading' in self.__dict__):
+            return Paragraph.wrap(self, availWidth, availHeight)
+
+        wrap_key = (key, availWidth)
+        hit = _get(_wrapped, wrap_key)
+        if hit is None:
+            stats['wrap_misses'] += 1
+            Paragraph.wrap(self, availWidth, availHeight)
+            offsets = self.__dict__.get('_offsets')
+            _put(_wrapped, wrap_key, (self.blPara, self.height, tuple(self._wrapWidths),
+                                      offsets and tuple(offsets)))
+        else:
+            stats['wrap_hits'] += 1
+            self.width = availWidth
+            self.blPara, self.height, widths, offsets = hit
+            self._wrapWidths = list(widths)
+            if offsets:
+                # drawPara extends the list in place
+                self._offsets = list(offsets)
+        self._shared_lines = True
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        if self.__dict__.pop('_shared_lines', False):
+            # Splitting edits the lines in place; break a private copy first
+            Paragraph.wrap(self, availWidth, availHeight)
+        return Paragraph.split(self, availWidth, availHeight)
+
+
+# --- COMMAND LINE ---
+
+def main(argv=None):
+    # Under -m this file is __main__; the paragraphs use the genki.layout copy
+    from genki import layout
+    from genki.build import discover, load_script, output_path
+
+    parser = argparse.ArgumentParser(description="Render every worksheet with and without the layout cache.")
+    parser.add_argument("--rounds", type=int, default=5, help="Times to render everything (default: 5)")
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                      "build", "layout"), help="Output folder")
+    args = parser.parse_args(argv)
+
+    jobs = discover()
+    for script, _ in jobs:
+        load_script(script)
+    for enabled in (False, True):
+        layout.configure(enabled=enabled)
+        layout.clear()
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            for script, name in jobs:
+                path = output_path(args.out, script, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                load_script(script).DOCUMENTS[name](path)
+        seconds = time.perf_counter() - start
+        print(f"cache {'on ' if enabled else 'off'}: {args.rounds} x {len(jobs)} documents in {seconds:.2f}s",
+              file=sys.stderr)
+    info = layout.cache_info()
+    print(f"parse: {info['parse_hits']} hits / {info['parse_misses']} misses ({info['parse_hit_rate']:.0%}), "
+          f"wrap: {info['wrap_hits']} hits / {info['wrap_misses']} misses ({info['wrap_hit_rate']:.0%}), "
+          f"{info['evictions']} evictions", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+Opt-in phase profiling for the build pipeline, written as a Chrome trace
+(open it at chrome://tracing or https://ui.perfetto.dev).
+
+enable() wraps the functions each phase runs in, so while it is off nothing
+is wrapped and the pipeline runs exactly as before:
+
+    ttf.parse          TTFontFace() parsing a TrueType file
+    ttf.cache_load     loading a parsed face from the font cache (genki/fonts.py)
+    ttf.subset         building one embedded font subset (args: bytes)
+    style.new          ParagraphStyle construction
+    story.build        genki.spec.build_story (spec -> flowables; streamed stories
+                       build theirs inside doc.build instead)
+    paragraph.parse    Paragraph markup parsing
+    paragraph.wrap / paragraph.split
+                       (with the layout cache on, parse and wrap only show
+                       its misses; see genki/layout.py)
+    table.init / table.wrap / table.split
+    frame.add:<Type>   placing one flowable of that type on a page (wrap + draw)
+    frame.split:<Type> splitting one flowable of that type across pages
+    doc.build          the whole layout of one document (args: file, pages)
+    pdf.write          canvas.save(): fonts, subsets and the file itself
+
+Each doc.build also records per-font glyph counts ("fonts" counter events).
+
+    python -m genki.phases "Lesson 20/L20_worksheet1.py"            # trace + summary
+    GENKI_PROFILE=build/trace-{pid}.json python -m genki.build -j 2  # any entry point
+
+With GENKI_PROFILE set, tracing starts as soon as the genki package is
+imported and each process writes its trace on exit ({pid} in the path is
+replaced by the process id).
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import argparse
+import threading
+import functools
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_events = []
+_patched = []    # (owner, attribute, original value or None if it was inherited)
+_state = {'path': None, 'written': False}
+_origin = time.perf_counter()
+
+
+# --- RECORDING ---
+
+def _record(name, cat, start, end, args=None):
+    _events.append((name, cat, start, end, threading.get_ident(), args))
+
+
+def _wrap(owner, attr, cat, name=None, args=None):
+    """Replaces owner.attr with a version that records a span around each call."""
+    orig = getattr(owner, attr)
+    label = name or f"{cat}.{attr.strip('_')}"
+
+    @functools.wraps(orig)
+    def traced(*a, **kw):
+        start = time.perf_counter()
+        try:
+            return orig(*a, **kw)
+        finally:
+            _record(label(a) if callable(label) else label, cat, start, time.perf_counter(),
+                    args(a) if args else None)
+
+    _patched.append((owner, attr, owner.__dict__.get(attr)))
+    setattr(owner, attr, traced)
+
+
+def _doc_args(a):
+    doc = a[0]
+    return {'file': str(getattr(doc, 'filename', '')), 'pages': getattr(doc, 'page', None)}
+
+
+def _record_fonts(canvas):
+    """Glyphs used by each TrueType font in the document the canvas is writing."""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    now = time.perf_counter()
+    for font in list(pdfmetrics._fonts.values()):
+        if isinstance(font, TTFont):
+            state = font.state.get(canvas._doc)
+            if state is not None:
+                _record(f"fonts:{font.fontName}", 'fonts', now, now,
+                        {'chars': len(state.assignments), 'subsets': len(state.subsets)})
+
+
+def enable(path=None):
+    """Starts recording. path is where write_trace() / process exit will write the trace."""
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.pdfbase.ttfonts import TTFontFace
+    from reportlab.pdfgen.canvas import Canvas
+    from reportlab.platypus import Paragraph, Table
+    from reportlab.platypus.doctemplate import BaseDocTemplate
+    from reportlab.platypus.frames import Frame
+    from genki import fonts, spec
+
+    if _patched:
+        return
+    _state['path'] = path
+    _wrap(TTFontFace, '__init__', 'ttf', name='ttf.parse')
+    _wrap(fonts, '_load_face', 'ttf', name='ttf.cache_load')
+    _wrap(ParagraphStyle, '__init__', 'style', name='style.new')
+    _wrap(spec, 'build_story', 'story', name='story.build')
+    _wrap(Paragraph, '_setup', 'paragraph', name='paragraph.parse')
+    _wrap(Paragraph, 'wrap', 'paragraph')
+    _wrap(Paragraph, 'split', 'paragraph')
+    _wrap(Table, '__init__', 'table', name='table.init')
+    _wrap(Table, 'wrap', 'table')
+    _wrap(Table, 'split', 'table')
+    _wrap(Frame, 'add', 'frame', name=lambda a: f"frame.add:{type(a[1]).__name__}")
+    _wrap(Frame, 'split', 'frame', name=lambda a: f"frame.split:{type(a[1]).__name__}")
+    _wrap(BaseDocTemplate, 'build', 'doc', name='doc.build', args=_doc_args)
+
+    save = Canvas.save
+
+    @functools.wraps(save)
+    def traced_save(canvas):
+        _record_fonts(canvas)
+        start = time.perf_counter()
+        try:
+            return save(canvas)
+        finally:
+            _record('pdf.write', 'pdf', start, time.perf_counter())
+
+    _patched.append((Canvas, 'save', Canvas.__dict__.get('save')))
+    Canvas.save = traced_save
+
+    make_subset = TTFontFace.makeSubset
+
+    @functools.wraps(make_subset)
+    def traced_subset(face, subset):
+        start = time.perf_counter()
+        data = make_subset(face, subset)
+        _record('ttf.subset', 'ttf', start, time.perf_counter(), {'chars': len(subset), 'bytes': len(data)})
+        return data
+
+    _patched.append((TTFontFace, 'makeSubset', TTFontFace.__dict__.get('makeSubset')))
+    TTFontFace.makeSubset = traced_subset
+
+
+def disable():
+    """Stops recording and puts every wrapped function back."""
+    while _patched:
+        owner, attr, orig = _patched.pop()
+        if orig is None:
+            delattr(owner, attr)
+        else:
+            setattr(owner, attr, orig)
+
+
+def is_enabled():
+    return bool(_patched)
+
+
+def reset():
+    del _events[:]
+
+
+# --- OUTPUT ---
+
+def summary():
+    """
+    {'phases': {name: {'count', 'seconds'}}, 'fonts': {font: {'chars', 'subsets'}}}
+    over everything recorded so far; ttf.subset also totals 'bytes'. Times are
+    inclusive (a table.wrap span contains the paragraph.wrap spans of its cells).
+    """
+    phases, fonts = {}, {}
+    for name, cat, start, end, tid, args in _events:
+        if cat == 'fonts':
+            font = fonts.setdefault(name.split(':', 1)[1], {'chars': 0, 'subsets': 0})
+            font['chars'] += args['chars']
+            font['subsets'] += args['subsets']
+            continue
+        phase = phases.setdefault(name, {'count': 0, 'seconds': 0.0})
+        phase['count'] += 1
+        phase['seconds'] += end - start
+        if name == 'ttf.subset':
+            phase['bytes'] = phase.get('bytes', 0) + args.get('bytes', 0)
+    return {'phases': phases, 'fonts': fonts}
+
+
+def write_trace(path=None):
+    """Writes the Chrome trace JSON (traceEvents plus the summary). Returns the path."""
+    path = (path or _state['path'] or "genki-trace-{pid}.json").replace("{pid}", str(os.getpid()))
+    pid = os.getpid()
+    trace = []
+    for name, cat, start, end, tid, args in _events:
+        ts = (start - _origin) * 1e6
+        if cat == 'fonts':
+            trace.append({'name': name, 'cat': cat, 'ph': 'C', 'ts': ts, 'pid': pid, 'tid': tid, 'args': args})
+        else:
+            event = {'name': name, 'cat': cat, 'ph': 'X', 'ts': ts, 'dur': (end - start) * 1e6,
+                     'pid': pid, 'tid': tid}
+            if args:
+                event['args'] = args
+            trace.append(event)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms', 'otherData': summary()}, f)
+    _state['written'] = True
+    return path
+
+
+def _write_at_exit():
+    if _events and not _state['written']:
+        write_trace()
+
+
+def print_summary():
+    s = summary()
+    print(f"{'phase':<32} {'calls':>7} {'total':>10} {'mean':>9}")
+    for name, p in sorted(s['phases'].items(), key=lambda kv: -kv[1]['seconds']):
+        print(f"{name:<32} {p['count']:>7} {p['seconds'] * 1000:>8.1f}ms {p['seconds'] / p['count'] * 1e6:>7.0f}us")
+    subset = s['phases'].get('ttf.subset', {})
+    for font, f in s['fonts'].items():
+        print(f"font {font}: {f['chars']} chars in {f['subsets']} subsets")
+    if subset:
+        print(f"embedded subsets: {subset['count']} ({subset.get('bytes', 0) / 1e3:.1f} kB)")
+
+
+def _start_from_environment():
+    """Called from genki/__init__.py when GENKI_PROFILE is set."""
+    from multiprocessing import util
+
+    enable(os.environ["GENKI_PROFILE"])
+    atexit.register(_write_at_exit)
+    # Pool workers leave through multiprocessing's exit path, which skips
+    # atexit, and forked ones start with its finalizers cleared.
+    util.Finalize(None, _write_at_exit, exitpriority=10)
+    util.register_after_fork(sys.modules[__name__], _after_fork)
+
+
+def _after_fork(module):
+    from multiprocessing import util
+
+    del _events[:]
+    _state['written'] = False
+    util.Finalize(None, _write_at_exit, exitpriority=10)
+
+
+# --- COMMAND LINE ---
+
+def main(argv=None):
+    from genki.build import load_script, output_path
+
+    parser = argparse.ArgumentParser(description="Profile the build phases of a worksheet script.")
+    parser.add_argument("script", help="Worksheet script, e.g. 'Lesson 20/L20_worksheet1.py'")
+    parser.add_argument("documents", nargs="*", help="Output names from its DOCUMENTS (default: all)")
+    parser.add_argument("--out", default=os.path.join(REPO_ROOT, "build", "profile"), help="Folder for the PDFs")
+    parser.add_argument("--trace", help="Trace file (default: <out>/trace.json)")
+    args = parser.parse_args(argv)
+
+    script = os.path.abspath(args.script)
+    if not is_enabled():
+        enable()
+    module = load_script(script)
+    for name in args.documents or list(module.DOCUMENTS):
+        path = output_path(args.out, script, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        module.DOCUMENTS[name](path)
+
+    print_summary()
+    print(f"Trace: {write_trace(args.trace or os.path.join(args.out, 'trace.json'))}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
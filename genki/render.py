@@ -0,0 +1,110 @@
+"""
+Renders one worksheet document from the command line, and shows where the
+time to the first PDF goes.
+
+Only the standard library is loaded up front. reportlab and the rendering
+core (genki/spec.py with its ruby, furigana and layout support) are imported
+when there is something to render, the font comes from japanese_font() and
+the font cache (genki/fonts.py), and the styles from the style registry
+(genki/styles.py), so each is set up once no matter how many scripts ask.
+
+    python -m genki.render "Lesson 20/L20_worksheet1.py"      # its first document, into build/
+    python -m genki.render "Lesson 19/lesson_19_worksheetes.py" Genki_L19_Worksheet_Reflect.pdf -o /tmp/reflect.pdf
+    python -m genki.render "Lesson 20/L20_worksheet1.py" --timing
+    python -m genki.render "Lesson 20/L20_worksheet1.py" --list
+"""
+import os
+import sys
+import time
+import argparse
+
+from genki.build import REPO_ROOT, document_names, load_script, output_path
+
+_START = time.perf_counter()
+
+
+def import_core():
+    """Imports reportlab and the rendering core; returns the number of modules it loaded."""
+    before = len(sys.modules)
+    import genki.spec  # noqa: F401 (pulls in reportlab.platypus, ruby, furigana, layout)
+    return len(sys.modules) - before
+
+
+def load_font():
+    """Registers the worksheet font (once per process) and returns its name."""
+    from genki.fonts import japanese_font
+
+    return japanese_font()
+
+
+def render_document(script, name=None, out=None, timing=None):
+    """
+    Renders the document name (default: the script's first) of a worksheet
+    script into out (default: its place under build/). If timing is a dict,
+    the seconds spent in each phase are added to it. Returns the output path.
+    """
+    script = os.path.abspath(script)
+    names = document_names(script)
+    if not names:
+        raise ValueError(f"{script} has no DOCUMENTS")
+    if name is None:
+        name = names[0]
+    elif name not in names:
+        raise ValueError(f"{os.path.basename(script)} has no document {name!r} (have: {', '.join(names)})")
+    if out is None:
+        out = output_path(os.path.join(REPO_ROOT, "build"), script, name)
+    if os.path.dirname(out):
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+
+    phases = [("core", import_core), ("font", load_font), ("script", lambda: load_script(script))]
+    for phase, step in phases:
+        start = time.perf_counter()
+        result = step()
+        if timing is not None:
+            timing[phase] = time.perf_counter() - start
+            if phase == "core":
+                timing["modules"] = result
+
+    start = time.perf_counter()
+    load_script(script).DOCUMENTS[name](out)
+    if timing is not None:
+        timing["render"] = time.perf_counter() - start
+    return out
+
+
+def print_timing(timing):
+    print()
+    print(f"  {'core imports':<14} {timing['core'] * 1000:>6.0f}ms  (reportlab and genki.spec, {timing['modules']} modules)")
+    print(f"  {'font':<14} {timing['font'] * 1000:>6.0f}ms")
+    print(f"  {'script':<14} {timing['script'] * 1000:>6.0f}ms  (content and styles)")
+    print(f"  {'render':<14} {timing['render'] * 1000:>6.0f}ms")
+    print(f"  {'total':<14} {(time.perf_counter() - _START) * 1000:>6.0f}ms  since genki.render was loaded")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render one worksheet document.")
+    parser.add_argument("script", help="Worksheet script, e.g. 'Lesson 20/L20_worksheet1.py'")
+    parser.add_argument("document", nargs="?", help="Output name from its DOCUMENTS (default: the first)")
+    parser.add_argument("-o", "--out", help="PDF to write (default: under build/)")
+    parser.add_argument("--list", action="store_true", help="List the script's documents and exit")
+    parser.add_argument("--timing", action="store_true", help="Report the time spent importing, loading and rendering")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name in document_names(args.script):
+            print(name)
+        return 0
+
+    timing = {} if args.timing else None
+    try:
+        render_document(args.script, args.document, args.out, timing)
+    except ValueError as e:
+        print(e)
+        return 1
+    if timing is not None:
+        print_timing(timing)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
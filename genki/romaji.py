@@ -0,0 +1,473 @@
+"""
+Romaji for answer keys: Hepburn (or Kunrei) from kana, {base|reading}
+markup, or plain Japanese whose kanji the reading dictionary knows
+(genki/furigana.py).
+
+    romanize('お入りください', capitalize=True)     -> 'O-hairi kudasai'
+    romanize('英語が話せるはずです')                 -> 'eigo ga hanaseru hazu desu'
+    romanize('駅へ参ります', system='kunrei')        -> 'eki e mairimasu'
+    romanize('わたしはがくせいです')                 -> 'watashi wa gakusei desu'
+    romanize('田中さんは')                          -> 'tanaka-san wa'
+    romanize('ではありません')                       -> 'de wa arimasen'
+    to_romaji('きって')                              -> 'kitte'
+
+to_romaji() transliterates kana as written. The kana table, with every
+syllable and its two- and three-kana combinations, is compiled once into a
+single longest-match pattern, so each syllable is one match. small tsu
+doubles the next consonant (っち -> tch), ん before a vowel or y is n', and
+long vowels are written as spelled (long_vowels='plain': ou, ee) or with
+macrons / circumflexes ('macron').
+
+romanize() also splits words and reads particles. Kanji words come
+from the dictionary, and a kana directly after a kanji or katakana word
+that is a particle is read as one (は wa, へ e, を o). を is always a
+particle. A name suffix (さん, 様, 先生, ...) after a name is hyphenated
+and ends the word, so a particle can follow it. In plain kana, は is wa
+after a common kana word (わたし, それ, ...), a name suffix or a て-form.
+では / には / とは at the start of a word are two particles, and so are
+では / には after such a word and the では of ではありません. Common
+auxiliaries (ください, くれる, です, はず, ...) start a new word, and an
+honorific お/ご before a verb stem is hyphenated (o-hairi). These are
+heuristics, good enough for the short answers on a worksheet.
+
+Spec items opt in with 'romaji': True (or 'kunrei'), see romaji_item();
+romanize_many() handles a whole bank at once.
+
+    python -m genki.romaji お待ちください 勉強してよかったです
+    python -m genki.romaji --kunrei --macron ちょっと待ってください
+    python -m genki.romaji --bench 100000
+"""
+import re
+import sys
+import time
+import argparse
+
+from genki.kanji import KANJI
+
+SYSTEMS = ('hepburn', 'kunrei')
+
+_KANJI_RE = re.compile(f'[{KANJI}]')
+
+# --- KANA TABLE ---
+
+_ROWS = {
+    '': 'あいうえお', 'k': 'かきくけこ', 'g': 'がぎぐげご', 's': 'さしすせそ', 'z': 'ざじずぜぞ',
+    't': 'たちつてと', 'd': 'だぢづでど', 'n': 'なにぬねの', 'h': 'はひふへほ', 'b': 'ばびぶべぼ',
+    'p': 'ぱぴぷぺぽ', 'm': 'まみむめも', 'r': 'らりるれろ',
+}
+_HEPBURN_SPECIAL = {'し': 'shi', 'じ': 'ji', 'ち': 'chi', 'ぢ': 'ji', 'つ': 'tsu', 'づ': 'zu', 'ふ': 'fu'}
+_KUNREI_SPECIAL = {'ぢ': 'zi', 'づ': 'zu'}
+_YOON_HEPBURN = {'し': 'sh', 'じ': 'j', 'ち': 'ch', 'ぢ': 'j'}
+_EXTRA = {
+    'や': 'ya', 'ゆ': 'yu', 'よ': 'yo', 'わ': 'wa', 'を': 'o', 'ゐ': 'i', 'ゑ': 'e', 'ゔ': 'vu',
+    'ぁ': 'a', 'ぃ': 'i', 'ぅ': 'u', 'ぇ': 'e', 'ぉ': 'o', 'ゃ': 'ya', 'ゅ': 'yu', 'ょ': 'yo', 'ゎ': 'wa',
+    # Sounds written with small vowels, mostly in loanwords
+    'ふぁ': 'fa', 'ふぃ': 'fi', 'ふぇ': 'fe', 'ふぉ': 'fo', 'てぃ': 'ti', 'でぃ': 'di', 'とぅ': 'tu',
+    'どぅ': 'du', 'うぃ': 'wi', 'うぇ': 'we', 'うぉ': 'wo', 'ちぇ': 'che', 'しぇ': 'she', 'じぇ': 'je',
+    'つぁ': 'tsa', 'ゔぁ': 'va', 'ゔぃ': 'vi', 'ゔぇ': 've', 'ゔぉ': 'vo', 'いぇ': 'ye',
+}
+_PUNCT = str.maketrans({'。': '. ', '、': ', ', '？': '? ', '！': '! ', '「': ' "', '」': '" ', '『': ' "',
+                        '』': '" ', '（': ' (', '）': ') ', '・': ' ', '〜': '~', '～': '~', '　': ' ', '：': ': '})
+
+
+def _build_table(system):
+    table = {}
+    for consonant, kana in _ROWS.items():
+        for ch, vowel in zip(kana, 'aiueo'):
+            table[ch] = consonant + vowel
+    if system == 'hepburn':
+        table.update(_HEPBURN_SPECIAL)
+    else:
+        table.update(_KUNREI_SPECIAL)
+    table.update(_EXTRA)
+    for ch in 'きぎしじちぢにひびぴみり':
+        onset = _YOON_HEPBURN.get(ch) if system == 'hepburn' else None
+        if onset is None:
+            onset = table[ch][:-1] + 'y'
+        if system == 'kunrei' and ch in 'ぢ':
+            onset = 'zy'
+        for small, vowel in zip('ゃゅょ', 'auo'):
+            table[ch + small] = onset + vowel
+    if system == 'kunrei':
+        table.update({'ちぇ': 'tye', 'しぇ': 'sye', 'じぇ': 'zye'})
+    return table
+
+
+_TABLES = {system: _build_table(system) for system in SYSTEMS}
+# Longest first, so each match is the longest syllable at that point; っ, ん, ー and
+# anything else are single characters.
+_SYLLABLE_RE = re.compile('|'.join(sorted(map(re.escape, _TABLES['hepburn']), key=len, reverse=True)) + '|.',
+                          re.S)
+
+_KATAKANA = str.maketrans({chr(code): chr(code - 0x60) for code in range(ord('ァ'), ord('ヶ') + 1)})
+_MACRONS = {'hepburn': {'a': 'ā', 'i': 'ii', 'u': 'ū', 'e': 'ē', 'o': 'ō'},
+            'kunrei': {'a': 'â', 'i': 'î', 'u': 'û', 'e': 'ê', 'o': 'ô'}}
+_LONG = {('o', 'u'), ('o', 'o'), ('u', 'u'), ('a', 'a'), ('e', 'e')}
+
+_converted = {}    # (kana, system, long_vowels) -> romaji
+
+
+def to_romaji(kana, system='hepburn', long_vowels='plain'):
+    """Romaji for a kana string (hiragana or katakana), as written; other characters pass through."""
+    key = (kana, system, long_vowels)
+    done = _converted.get(key)
+    if done is not None:
+        return done
+    table = _TABLES[system]
+    macron = long_vowels == 'macron'
+    out = []
+    double = False
+    for m in _SYLLABLE_RE.finditer(kana.translate(_KATAKANA)):
+        syllable = m.group()
+        if syllable == 'っ':
+            double = True
+            continue
+        if syllable == 'ん':
+            following = _SYLLABLE_RE.match(kana.translate(_KATAKANA), m.end())
+            nxt = table.get(following.group(), '') if following else ''
+            out.append("n'" if nxt[:1] in ('a', 'i', 'u', 'e', 'o', 'y') else 'n')
+            continue
+        if syllable == 'ー':
+            vowel = out[-1][-1] if out and out[-1][-1:] in 'aiueo' else ''
+            if vowel and macron:
+                out[-1] = out[-1][:-1] + _MACRONS[system][vowel]
+            else:
+                out.append(vowel)
+            continue
+        roma = table.get(syllable)
+        if roma is None:
+            roma = syllable
+        elif double:
+            roma = ('t' + roma) if roma.startswith('ch') else roma[0] + roma
+        elif macron and out and (out[-1][-1:], roma) in _LONG:
+            out[-1] = out[-1][:-1] + _MACRONS[system][out[-1][-1]]
+            double = False
+            continue
+        double = False
+        out.append(roma)
+    done = _converted[key] = "".join(out)
+    return done
+
+
+def to_romaji_many(kana_list, system='hepburn', long_vowels='plain'):
+    """to_romaji() for every string in kana_list, as a list."""
+    return [to_romaji(kana, system, long_vowels) for kana in kana_list]
+
+
+# --- WORDS ---
+
+# Read as particles straight after a kanji or katakana word
+_PARTICLES = ('から', 'まで', 'より', 'には', 'では', 'とは', 'へは', 'にも', 'でも', 'とも',
+              'は', 'が', 'を', 'に', 'で', 'へ', 'と', 'も', 'の', 'や')
+# ... after です / ます / た
+_FINAL_PARTICLES = ('から', 'けど', 'が', 'か', 'ね', 'よ')
+_SENTENCE_ENDS = ('です', 'ます', 'でした', 'ました', 'た')
+# ... at the end of a kana run, before a kanji word (むかえに来る)
+_TRAILING_PARTICLES = 'にでへとがはも'
+_PARTICLE_READINGS = {'は': 'わ', 'へ': 'え', 'を': 'お'}
+# Kana words that a particle may follow in a hiragana run (わたしは, それには)
+_KANA_WORDS = ('わたし', 'わたくし', 'ぼく', 'あなた', 'かれ', 'かのじょ', 'みんな', 'これ', 'それ', 'あれ', 'どれ',
+               'ここ', 'そこ', 'あそこ', 'どこ', 'こちら', 'そちら', 'あちら', 'どちら', 'だれ', 'なに',
+               'きょう', 'あした', 'きのう', 'いま')
+# Two particles at the start of a word (ではありません), the first two also after one of those words
+_PARTICLE_PAIRS = ('では', 'には', 'とは')
+# The negative copula, whose では is split off even from a kana word (がくせいではありません)
+_NEGATIVE_COPULA = ('ではありません', 'ではない', 'ではなかった')
+# Hyphenated onto the name before them (Tanaka-san): kana after a word, kanji as their own word
+_NAME_SUFFIXES = ('さん', 'さま', 'くん', 'ちゃん')
+_NAME_SUFFIX_WORDS = ('様', '先生')
+_GREETINGS = {'こんにちは': 'こんにちわ', 'こんばんは': 'こんばんわ'}
+
+# Start a new word wherever they appear after other kana ('に' splits off as a particle)
+_AUXILIARIES = ('ください', 'くださ', 'くれ', 'ありがとう', 'ございます', 'はず', 'でした', 'でしょう', 'です',
+                'よかった', 'になり', 'になる', 'になっ', 'になら', 'いたし', 'いたす')
+# ... and after a verb stem with honorific お/ご, or a kanji compound (勉強して)
+_SURU = ('しました', 'しません', 'します', 'して', 'した', 'する', 'しない')
+
+_MARKUP_RE = re.compile(r'<[^>]*>|&(\w+);|\{([^{}|<>\s]+)\|([^{}|<>\s]+)\}')
+_ENTITIES = {'nbsp': ' ', 'amp': '&', 'lt': '<', 'gt': '>', 'rarr': '->', 'rightarrow': '->'}
+_HIRAGANA_RE = re.compile('[ぁ-ゖー]+')
+_KATAKANA_RE = re.compile('[ァ-ヺー]+')
+_OTHER_RE = re.compile(f'[^ぁ-ゖァ-ヺー{KANJI}]+')
+
+
+def _tokens(text):
+    """
+    (kind, kana, surface) for each piece of text: 'word' (kanji with its
+    reading, or katakana), 'kana' (a hiragana run), 'unknown' (a kanji
+    without a reading), 'other' (anything else, as it is).
+    """
+    from genki.furigana import longest_match
+
+    tokens = []
+    pos = 0
+    for m in _MARKUP_RE.finditer(text):
+        tokens.extend(_plain_tokens(text[pos:m.start()], longest_match))
+        if m.group(2):
+            tokens.append(('word', m.group(3), m.group(2)))
+        elif m.group(1):
+            tokens.append(('other', _ENTITIES.get(m.group(1), ''), m.group()))
+        pos = m.end()
+    tokens.extend(_plain_tokens(text[pos:], longest_match))
+    return tokens
+
+
+def _plain_tokens(text, longest_match):
+    pos, end = 0, len(text)
+    while pos < end:
+        ch = text[pos]
+        if _KANJI_RE.match(ch):
+            match = longest_match(text, pos)
+            if match is None:
+                yield 'unknown', '', ch
+                pos += 1
+                continue
+            stop, segments = match
+            reading = "".join(reading or base for base, reading in segments)
+            # Entries that carry their particle for the reading (何と -> なんと): word, then the particle
+            shorter = longest_match(text, pos, stop - 1) if text[stop - 1] in 'をとかがもにでは' else None
+            if shorter is not None and shorter[0] == stop - 1:
+                word = "".join(r or base for base, r in shorter[1])
+                if word + text[stop - 1] == reading or (text[stop - 1] == 'を' and reading.endswith('を')):
+                    yield 'word', reading[:-1], text[pos:stop - 1]
+                    yield 'kana', text[stop - 1], text[stop - 1]
+                    pos = stop
+                    continue
+            yield 'word', reading, text[pos:stop]
+            pos = stop
+            continue
+        m = _HIRAGANA_RE.match(text, pos) or _KATAKANA_RE.match(text, pos)
+        if m is not None:
+            yield ('word' if m.re is _KATAKANA_RE else 'kana'), m.group(), m.group()
+            pos = m.end()
+            continue
+        m = _OTHER_RE.match(text, pos)
+        yield 'other', m.group().translate(_PUNCT), m.group()
+        pos = m.end()
+
+
+def _alternatives(words):
+    return re.compile('|'.join(sorted(words, key=len, reverse=True)))
+
+
+_PARTICLE_RE = _alternatives(_PARTICLES)
+_PARTICLE_PAIR_RE = _alternatives(_PARTICLE_PAIRS)
+_NEGATIVE_COPULA_RE = _alternatives(_NEGATIVE_COPULA)
+_NAME_SUFFIX_RE = _alternatives(_NAME_SUFFIXES)
+_FINAL_PARTICLE_RE = _alternatives(_FINAL_PARTICLES)
+_AUXILIARY_RE = _alternatives(_AUXILIARIES)
+_AUXILIARY_SURU_RE = _alternatives(_AUXILIARIES + _SURU)
+
+
+def _starts(run, i, pattern):
+    m = pattern.match(run, i)
+    return m.group() if m else None
+
+
+def _is_name(surface):
+    """True if a name suffix after surface is one (田中さん, ミラーさん), not part of a word (お母さん)."""
+    return surface is not None and (len(surface) >= 2 or _KATAKANA_RE.match(surface) is not None)
+
+
+def _split_run(run, prev, honorific, before_word):
+    """
+    Splits a hiragana run into (kana, kind) pieces. prev is the surface of
+    the word just before it (None if there isn't one), honorific is True
+    after お/ご + verb stem, before_word True if a kanji word follows.
+    """
+    compound = prev is not None and len(prev) >= 2 and all(_KANJI_RE.match(ch) for ch in prev)
+    starts = _AUXILIARY_SURU_RE if honorific or compound else _AUXILIARY_RE
+    pieces, current = [], ''
+    kind = 'word' if prev is None else 'glue'
+    after_word = 0 if prev is not None else None   # where a particle can follow the word before
+
+    def flush():
+        if current:
+            pieces.append((current, kind))
+
+    for word, spelled in _GREETINGS.items():
+        run = run.replace(word, spelled)
+    i = 0
+    while i < len(run):
+        suffix = _starts(run, i, _NAME_SUFFIX_RE) if i == 0 and _is_name(prev) else None
+        if suffix is not None:
+            rest = i + len(suffix)
+            if rest == len(run) or run[rest] == 'を' or _starts(run, rest, _PARTICLE_RE):
+                pieces.append(('-' + suffix, 'glue'))
+                i = after_word = rest
+                continue
+        aux = _starts(run, i, starts)
+        particle = None
+        if run[i] == 'を':
+            particle = 'を'
+        elif aux is None and i == after_word:
+            particle = _starts(run, i, _PARTICLE_RE)
+        elif aux is None and not current:
+            particle = _starts(run, i, _PARTICLE_PAIR_RE)
+        elif aux is None and current.endswith(_KANA_WORDS) and run[i:i + 2] in _PARTICLE_PAIRS[:2]:
+            particle = run[i:i + 2]
+        elif _starts(run, i, _NEGATIVE_COPULA_RE):
+            particle = 'では'
+        elif aux is None and run[i] == 'は' and current.endswith(_KANA_WORDS + _NAME_SUFFIXES + ('て',)):
+            particle = 'は'
+        elif aux is None and current.endswith(_SENTENCE_ENDS):
+            particle = _starts(run, i, _FINAL_PARTICLE_RE)
+        elif (before_word and i == len(run) - 1 and len(run) >= 3 and run[i] in _TRAILING_PARTICLES
+              and run[i - 1] != 'っ'):
+            particle = run[i]
+        if particle is not None:
+            flush()
+            for p in ((particle[0], particle[1]) if particle[1:] in ('は', 'も') else (particle,)):
+                pieces.append((_PARTICLE_READINGS.get(p, p), 'particle'))
+            current, kind = '', 'word'
+            i += len(particle)
+            continue
+        if aux is not None and (current or pieces or prev is not None):
+            flush()
+            i += len(aux)
+            if aux.startswith('にな'):
+                pieces.append(('に', 'particle'))
+                aux = aux[1:]
+            current, kind = aux, 'word'
+            continue
+        current += run[i]
+        i += 1
+    flush()
+    return pieces
+
+
+def _words(text):
+    """[(kana or text, kind)], kind 'word', 'glue' (joins the word before), 'particle' or 'other'."""
+    tokens = _tokens(text)
+    words = []
+    prev = None          # surface of the word token just before
+    prefix = None        # after an honorific お/ご: 'stem' (o-hairi) or 'noun' (okane)
+    honorific = False
+    for n, (kind, kana, surface) in enumerate(tokens):
+        if kind in ('word', 'unknown'):
+            if surface in _NAME_SUFFIX_WORDS and prefix is None and _is_name(prev):
+                words.append(('-' + kana, 'glue'))
+                prev = surface
+                continue
+            words.append((kana or surface, 'glue' if prefix else 'word'))
+            honorific = prefix == 'stem'
+            prefix, prev = None, surface
+            continue
+        if kind == 'other':
+            words.append((kana, 'other'))
+            prefix, prev, honorific = None, None, False
+            continue
+        nxt = tokens[n + 1] if n + 1 < len(tokens) else None
+        before_word = nxt is not None and nxt[0] in ('word', 'unknown') and _KANJI_RE.match(nxt[2][0]) is not None
+        run = kana
+        if before_word and run[-1] in 'おご':
+            after = tokens[n + 2] if n + 2 < len(tokens) else None
+            stem = after is not None and after[0] == 'kana' and _starts(after[1], 0, _PARTICLE_RE) is None
+            prefix = 'stem' if stem else 'noun'
+            run = run[:-1]
+        if run:
+            words.extend(_split_run(run, prev, honorific, before_word and prefix is None))
+        if prefix:
+            words.append((kana[-1] + ('-' if prefix == 'stem' else ''), 'word'))
+        prev, honorific = None, False
+    return words
+
+
+_romanized = {}    # (text, system, long_vowels, capitalize) -> romaji
+_SPACES_RE = re.compile(r'\s+')
+_SPACE_BEFORE_RE = re.compile(r' ([.,?!:)"])')
+_FIRST_LETTER_RE = re.compile(r'[^\W\d_]')
+
+
+def romanize(text, system='hepburn', long_vowels='plain', capitalize=False):
+    """Romaji for a Japanese phrase, with words split and particles read as particles."""
+    key = (text, system, long_vowels, capitalize)
+    done = _romanized.get(key)
+    if done is not None:
+        return done
+    out = []
+    for word, kind in _words(text):
+        if kind == 'other':
+            out.append(word)
+            continue
+        if kind != 'glue' and out and not out[-1].endswith((' ', '(', '"', '-')):
+            out.append(' ')
+        out.append(to_romaji(word, system, long_vowels))
+    done = _SPACE_BEFORE_RE.sub(r'\1', _SPACES_RE.sub(' ', "".join(out))).strip()
+    if capitalize:
+        done = _FIRST_LETTER_RE.sub(lambda m: m.group().upper(), done, count=1)
+    _romanized[key] = done
+    return done
+
+
+def romanize_many(texts, system='hepburn', long_vowels='plain', capitalize=False):
+    """romanize() for every string in texts, as a list (repeats are looked up once)."""
+    return [romanize(text, system, long_vowels, capitalize) for text in texts]
+
+
+# --- SPEC ITEMS ---
+
+_NUMBERING_RE = re.compile(r'^(?:\s|<[^>]*>|&\w+;)*(?:\d+\.|[A-Z]:)?(?:\s|&\w+;)*')
+_JAPANESE_RE = re.compile(f'[ぁ-ゖァ-ヺ{KANJI}]')
+
+
+def with_romaji(text, system='hepburn'):
+    """text with ' (Romaji)' after every <br/>-separated line that has Japanese in it."""
+    lines = text.split('<br/>')
+    for n, line in enumerate(lines):
+        if _JAPANESE_RE.search(line) is None:
+            continue
+        phrase = line[_NUMBERING_RE.match(line).end():].strip()
+        lines[n] = f"{line.rstrip()} ({romanize(phrase, system, capitalize=True)})"
+    return '<br/>'.join(lines)
+
+
+def romaji_item(item):
+    """
+    A copy of a spec item (genki/spec.py) with 'romaji': True (or 'kunrei')
+    with romaji after its Japanese: each line of a 'text' or 'answer', each
+    of a 'blanks' item's answers, and the answer column of a 'drill'.
+    """
+    system = 'kunrei' if item['romaji'] == 'kunrei' else 'hepburn'
+    item = dict(item)
+    if item['type'] in ('text', 'answer'):
+        item['text'] = with_romaji(item['text'], system)
+    elif item['type'] == 'blanks':
+        item['answers'] = [(with_romaji(answer, system), note) for answer, note in item['answers']]
+    elif item['type'] == 'drill':
+        col = item.get('answer_col', -1)
+        rows = [item['data'][0]]
+        for row in item['data'][1:]:
+            row = list(row)
+            row[col] = with_romaji(row[col], system)
+            rows.append(row)
+        item['data'] = rows
+    return item
+
+
+# --- COMMAND LINE ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Romaji for Japanese text.")
+    parser.add_argument("text", nargs="*", help="Text to romanize")
+    parser.add_argument("--kunrei", action="store_true", help="Kunrei-shiki instead of Hepburn")
+    parser.add_argument("--macron", action="store_true", help="Long vowels with macrons (circumflexes in Kunrei)")
+    parser.add_argument("--bench", type=int, metavar="N", help="Time N phrases, half of them distinct")
+    args = parser.parse_args(argv)
+
+    system = 'kunrei' if args.kunrei else 'hepburn'
+    long_vowels = 'macron' if args.macron else 'plain'
+    for text in args.text:
+        print(f"{text}  ->  {romanize(text, system, long_vowels)}")
+    if args.bench:
+        phrases = [f"{n}. お{verb}ください" for n in range(args.bench // 2)
+                   for verb in ('入り', '待ち')][:args.bench]
+        start = time.perf_counter()
+        romanize_many(phrases, system, long_vowels)
+        seconds = time.perf_counter() - start
+        print(f"{len(phrases)} phrases in {seconds * 1000:.0f}ms ({len(phrases) / seconds:.0f}/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+Ruby (furigana): readings set in small kana above their kanji.
+
+Write a reading as {base|reading} anywhere in a spec string (or any text
+given to RubyParagraph):
+
+    '駅へ<b>{参|まい}ります</b>。'
+    '{召|め}し{上|あ}がります'
+
+RubyParagraph is a Paragraph (with the layout cache, genki/layout.py) that
+puts a zero-width marker after each base, so the paragraph's own line
+breaking, alignment and page splitting place the kanji exactly as before and
+the readings are drawn over wherever the bases ended up, any number per
+line. Paragraphs with readings get the extra leading the ruby line needs (at
+least fontSize * (1 + RUBY_SCALE) + RUBY_GAP); paragraphs without any are
+plain Paragraphs.
+
+Bases and readings are measured with a per-font glyph-width table
+(glyph_widths()), built once per font from the TrueType metrics already
+loaded, so placing a ruby costs a few dict lookups. genki/kinsoku.py breaks
+lines with the same tables. A reading wider than its
+base overhangs the neighbouring characters by up to half a ruby character
+on each side, then is condensed (down to MIN_SQUEEZE of its width).
+"""
+import re
+
+from reportlab.lib.abag import ABag
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.pdfbase import pdfmetrics
+
+from genki.layout import CachedParagraph
+
+RUBY_RE = re.compile(r'\{([^{}|<>\s]+)\|([^{}|<>\s]+)\}')
+
+RUBY_SCALE = 0.5     # ruby size / base size
+RUBY_GAP = 1.0       # points between the top of the kanji and the bottom of the ruby
+BASE_TOP = 0.88      # top of a kanji's em box above the baseline, in ems
+MIN_SQUEEZE = 0.6
+
+_MARKER = 'genki_ruby'    # onDraw callback name
+
+_widths = {}         # font name -> GlyphWidths
+_ruby_styles = {}    # id(style) -> (style, style with ruby leading)
+
+
+# --- MARKUP ---
+
+# Between parsing and layout a ruby is carried as OPEN reading SEP base CLOSE
+# (private-use characters, untouched by the markup parser); _split_ruby then
+# cuts the parsed fragments at them and puts the onDraw markers in. A marker
+# goes after its base, not before: a zero-width fragment in front of a word
+# stays behind on the previous line when the line breaks there.
+_OPEN, _SEP, _CLOSE = '\ue000', '\ue001', '\ue002'
+_CARRIED_RE = re.compile(f'{_OPEN}([^{_SEP}]*){_SEP}([^{_CLOSE}]*){_CLOSE}')
+
+
+def has_ruby(text):
+    return '{' in text and RUBY_RE.search(text) is not None
+
+
+def plain(text, readings=False):
+    """The text without ruby markup: just the bases, or just the readings in their place."""
+    return RUBY_RE.sub(r'\2' if readings else r'\1', text)
+
+
+def ruby(base, reading):
+    return f'{{{base}|{reading}}}'
+
+
+def is_ruby_marker(frag):
+    """True for the zero-width fragment RubyParagraph puts after each base."""
+    return getattr(getattr(frag, 'cbDefn', None), 'name', None) == _MARKER
+
+
+def _split_ruby(frags):
+    out = []
+    for f in frags:
+        text = getattr(f, 'text', '')
+        if _OPEN not in text:
+            out.append(f)
+            continue
+        pos = 0
+        for m in _CARRIED_RE.finditer(text):
+            if m.start() > pos:
+                out.append(f.clone(text=text[pos:m.start()]))
+            out.append(f.clone(text=m.group(2)))
+            out.append(f.clone(text='', cbDefn=ABag(kind='onDraw', name=_MARKER, label=(m.group(2), m.group(1)))))
+            pos = m.end()
+        if pos < len(text):
+            out.append(f.clone(text=text[pos:]))
+    return out
+
+
+# --- GLYPH WIDTHS ---
+
+class GlyphWidths(dict):
+    """char -> advance width in 1/1000 em; a character not in the table is measured once, on first use."""
+
+    def __init__(self, font_name, widths=(), default=None):
+        dict.__init__(self, widths)
+        self.font_name = font_name
+        self.default = default
+
+    def __missing__(self, ch):
+        width = self[ch] = (self.default if self.default is not None
+                            else pdfmetrics.stringWidth(ch, self.font_name, 1000))
+        return width
+
+
+def glyph_widths(font_name):
+    """The GlyphWidths of a registered font, built once from its TrueType metrics."""
+    table = _widths.get(font_name)
+    if table is None:
+        font = pdfmetrics.getFont(font_name)
+        face = getattr(font, 'face', None)
+        if hasattr(face, 'charWidths'):
+            table = GlyphWidths(font_name, {chr(code): width for code, width in face.charWidths.items()},
+                                face.defaultWidth)
+        else:
+            # Standard fonts: filled in per character on first use
+            table = GlyphWidths(font_name)
+        _widths[font_name] = table
+    return table
+
+
+def text_width(text, font_name, size):
+    return sum(map(glyph_widths(font_name).__getitem__, text)) * size / 1000
+
+
+# --- DRAWING ---
+
+def _place_ruby(canv, kind, label):
+    """Places the reading over the base just set; RubyParagraph.draw draws them all afterwards."""
+    info = canv._curr_tx_info
+    base_text, reading = label
+    tx, style = info['tx'], info['xs'].style
+    base_size = tx._fontsize or style.fontSize
+    base = text_width(base_text, tx._fontname or style.fontName, base_size)
+    start_x = info['cur_x'] - base
+    size = base_size * RUBY_SCALE
+    width = text_width(reading, style.fontName, size)
+
+    scale = 1.0
+    room = base + size    # half a ruby character of overhang on either side
+    if width > room:
+        scale = max(MIN_SQUEEZE, room / width)
+    x = start_x + (base - width * scale) / 2
+    y = info['cur_y'] + base_size * BASE_TOP + RUBY_GAP + size * (1 - BASE_TOP)
+    canv._genki_rubies.append((x, y, size, scale, reading))
+
+
+def _draw_rubies(canv, rubies, style):
+    """All of a paragraph's readings in one text object."""
+    text = canv.beginText()
+    text.setFillColor(style.textColor)
+    size, scale = None, 1.0
+    for x, y, ruby_size, ruby_scale, reading in rubies:
+        if ruby_size != size:
+            text.setFont(style.fontName, ruby_size)
+            size = ruby_size
+        if ruby_scale != scale:
+            text.setHorizScale(ruby_scale * 100)
+            scale = ruby_scale
+        text.setTextOrigin(x, y)
+        text.textOut(reading)
+    canv.drawText(text)
+
+
+def ruby_style(style):
+    """style, or a copy with enough leading for a ruby line above every line of text."""
+    leading = style.fontSize * (1 + RUBY_SCALE) + RUBY_GAP
+    if style.leading >= leading:
+        return style
+    entry = _ruby_styles.get(id(style))
+    if entry is None or entry[0] is not style:
+        entry = (style, ParagraphStyle(style.name + 'Ruby', parent=style, leading=leading))
+        _ruby_styles[id(style)] = entry
+    return entry[1]
+
+
+# --- PARAGRAPH ---
+
+class RubyParagraph(CachedParagraph):
+    """Paragraph that draws {base|reading} markup as ruby; otherwise identical to Paragraph."""
+
+    def __init__(self, text, style=None, bulletText=None, frags=None, caseSensitive=1, encoding='utf8'):
+        if isinstance(text, str) and style is not None and has_ruby(text):
+            text = RUBY_RE.sub(f'{_OPEN}\\2{_SEP}\\1{_CLOSE}', text)
+            style = ruby_style(style)
+        CachedParagraph.__init__(self, text, style, bulletText, frags, caseSensitive, encoding)
+
+    def _setup(self, text, style, bulletText, frags, cleaner):
+        CachedParagraph._setup(self, text, style, bulletText, frags, cleaner)
+        if frags is None and _OPEN in self.text:
+            self.frags = _split_ruby(self.frags)
+
+    def _ruby_room(self):
+        """Space needed above the first line for its readings (0 if it has none). Needs wrap() first."""
+        blPara = getattr(self, 'blPara', None)
+        if blPara is None or blPara.kind != 1 or not blPara.lines:
+            return 0
+        if not any(is_ruby_marker(w) for w in blPara.lines[0].words):
+            return 0
+        size = self.style.fontSize
+        return max(0, size * BASE_TOP + RUBY_GAP + size * RUBY_SCALE - size)
+
+    def wrap(self, availWidth, availHeight):
+        width, height = CachedParagraph.wrap(self, availWidth, availHeight)
+        self.height = height + self._ruby_room()
+        return width, self.height
+
+    def split(self, availWidth, availHeight):
+        return CachedParagraph.split(self, availWidth, availHeight - self._ruby_room())
+
+    def draw(self):
+        canv = self.canv
+        if canv.getNamedCB(_MARKER) is None:
+            canv.setNamedCB(_MARKER, _place_ruby)
+        canv._genki_rubies = rubies = []
+        # drawPara puts the first baseline at height - fontSize; leave the room above it
+        room = self._ruby_room()
+        self.height -= room
+        try:
+            CachedParagraph.draw(self)
+        finally:
+            self.height += room
+            del canv._genki_rubies
+        if rubies:
+            _draw_rubies(canv, rubies, self.style)
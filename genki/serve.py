@@ -0,0 +1,413 @@
+"""
+Local HTTP service that renders worksheets on demand.
+
+The worker processes import every worksheet script once at start-up (as
+genki/build.py's workers do), so fonts and styles are already loaded when a
+request arrives; PDFs are rendered into memory and returned as the response
+body, nothing is written to disk.
+
+    python -m genki.serve --port 8750 -j 4
+
+    POST /render             body: a spec (the item list create_pdf() takes,
+                             e.g. ws2_content) or {"content": [...],
+                             "styles": "<script stem>", "mode": "student" |
+                             "key" | "combined"}; returns application/pdf
+    GET  /documents          the worksheets in the lesson folders
+    GET  /documents/<Lesson NN>/<name>.pdf   one of them, rendered fresh
+    GET  /metrics            request counts and latency percentiles (JSON)
+    GET  /health
+
+At most --max-inflight requests render at once; others wait up to
+--queue-timeout seconds for a slot and then get 503 with Retry-After.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import contextlib
+import collections
+from urllib.parse import unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = ('student', 'key', 'combined')
+MAX_BODY = 2 * 1024 * 1024
+
+# The fields genki/spec.py's item_blocks() reads from each item type without a default.
+REQUIRED_FIELDS = {
+    'title': ('text',),
+    'header': ('text',),
+    'text': ('text',),
+    'table': ('data', 'widths'),
+    'break': (),
+    'spacer': (),
+    'drill': ('data', 'widths'),
+    'blanks': ('text', 'answers'),
+    'choice': ('number', 'prompt', 'choices', 'answer'),
+    'circle': ('text', 'choices', 'answers'),
+    'answer': ('text',),
+    'name': (),
+}
+
+# What each field has to be, wherever it appears: (accepted types, description)
+_STRING = ((str,), "a string")
+_LIST = ((list, tuple), "a list")
+_INT = ((int,), "an integer")
+_NUMBER = ((int, float), "a number")
+FIELD_TYPES = {
+    'text': _STRING, 'prompt': _STRING, 'key_text': _STRING, 'name': _STRING, 'blank': _STRING,
+    'only': _STRING, 'cells': _STRING,
+    'data': _LIST, 'widths': _LIST, 'choices': _LIST, 'answers': _LIST,
+    'answer': _INT, 'number': _INT, 'start': _INT, 'answer_col': _INT,
+    'height': _NUMBER, 'padding': _NUMBER,
+}
+
+
+# --- WORKERS ---
+
+# script stem -> styles dict, filled in by _init_worker
+_styles = {}
+
+
+def _init_worker(scripts):
+    from genki.build import load_script, warm_worker
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        warm_worker(scripts)
+    for script in scripts:
+        module = load_script(script)
+        if hasattr(module, 'styles'):
+            _styles[os.path.splitext(os.path.basename(script))[0]] = module.styles
+
+
+def _ping():
+    return os.getpid()
+
+
+def _bad_item(content, styles, errors):
+    """(index, error) of the first item that fails to render on its own, or None."""
+    from genki.incremental import build_pdf
+    from genki.spec import build_story, new_doc
+
+    for n, item in enumerate(content):
+        try:
+            for mode in ('student', 'key'):
+                build_pdf(new_doc(io.BytesIO()), build_story([item], styles, mode))
+        except errors as e:
+            return n, e
+    return None
+
+
+def render_spec(content, styles_name, mode='student'):
+    """
+    Renders a spec to PDF bytes. Returns (pdf, seconds spent rendering).
+    An item that check_spec() let through but that still fails to render
+    (or to lay out) raises ValueError naming it.
+    """
+    from reportlab.platypus.doctemplate import LayoutError
+    from genki.incremental import build_pdf
+    from genki.spec import build_story, new_doc
+
+    start = time.perf_counter()
+    styles = _styles.get(styles_name)
+    if styles is None:
+        raise ValueError(f"unknown styles {styles_name!r} (have: {', '.join(sorted(_styles))})")
+    errors = (KeyError, TypeError, IndexError, AttributeError, ValueError, LayoutError)
+    buf = io.BytesIO()
+    try:
+        build_pdf(new_doc(buf), build_story(content, styles, mode))
+    except errors:
+        bad = _bad_item(content, styles, errors)
+        if bad is None:
+            raise
+        n, e = bad
+        raise ValueError(f"item {n} ({content[n]['type']}) is malformed: {type(e).__name__}: {e}")
+    return buf.getvalue(), time.perf_counter() - start
+
+
+def render_document(script, name):
+    """Renders one DOCUMENTS entry to PDF bytes. Returns (pdf, seconds spent rendering)."""
+    from genki.build import load_script
+
+    start = time.perf_counter()
+    buf = io.BytesIO()
+    with contextlib.redirect_stdout(io.StringIO()):
+        load_script(script).DOCUMENTS[name](buf)
+    return buf.getvalue(), time.perf_counter() - start
+
+
+def _is(value, types):
+    # bool is an int subclass, but True is no answer index or height
+    return isinstance(value, types) and not isinstance(value, bool)
+
+
+def _shape_problem(kind, item):
+    """What is wrong with the item's lists and indexes, or None."""
+    if kind in ('table', 'drill'):
+        if not item['data'] or not all(_is(row, _LIST[0]) for row in item['data']):
+            return "data must be a non-empty list of rows (lists)"
+        if not all(_is(w, _NUMBER[0]) for w in item['widths']):
+            return "widths must be numbers"
+        col = item.get('answer_col', -1)
+        if kind == 'drill' and not all(-len(row) <= col < len(row) for row in item['data']):
+            return f"answer_col {col} is outside a row"
+    elif kind == 'choice':
+        if not item['choices'] or not all(_is(c, _STRING[0]) for c in item['choices']):
+            return "choices must be a non-empty list of strings"
+        if not 0 <= item['answer'] < len(item['choices']):
+            return f"answer {item['answer']} is not the index of one of its {len(item['choices'])} choices"
+    elif kind == 'circle':
+        choices, answers = item['choices'], item['answers']
+        if not all(_is(options, _LIST[0]) and options and all(_is(c, _STRING[0]) for c in options)
+                   for options in choices):
+            return "choices must be a list of non-empty lists of strings, one per blank"
+        if len(answers) != len(choices):
+            return f"answers has {len(answers)} entries for {len(choices)} blanks"
+        for n, (options, answer) in enumerate(zip(choices, answers), 1):
+            if not _is(answer, _INT[0]) or not 0 <= answer < len(options):
+                return f"answer {answer!r} for blank {n} is not the index of one of its options"
+    elif kind == 'blanks':
+        for answer in item['answers']:
+            if (not _is(answer, _LIST[0]) or len(answer) != 2 or not _is(answer[0], _STRING[0])
+                    or not (answer[1] is None or _is(answer[1], _STRING[0]))):
+                return "answers must be [answer, note or null] pairs of strings"
+    return None
+
+
+def check_spec(content):
+    """
+    Raises ValueError unless content looks like a spec: a list of
+    {'type': ...} items of known types, each with the fields its type needs,
+    every field of the right type and every answer index in range.
+    """
+    if not isinstance(content, list) or not content:
+        raise ValueError("the spec must be a non-empty list of items")
+    for n, item in enumerate(content):
+        if not isinstance(item, dict) or not isinstance(item.get('type'), str):
+            raise ValueError(f"item {n} must be an object with a 'type'")
+        kind = item['type']
+        if kind not in REQUIRED_FIELDS:
+            raise ValueError(f"item {n} has unknown type {kind!r} (have: {', '.join(sorted(REQUIRED_FIELDS))})")
+        missing = [field for field in REQUIRED_FIELDS[kind] if field not in item]
+        if missing:
+            raise ValueError(f"item {n} ({kind}) is missing {', '.join(missing)}")
+        for field, value in item.items():
+            types, what = FIELD_TYPES.get(field, (None, None))
+            if types and not _is(value, types) and not (value is None and field not in REQUIRED_FIELDS[kind]):
+                raise ValueError(f"item {n} ({kind}): {field} must be {what}, not {type(value).__name__}")
+        problem = _shape_problem(kind, item)
+        if problem:
+            raise ValueError(f"item {n} ({kind}): {problem}")
+
+
+# --- METRICS ---
+
+class Metrics:
+    """Request counters and a window of recent latencies, shared by the handler threads."""
+
+    def __init__(self, window=1000):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counts = collections.Counter()
+        self.in_flight = 0
+        self.latency = collections.deque(maxlen=window)
+        self.render = collections.deque(maxlen=window)
+
+    def record(self, status, seconds, render_seconds=None):
+        with self.lock:
+            self.counts[str(status)] += 1
+            if status == 200:
+                self.latency.append(seconds)
+                self.render.append(render_seconds)
+
+    def snapshot(self):
+        with self.lock:
+            latency, render = sorted(self.latency), sorted(self.render)
+            return {
+                'uptime_s': round(time.time() - self.started, 1),
+                'requests': dict(self.counts),
+                'in_flight': self.in_flight,
+                'latency_ms': _percentiles(latency),
+                'render_ms': _percentiles(render),
+            }
+
+
+def _percentiles(values):
+    if not values:
+        return {}
+    pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2)
+    return {'p50': pick(0.50), 'p90': pick(0.90), 'p99': pick(0.99), 'max': pick(1.0), 'n': len(values)}
+
+
+# --- HTTP ---
+
+class RenderService:
+    """The worker pool, the in-flight limit and the metrics behind the handler."""
+
+    def __init__(self, scripts, workers=None, max_inflight=None, queue_timeout=2.0):
+        self.scripts = scripts
+        self.workers = workers or os.cpu_count() or 1
+        self.max_inflight = max_inflight or 2 * self.workers
+        self.slots = threading.BoundedSemaphore(self.max_inflight)
+        self.queue_timeout = queue_timeout
+        self.metrics = Metrics()
+        self.pool_lock = threading.Lock()
+        self.pool = self._new_pool()
+
+    def _new_pool(self):
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.scripts,))
+        # Start every worker now, so the first requests don't pay for imports
+        for future in [pool.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+        return pool
+
+    def run(self, fn, *args):
+        """Runs fn in the pool. Returns (pdf, render seconds); None if no slot was free in time."""
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            return None
+        with self.metrics.lock:
+            self.metrics.in_flight += 1
+        try:
+            pool = self.pool
+            try:
+                return pool.submit(fn, *args).result()
+            except BrokenProcessPool:
+                # A worker died; replace the pool for the next requests
+                with self.pool_lock:
+                    if self.pool is pool:
+                        self.pool = self._new_pool()
+                raise
+        finally:
+            with self.metrics.lock:
+                self.metrics.in_flight -= 1
+            self.slots.release()
+
+    def close(self):
+        self.pool.shutdown()
+
+
+class Handler(BaseHTTPRequestHandler):
+    service = None    # set by serve()
+    documents = {}    # "Lesson NN/name.pdf" -> (script, name)
+    default_styles = "lesson_19_worksheetes"
+    quiet = False
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def _send(self, status, body, content_type="application/json", headers=()):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in headers:
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _render(self, start, fn, *args):
+        try:
+            result = self.service.run(fn, *args)
+        except ValueError as e:
+            self._send(400, {'error': str(e)})
+            self.service.metrics.record(400, time.perf_counter() - start)
+            return
+        except Exception as e:
+            self._send(500, {'error': f"{type(e).__name__}: {e}"})
+            self.service.metrics.record(500, time.perf_counter() - start)
+            return
+        if result is None:
+            self._send(503, {'error': "busy, try again"}, headers=[("Retry-After", "1")])
+            self.service.metrics.record(503, time.perf_counter() - start)
+            return
+        pdf, render_seconds = result
+        self._send(200, pdf, "application/pdf", [("X-Render-Ms", f"{render_seconds * 1000:.1f}")])
+        self.service.metrics.record(200, time.perf_counter() - start, render_seconds)
+
+    def do_GET(self):
+        start = time.perf_counter()
+        path = unquote(self.path.split("?", 1)[0]).rstrip("/")
+        if path == "/health":
+            self._send(200, {'ok': True})
+        elif path == "/metrics":
+            self._send(200, self.service.metrics.snapshot())
+        elif path == "/documents":
+            self._send(200, sorted(self.documents))
+        elif path.startswith("/documents/") and path[len("/documents/"):] in self.documents:
+            self._render(start, render_document, *self.documents[path[len("/documents/"):]])
+        else:
+            self._send(404, {'error': f"no such resource: {path}"})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        if self.path.split("?", 1)[0].rstrip("/") != "/render":
+            self._send(404, {'error': f"no such resource: {self.path}"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if not 0 < length <= MAX_BODY:
+            self._send(413 if length else 411, {'error': f"send a JSON body of at most {MAX_BODY} bytes"})
+            return
+        try:
+            body = json.loads(self.rfile.read(length))
+            request = body if isinstance(body, dict) else {'content': body}
+            content = request.get('content')
+            mode = request.get('mode', 'student')
+            check_spec(content)
+            if mode not in MODES:
+                raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        except ValueError as e:   # includes json.JSONDecodeError
+            self._send(400, {'error': str(e)})
+            self.service.metrics.record(400, time.perf_counter() - start)
+            return
+        self._render(start, render_spec, content, request.get('styles', self.default_styles), mode)
+
+
+def serve(host="127.0.0.1", port=8750, workers=None, max_inflight=None, queue_timeout=2.0,
+          default_styles="lesson_19_worksheetes", quiet=False):
+    from genki.build import discover
+
+    jobs = discover()
+    scripts = sorted({script for script, _ in jobs})
+    Handler.documents = {f"{os.path.basename(os.path.dirname(s))}/{n}": (s, n) for s, n in jobs}
+    Handler.default_styles = default_styles
+    Handler.quiet = quiet
+    Handler.service = RenderService(scripts, workers, max_inflight, queue_timeout)
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Serving worksheets on http://{host}:{server.server_address[1]}/ "
+          f"({Handler.service.workers} workers, {Handler.service.max_inflight} in flight)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        Handler.service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve worksheet PDFs rendered by warm worker processes.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8750, help="Port (default: 8750)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument("--max-inflight", type=int, default=None,
+                        help="Requests rendering at once (default: twice the workers)")
+    parser.add_argument("--queue-timeout", type=float, default=2.0,
+                        help="Seconds a request waits for a free slot before 503 (default: 2)")
+    parser.add_argument("--styles", default="lesson_19_worksheetes",
+                        help="Script whose styles POSTed specs use unless they name one")
+    parser.add_argument("--quiet", action="store_true", help="Don't log each request")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.jobs, args.max_inflight, args.queue_timeout, args.styles, args.quiet)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+Declarative worksheet specs: one content list renders the student sheet, the
+red answer key, and a combined sheet with the key on its own page at the end.
+
+A spec is the same list of {'type': ...} dicts that create_pdf() in
+Lesson 19/lesson_19_worksheetes.py consumes ('title', 'header', 'text',
+'table', 'break', 'spacer'), plus item types that carry their own answers:
+
+    'drill'   table; column 'answer_col' of each row after the header holds the
+              answer, which is blanked on the student sheet and red in the key
+    'blanks'  passage with numbered blanks; 'answers' is a list of
+              (answer, note) pairs, note may be None
+    'choice'  multiple choice: 'number', 'prompt', 'choices', and 'answer'
+              (index of the right choice)
+    'circle'  passage with inline "circle one" choices: each {{n}} in 'text'
+              becomes "( a. ... / b. ... )" from choices[n-1]; 'answers'
+              holds the index of the right option for each
+    'answer'  free text that only appears in the key
+    'name'    the "Name: ____ Date: ____" line (student sheet only); 'name'
+              fills in the student's name
+
+'table' and 'drill' items also take 'padding' (default 6) and 'cells':
+'paragraph' to wrap every cell in a centered Paragraph.
+
+Any item may also carry 'only': 'student' or 'key' to appear in just one of them.
+A 'title' uses 'key_text' (if given) as its answer-key heading.
+
+The styles come from make_styles() (genki/styles.py). Styles made with
+make_styles(..., furigana=True) give every item's kanji their readings
+(genki/furigana.py) as it is rendered; with lesson=N only kanji not taught
+by the end of Genki lesson N get them (genki/kanji.py), and furigana='kana'
+writes those words in kana instead.
+
+A 'text', 'answer', 'blanks' or 'drill' item with 'romaji': True (or
+'kunrei') gets the romaji of each Japanese line (of a drill, each answer)
+after it in parentheses (genki/romaji.py), worked out from the kana and
+kanji readings when the item is rendered.
+
+Rendering an item is prepare_item() (romaji and readings), item_blocks()
+(what it shows, as plain tuples) and block_flowables(); genki/export.py
+writes the same blocks to HTML and flashcard decks.
+"""
+from html import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Spacer, Table, TableStyle, PageBreak
+
+from genki.furigana import annotate_item
+from genki.incremental import build_pdf
+from genki.kinsoku import KinsokuParagraph as Paragraph
+from genki.styles import make_styles
+
+BLANK = '__________________'
+NAME_BLANK = '__________________________'
+CHOICE_LETTERS = 'abcdefgh'
+# Item types whose answers are filled in (or only shown) in the key
+KEY_TYPES = ('drill', 'blanks', 'choice', 'circle', 'answer')
+
+
+# --- TABLES ---
+
+def make_table(data, widths, font_name, padding=6):
+    t = Table(data, colWidths=widths)
+    t.setStyle(TableStyle([
+        ('FONTNAME', (0,0), (-1,-1), font_name),
+        ('GRID', (0,0), (-1,-1), 1, colors.black),
+        ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
+        ('PADDING', (0,0), (-1,-1), padding),
+        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+    ]))
+    return t
+
+
+def circle_options(choices):
+    """'( a. X / b. Y )' for one inline circle-the-answer blank."""
+    return "( " + " / ".join(f"{letter}. {c}" for letter, c in zip(CHOICE_LETTERS, choices)) + " )"
+
+
+def circle_text(item):
+    """A 'circle' item's passage with each {{n}} replaced by its options."""
+    text = item['text']
+    for n, choices in enumerate(item['choices'], 1):
+        text = text.replace("{{%d}}" % n, circle_options(choices))
+    return text
+
+
+# --- ITEMS ---
+
+# An item resolves to blocks, what it shows in one version of the sheet,
+# before any reportlab objects exist (genki/export.py writes them to HTML
+# and flashcards too):
+#   ('para', style name, markup)
+#   ('table', rows, widths, padding)   a cell is a string drawn as is, or
+#                                      (style name, markup) for a Paragraph
+#   ('break',)
+#   ('spacer', height)
+
+def prepare_item(item, styles):
+    """The item with its romaji and readings filled in, as the styles ask."""
+    if item.get('romaji'):
+        # Imported on first use: only a few items ask for romaji
+        from genki.romaji import romaji_item
+        item = romaji_item(item)
+    if styles.get('furigana'):
+        item = annotate_item(item, styles.get('lesson'), styles['furigana'] == 'kana')
+    return item
+
+
+def _table_block(item, data):
+    if item.get('cells') == 'paragraph':
+        data = [[('table_text', c) if isinstance(c, str) else c for c in row] for row in data]
+    return ('table', data, item['widths'], item.get('padding', 6))
+
+
+def item_blocks(item, mode='student'):
+    """The blocks for one prepared spec item ('student' or 'key' version)."""
+    kind = item['type']
+
+    if kind == 'title':
+        if mode == 'key':
+            return [('para', 'key_title', item.get('key_text', 'ANSWER KEY: ' + item['text']))]
+        return [('para', 'title', item['text'])]
+    elif kind == 'header':
+        return [('para', 'header', item['text'])]
+    elif kind == 'text':
+        return [('para', 'normal', item['text'])]
+    elif kind == 'table':
+        return [_table_block(item, item['data'])]
+    elif kind == 'break':
+        return [('break',)]
+    elif kind == 'spacer':
+        return [('spacer', item.get('height', 15))]
+
+    elif kind == 'drill':
+        col = item.get('answer_col', -1)
+        data = [list(item['data'][0])]
+        for row in item['data'][1:]:
+            row = list(row)
+            if mode == 'key':
+                style = 'table_answer' if item.get('cells') == 'paragraph' else 'answer'
+                row[col] = (style, row[col])
+            else:
+                row[col] = item.get('blank', BLANK)
+            data.append(row)
+        return [_table_block(item, data)]
+    elif kind == 'blanks':
+        if mode != 'key':
+            return [('para', 'normal', item['text'])]
+        lines = []
+        for n, (answer, note) in enumerate(item['answers'], item.get('start', 1)):
+            line = f"{n}. {answer}"
+            if note:
+                line += f"<br/>&nbsp;&nbsp;&nbsp;<font size=9 color=grey>{note}</font>"
+            lines.append(line)
+        return [('para', 'answer', "<br/><br/>".join(lines))]
+    elif kind == 'choice':
+        if mode == 'key':
+            letter = CHOICE_LETTERS[item['answer']]
+            text = f"{item['number']}. <b>({letter}) {item['choices'][item['answer']]}</b>"
+            return [('para', 'answer', text)]
+        text = f"{item['number']}. {item['prompt']}<br/>"
+        for letter, choice in zip(CHOICE_LETTERS, item['choices']):
+            text += f"&nbsp;&nbsp;{letter}) {choice}<br/>"
+        return [('para', 'normal', text)]
+    elif kind == 'circle':
+        if mode == 'key':
+            lines = []
+            for n, (choices, answer) in enumerate(zip(item['choices'], item['answers']), 1):
+                lines.append(f"{n}. <b>({CHOICE_LETTERS[answer]}) {choices[answer]}</b>")
+            return [('para', 'answer', "<br/>".join(lines))]
+        return [('para', 'normal', circle_text(item))]
+    elif kind == 'answer':
+        return [('para', 'answer', item['text'])] if mode == 'key' else []
+    elif kind == 'name':
+        if mode == 'key':
+            return []
+        name = f"<b>{escape(item['name'], quote=False)}</b>" if item.get('name') else NAME_BLANK
+        return [('para', 'normal', f"Name: {name}   Date: ____________")]
+
+    raise ValueError(f"Unknown spec item type: {kind!r}")
+
+
+def block_flowables(block, styles):
+    """The reportlab flowables for one block."""
+    kind = block[0]
+    if kind == 'para':
+        return [Paragraph(block[2], styles[block[1]])]
+    elif kind == 'table':
+        _, rows, widths, padding = block
+        data = [[Paragraph(c[1], styles[c[0]]) if isinstance(c, tuple) else c for c in row] for row in rows]
+        return [make_table(data, widths, styles['normal'].fontName, padding), Spacer(1, 12)]
+    elif kind == 'break':
+        return [PageBreak()]
+    elif kind == 'spacer':
+        return [Spacer(1, block[1])]
+    raise ValueError(f"Unknown block kind: {kind!r}")
+
+
+def render_item(item, styles, mode='student'):
+    """Returns the flowables for one spec item ('student' or 'key' version)."""
+    blocks = item_blocks(prepare_item(item, styles), mode)
+    return [flowable for block in blocks for flowable in block_flowables(block, styles)]
+
+
+def iter_story(content, styles, mode='student'):
+    """
+    Yields the flowables for the spec one item at a time, for streaming
+    builds (see genki/stream.py). mode is 'student', 'key' or 'combined'.
+    """
+    if mode == 'combined':
+        yield from iter_story(content, styles, 'student')
+        yield PageBreak()
+        yield from iter_story(content, styles, 'key')
+        return
+    for item in content:
+        only = item.get('only')
+        if only and only != mode:
+            continue
+        yield from render_item(item, styles, mode)
+
+
+def has_key(content):
+    """
+    True if the spec's key shows anything its student sheet doesn't: an item
+    with an answer to fill in, or one marked 'only': 'key'.
+    """
+    return any(item['type'] in KEY_TYPES or item.get('only') == 'key' for item in content)
+
+
+def build_story(content, styles, mode='student'):
+    """Flowables for the whole spec, as a list. mode is 'student', 'key' or 'combined'."""
+    return list(iter_story(content, styles, mode))
+
+
+# --- OUTPUT ---
+
+def new_doc(filename):
+    return SimpleDocTemplate(filename, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
+
+
+def write_outputs(content, styles, outputs, verbose=True):
+    """
+    Writes any of the 'student', 'key' and 'combined' versions of a spec in
+    one pass. outputs maps version -> filename. Each version gets flowables
+    of its own: platypus marks a flowable it has pushed to the next page, so
+    one laid out for the student sheet can't be placed again in the combined
+    one. The parsed text and line breaks still come from the layout cache
+    (genki/layout.py), so the repeats cost little.
+    """
+    for mode in ('student', 'key', 'combined'):
+        if mode in outputs:
+            status = build_pdf(new_doc(outputs[mode]), build_story(content, styles, mode))
+            if verbose and status != "hit":
+                print(f"Generated: {outputs[mode]}")
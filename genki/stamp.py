@@ -0,0 +1,222 @@
+"""
+Fast personalization by stamping: the worksheet is laid out once with
+SimpleDocTemplate, each page is kept as a PDF form XObject, and every
+student's copy is those forms plus a few text operators for the fields
+(name, class, date, and a sheet ID in the bottom corner). No story is
+rebuilt and no Paragraph is wrapped again per student, so a copy costs
+little more than writing its stamps.
+
+    python -m genki.stamp "Lesson 20/L20_worksheet1.py" --roster class_3b.txt --class-name 3B --date 2024-05-10
+    python -m genki.stamp "Lesson 19/Genki_Honorifics_Worksheet.py" --count 500
+
+The output is a single PDF (all copies share the page forms). For a class
+pack with per-student variants, which need their own layout, see
+genki/classpack.py.
+"""
+import os
+import sys
+import time
+import argparse
+from functools import partial
+
+from reportlab.lib import colors
+from reportlab.pdfbase import pdfdoc
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Flowable
+
+from genki.spec import NAME_BLANK, new_doc, render_item
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Label and blank of each field on the template's name line
+FIELDS = [('Name', NAME_BLANK), ('Class', '__________'), ('Date', '____________')]
+
+
+# --- TEMPLATE ---
+
+class FieldLine(Flowable):
+    """
+    The "Name: ____ Class: ____ Date: ____" line of a template. While it is
+    drawn it records where each blank starts, in page coordinates, so the
+    stamps can be written onto the blanks later.
+    """
+
+    def __init__(self, style, fields=FIELDS):
+        Flowable.__init__(self)
+        self.style = style
+        self.fields = fields
+        self.positions = {}   # label -> (page index, x, y)
+
+    def wrap(self, availWidth, availHeight):
+        return availWidth, self.style.leading
+
+    def getSpaceAfter(self):
+        return self.style.spaceAfter
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        self._origin = (x, y)
+        Flowable.drawOn(self, canvas, x, y, _sW)
+
+    def draw(self):
+        font, size = self.style.fontName, self.style.fontSize
+        page = self.canv.getPageNumber() - 1
+        baseline = self.style.leading - size
+        x = 0
+        self.canv.setFont(font, size)
+        for label, blank in self.fields:
+            text = f"{label}: "
+            self.canv.drawString(x, baseline, text + blank)
+            x += stringWidth(text, font, size)
+            self.positions[label] = (page, self._origin[0] + x, self._origin[1] + baseline)
+            x += stringWidth(blank + "   ", font, size)
+
+
+def template_story(content, styles):
+    """
+    Student-sheet flowables for content with its 'name' item (or, if it has
+    none, a line under the title) replaced by a FieldLine. Returns (story, line).
+    """
+    line = FieldLine(styles['normal'])
+    has_name = any(item['type'] == 'name' for item in content)
+    story = []
+    for item in content:
+        if item.get('only') == 'key':
+            continue
+        if item['type'] == 'name':
+            story.append(line)
+            continue
+        story.extend(render_item(item, styles, 'student'))
+        if item['type'] == 'title' and not has_name:
+            story.append(line)
+    return story, line
+
+
+# --- STAMPING ---
+
+class _StampCanvas(Canvas):
+    """
+    Canvas for the one layout pass. Every page the doc template finishes is
+    stored as a form XObject instead of being written; save() then writes
+    one copy of the form pages per student with that student's stamps.
+    """
+
+    def __init__(self, *args, line=None, copies=(), margins=(72, 72), timings=None, **kw):
+        Canvas.__init__(self, *args, **kw)
+        self._line = line
+        self._copies = copies
+        self._margins = margins
+        self._timings = timings if timings is not None else {}
+        self._start = time.perf_counter()
+        self.template_pages = []
+
+    def showPage(self):
+        # Same as Canvas.endForm(), for the page's accumulated operations
+        name = f"GenkiTemplatePage{len(self.template_pages) + 1}"
+        w, h = self._pagesize
+        form = pdfdoc.PDFFormXObject(lowerx=0, lowery=0, upperx=w, uppery=h)
+        form.compression = self._pageCompression
+        form.setStreamList([self._preamble] + self._code)
+        self._setColorSpace(form)
+        self._setExtGState(form)
+        self._setXObjects(form)
+        self._doc.addForm(name, form)
+        self.template_pages.append(name)
+        self._startPage()
+
+    def _stamp(self, page, fields, sheet_id):
+        font, size = self._line.style.fontName, self._line.style.fontSize
+        self.setFillColor(colors.black)
+        self.setFont(font, size)
+        for label, value in fields.items():
+            where = self._line.positions.get(label)
+            if value and where and where[0] == page:
+                self.drawString(where[1] + 4, where[2] + 2, value)
+        if sheet_id:
+            right, bottom = self._margins
+            self.setFillColor(colors.grey)
+            self.setFont('Helvetica', 8)
+            self.drawRightString(self._pagesize[0] - right, bottom / 2,
+                                 f"Sheet {sheet_id}  ({page + 1}/{len(self.template_pages)})")
+
+    def save(self):
+        self._timings['layout'] = time.perf_counter() - self._start
+        start = time.perf_counter()
+        # The page opened by the doc template's last showPage() is still empty
+        self._pageNumber = 1
+        for copy in self._copies:
+            fields = {'Name': copy.get('name'), 'Class': copy.get('class'), 'Date': copy.get('date')}
+            for page, form in enumerate(self.template_pages):
+                self.doForm(form)
+                self._stamp(page, fields, copy.get('sheet_id'))
+                Canvas.showPage(self)
+        Canvas.save(self)
+        self._timings['stamp'] = time.perf_counter() - start
+        self._timings['pages'] = len(self.template_pages)
+
+
+def make_copies(names, class_name='', date=''):
+    """One stamp dict per student; sheet IDs are the class and roster position."""
+    prefix = f"{class_name}-" if class_name else ""
+    return [{'name': name, 'class': class_name, 'date': date, 'sheet_id': f"{prefix}{n:03d}"}
+            for n, name in enumerate(names, 1)]
+
+
+def stamp_pack(content, styles, copies, filename):
+    """
+    Lays content out once and writes every copy into filename. Returns
+    {'layout': seconds, 'stamp': seconds, 'pages': template pages}.
+    """
+    doc = new_doc(filename)
+    story, line = template_story(content, styles)
+    timings = {}
+    canvasmaker = partial(_StampCanvas, line=line, copies=copies, timings=timings,
+                          margins=(doc.rightMargin, doc.bottomMargin))
+    doc.build(story, canvasmaker=canvasmaker)
+    return timings
+
+
+# --- COMMAND LINE ---
+
+def main(argv=None):
+    from genki.build import load_script
+    from genki.classpack import read_roster
+    from genki.variants import spec_names
+
+    parser = argparse.ArgumentParser(description="Personalize a worksheet by stamping name/class/date onto cached pages.")
+    parser.add_argument("script", help="Worksheet script, e.g. 'Lesson 20/L20_worksheet1.py'")
+    parser.add_argument("--spec", help="Name of the content list in the script (default: its only *_content list)")
+    who = parser.add_mutually_exclusive_group(required=True)
+    who.add_argument("--roster", help="Text file with one student name per line")
+    who.add_argument("--count", type=int, help="Number of copies with a blank name line")
+    parser.add_argument("--class-name", default="", help="Class stamped on every copy (and used in sheet IDs)")
+    parser.add_argument("--date", default="", help="Date stamped on every copy")
+    parser.add_argument("--out", help="Output PDF (default: build/stamped/<script>_stamped.pdf)")
+    args = parser.parse_args(argv)
+
+    script = os.path.abspath(args.script)
+    names = spec_names(script)
+    spec_name = args.spec or (names[0] if len(names) == 1 else None)
+    if spec_name not in names:
+        parser.error(f"pick a spec with --spec (found: {', '.join(names) or 'none'})")
+    students = read_roster(args.roster) if args.roster else [''] * args.count
+    if not students:
+        parser.error("the roster is empty")
+
+    stem = os.path.splitext(os.path.basename(script))[0]
+    out = args.out or os.path.join(REPO_ROOT, "build", "stamped", f"{stem}_stamped.pdf")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+
+    module = load_script(script)
+    copies = make_copies(students, args.class_name, args.date)
+    t = stamp_pack(getattr(module, spec_name), module.styles, copies, out)
+
+    print(f"Generated: {out} ({os.path.getsize(out) / 1e3:.0f} kB)")
+    print(f"Layout once: {t['layout'] * 1000:.0f}ms ({t['pages']} pages)")
+    print(f"Stamping: {len(copies)} copies in {t['stamp'] * 1000:.0f}ms "
+          f"({t['stamp'] / len(copies) * 1000:.2f}ms per copy)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""
+Streaming stories: doc.build() fed from a generator instead of a list.
+
+doc.build(story) only ever works at the front of the story (it takes the
+first flowable, puts split-off remainders back in front, and looks a few
+flowables ahead for keepWithNext chains), so it can be handed a list that is
+filled from a generator as it empties. Flowables are then created just
+before they are laid out and dropped once they are drawn, and memory no
+longer grows with the length of the document:
+
+    build_pdf(doc, iter_story(content, styles))      # genki/spec.py
+    build_pdf(doc, worksheet_story())                # any generator of flowables
+
+What does still grow is reportlab's record of the finished pages (their
+content streams, a few kB each), which it keeps until canvas.save().
+"""
+from itertools import chain
+
+# How many flowables are kept ready in front; enough for any keepWithNext
+# chain the worksheets use (headers are kept with the item that follows).
+LOOKAHEAD = 32
+
+
+class StreamingStory(list):
+    """
+    A story list that refills itself from an iterable of flowables. Each
+    len() call (doc.build() checks it before every flowable) tops the list
+    up to LOOKAHEAD items, so the rest of the document is never in memory.
+    """
+
+    def __init__(self, flowables, lookahead=LOOKAHEAD):
+        list.__init__(self)
+        self._source = iter(flowables)
+        self._lookahead = lookahead
+        self.pulled = 0
+
+    def _fill(self):
+        source = self._source
+        if source is None:
+            return
+        while list.__len__(self) < self._lookahead:
+            try:
+                self.append(next(source))
+            except StopIteration:
+                self._source = None
+                return
+            self.pulled += 1
+
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+
+    def __bool__(self):
+        return len(self) > 0
+
+
+def concat(*stories):
+    """Chains stories (lists or generators) lazily."""
+    return chain.from_iterable(stories)
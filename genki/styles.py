@@ -0,0 +1,116 @@
+"""
+The paragraph styles the worksheets are set in, built once per process.
+
+Every worksheet uses the same TitleJP / HeaderJP / NormalJP / AnswerJP /
+TableText set. Their sizes come from a named preset, so the scripts don't
+each carry their own copy of the ParagraphStyle lines:
+
+    styles = style_set('JapaneseFont')                 # the usual worksheet sizes
+    styles = style_set('JapaneseFont', 'compact')      # the denser review sheet
+    styles['header'].fontSize   -> 14
+
+A set is built on first use and kept in a registry keyed by its arguments,
+so every script (and every build or serve worker rendering several of them)
+shares the same style objects. Treat them as read-only and derive anything
+else with ParagraphStyle('Name', parent=styles['normal'], ...).
+
+make_styles() (re-exported by genki/spec.py) adds the furigana settings the
+spec renderer reads on top of a style set.
+
+    python -m genki.styles                 # the presets, with the time to build a set
+"""
+import sys
+import time
+import argparse
+
+# preset -> keyword arguments for each style of the set
+PRESETS = {
+    'worksheet': {
+        'title': dict(fontSize=18, spaceAfter=12),
+        'header': dict(fontSize=14, spaceBefore=12, spaceAfter=6),
+        'normal': dict(fontSize=11, leading=16, spaceAfter=10),
+        'table_text': dict(leading=14),
+    },
+    'compact': {
+        'title': dict(fontSize=16, spaceAfter=6),
+        'header': dict(fontSize=12, spaceBefore=10, spaceAfter=4),
+        'normal': dict(fontSize=10.5, leading=14, spaceAfter=2),
+        'table_text': dict(leading=12),
+    },
+}
+
+# (font name, preset, header color, leading) -> style set
+_registry = {}
+
+
+def _build(font_name, preset, header_color, leading):
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+    sizes = PRESETS[preset]
+    normal_sizes = dict(sizes['normal'])
+    if leading is not None:
+        normal_sizes['leading'] = leading
+    sample = getSampleStyleSheet()
+    title = ParagraphStyle('TitleJP', parent=sample['Heading1'], fontName=font_name, alignment=1, **sizes['title'])
+    normal = ParagraphStyle('NormalJP', parent=sample['Normal'], fontName=font_name, **normal_sizes)
+    table_text = ParagraphStyle('TableText', parent=normal, alignment=1, **sizes['table_text'])
+    return {
+        'title': title,
+        'key_title': ParagraphStyle('KeyTitleJP', parent=title, textColor=colors.darkblue),
+        'header': ParagraphStyle('HeaderJP', parent=sample['Heading2'], fontName=font_name,
+                                 textColor=header_color or colors.darkblue, **sizes['header']),
+        'normal': normal,
+        'answer': ParagraphStyle('AnswerJP', parent=normal, textColor=colors.red),
+        'table_text': table_text,
+        'table_answer': ParagraphStyle('TableAnswer', parent=table_text, textColor=colors.red),
+    }
+
+
+def style_set(font_name, preset='worksheet', header_color=None, leading=None):
+    """
+    The title / key_title / header / normal / answer / table_text /
+    table_answer styles for font_name. header_color defaults to dark blue;
+    leading overrides the preset's line height for normal text.
+    """
+    if preset not in PRESETS:
+        raise ValueError(f"Unknown style preset {preset!r} (have: {', '.join(PRESETS)})")
+    key = (font_name, preset, header_color, leading)
+    styles = _registry.get(key)
+    if styles is None:
+        styles = _registry[key] = _build(font_name, preset, header_color, leading)
+    return styles
+
+
+def make_styles(font_name, header_color=None, leading=None, furigana=False, lesson=None, preset='worksheet'):
+    """
+    The style set used by the worksheets plus the spec renderer's furigana
+    settings: furigana=True turns on automatic readings for the items
+    rendered with them (for kanji above lesson, if given).
+    """
+    styles = dict(style_set(font_name, preset, header_color, leading))
+    styles['furigana'] = furigana
+    styles['lesson'] = lesson
+    return styles
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List the worksheet style presets.")
+    parser.add_argument("--font", default="Helvetica", help="Font to build the sets with (default: Helvetica)")
+    args = parser.parse_args(argv)
+
+    for preset in PRESETS:
+        start = time.perf_counter()
+        styles = style_set(args.font, preset)
+        built = time.perf_counter() - start
+        start = time.perf_counter()
+        style_set(args.font, preset)
+        cached = time.perf_counter() - start
+        print(f"{preset}: built in {built * 1000:.2f}ms, then {cached * 1e6:.1f}us from the registry")
+        for name, style in styles.items():
+            print(f"  {name:<13} {style.name:<12} {style.fontSize:>5}pt on {style.leading:>4}pt")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
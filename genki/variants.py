@@ -0,0 +1,209 @@
+"""
+Per-student worksheet variants.
+
+A variant is the spec (see genki/spec.py) with its questions shuffled by a
+seeded random.Random, so the same seed always gives the same sheet and key.
+Only items that carry their own answers are shuffled, which keeps every
+variant's key correct:
+
+  * 'drill' rows (the header row stays on top)
+  * 'choice' options, and the order of each run of consecutive 'choice'
+    questions (renumbered afterwards)
+  * the options of every blank in a 'circle' passage
+
+Items marked 'shuffle': False are left alone. A spec with nothing of the
+above to reorder (only text, tables and 'blanks' passages, say) would give
+the same sheet for every seed, so make_variant raises ValueError for it.
+
+    python -m genki.variants "Lesson 19/Genki_Honorifics_Worksheet.py" --count 5000
+    python -m genki.variants "Lesson 19/lesson_19_worksheetes.py" --spec ws2_content --count 40 -j 4
+"""
+import os
+import ast
+import sys
+import time
+import random
+import argparse
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (spec, styles) for the script this worker renders, set by _init_worker.
+_worker = {}
+
+
+# --- SHUFFLING ---
+
+def _shuffled_choice(item, rng):
+    order = list(range(len(item['choices'])))
+    rng.shuffle(order)
+    item = dict(item)
+    item['choices'] = [item['choices'][i] for i in order]
+    item['answer'] = order.index(item['answer'])
+    return item
+
+
+def make_variant(content, seed):
+    """
+    Returns a shuffled copy of content for seed; content itself is not modified.
+    Raises ValueError if the spec has nothing that can be reordered.
+    """
+    rng = random.Random(seed)
+    out = []
+    run = []   # consecutive 'choice' items, shuffled as a block
+    varies = []
+
+    def flush():
+        # Shuffle the run of choice questions and number them from where it started
+        if len(run) > 1:
+            varies.append('choice')
+        if run:
+            first = min(item['number'] for item in run)
+            rng.shuffle(run)
+            for number, item in enumerate(run, first):
+                item['number'] = number
+            out.extend(run)
+            del run[:]
+
+    for item in content:
+        kind = item['type']
+        if item.get('shuffle', True) and kind == 'choice':
+            if len(item['choices']) > 1:
+                varies.append(kind)
+            run.append(_shuffled_choice(item, rng))
+            continue
+        flush()
+        if not item.get('shuffle', True):
+            out.append(item)
+        elif kind == 'drill':
+            rows = list(item['data'][1:])
+            if len(rows) > 1:
+                varies.append(kind)
+            rng.shuffle(rows)
+            out.append(dict(item, data=[item['data'][0]] + rows))
+        elif kind == 'circle':
+            choices, answers = [], []
+            for options, answer in zip(item['choices'], item['answers']):
+                if len(options) > 1:
+                    varies.append(kind)
+                order = list(range(len(options)))
+                rng.shuffle(order)
+                choices.append([options[i] for i in order])
+                answers.append(order.index(answer))
+            out.append(dict(item, choices=choices, answers=answers))
+        else:
+            out.append(item)
+    flush()
+    if not varies:
+        raise ValueError("nothing to shuffle: every variant would be the same sheet "
+                         "(variants reorder drill rows, choice questions and circle options)")
+    return out
+
+
+def label_variant(content, label):
+    """Adds the variant label to the title, so a sheet can be matched to its key."""
+    out = []
+    for item in content:
+        if item['type'] == 'title':
+            item = dict(item, text=f"{item['text']} ({label})")
+            if 'key_text' in item:
+                item['key_text'] = f"{item['key_text']} ({label})"
+        out.append(item)
+    return out
+
+
+# --- RENDERING ---
+
+def spec_names(script):
+    """Module-level *_content lists in a worksheet script, read without importing it."""
+    with open(script, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=script)
+    return [t.id for node in tree.body if isinstance(node, ast.Assign) and isinstance(node.value, ast.List)
+            for t in node.targets if isinstance(t, ast.Name) and t.id.endswith('_content')]
+
+
+def _init_worker(script, spec_name):
+    from genki.build import load_script
+
+    module = load_script(script)
+    _worker['spec'] = getattr(module, spec_name)
+    _worker['styles'] = module.styles
+
+
+def render_variant(seed, out_dir, stem, outputs=('student', 'key')):
+    """Writes the sheet and key for one seed; returns (seed, seconds, bytes written)."""
+    from genki.spec import write_outputs
+
+    start = time.perf_counter()
+    content = label_variant(make_variant(_worker['spec'], seed), f"Variant {seed}")
+    suffix = {'student': '', 'key': '_key', 'combined': '_with_key'}
+    files = {mode: os.path.join(out_dir, f"{stem}_v{seed:05d}{suffix[mode]}.pdf") for mode in outputs}
+    write_outputs(content, _worker['styles'], files, verbose=False)
+    size = sum(os.path.getsize(f) for f in files.values())
+    return seed, time.perf_counter() - start, size
+
+
+def _render_chunk(seeds, out_dir, stem, outputs):
+    return [render_variant(seed, out_dir, stem, outputs) for seed in seeds]
+
+
+def generate(script, seeds, out_dir, spec_name, outputs=('student', 'key'), workers=None, chunk=25):
+    """
+    Renders every seed across a process pool. Seeds are sent in chunks and
+    each worker only holds the document it is building, so memory stays
+    flat however many variants are asked for. Returns per-seed results.
+    """
+    stem = os.path.splitext(os.path.basename(script))[0]
+    os.makedirs(out_dir, exist_ok=True)
+    seeds = list(seeds)
+    chunks = [seeds[i:i + chunk] for i in range(0, len(seeds), chunk)]
+    results = []
+    if workers == 1:
+        _init_worker(script, spec_name)
+        for c in chunks:
+            results.extend(_render_chunk(c, out_dir, stem, outputs))
+        return results
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(script, spec_name)) as pool:
+        render_chunk = partial(_render_chunk, out_dir=out_dir, stem=stem, outputs=outputs)
+        for batch in pool.map(render_chunk, chunks):
+            results.extend(batch)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate shuffled per-student variants of a worksheet spec.")
+    parser.add_argument("script", help="Worksheet script, e.g. 'Lesson 19/Genki_Honorifics_Worksheet.py'")
+    parser.add_argument("--spec", help="Name of the content list in the script (default: its only *_content list)")
+    parser.add_argument("--count", type=int, default=40, help="Number of variants (default: 40)")
+    parser.add_argument("--first-seed", type=int, default=1, help="Seed of the first variant (default: 1)")
+    parser.add_argument("--combined", action="store_true", help="Write one sheet-with-key PDF per seed instead of two")
+    parser.add_argument("--out", default=os.path.join(REPO_ROOT, "build", "variants"), help="Output folder")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes (default: one per core)")
+    args = parser.parse_args(argv)
+
+    script = os.path.abspath(args.script)
+    names = spec_names(script)
+    spec_name = args.spec or (names[0] if len(names) == 1 else None)
+    if spec_name not in names:
+        parser.error(f"pick a spec with --spec (found: {', '.join(names) or 'none'})")
+    outputs = ('combined',) if args.combined else ('student', 'key')
+    seeds = range(args.first_seed, args.first_seed + args.count)
+
+    start = time.perf_counter()
+    try:
+        results = generate(script, seeds, args.out, spec_name, outputs, args.jobs)
+    except ValueError as e:
+        print(f"{args.script} ({spec_name}): {e}")
+        return 1
+    wall = time.perf_counter() - start
+
+    total_bytes = sum(r[2] for r in results)
+    print(f"{len(results)} variants ({len(results) * len(outputs)} PDFs, {total_bytes / 1e6:.1f} MB) in {wall:.2f}s")
+    print(f"Throughput: {len(results) / wall:.1f} variants/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
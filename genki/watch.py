@@ -0,0 +1,253 @@
+"""
+Watches the Lesson NN/ folders and re-renders worksheets as their scripts
+are saved.
+
+One long-running process imports reportlab, registers the font and loads
+every script up front (as genki/build.py's workers do), so a save costs
+re-running the edited script and rendering, not a cold start. The style
+registry, glyph widths, readings and layout caches stay resident, so
+paragraphs that didn't change aren't even re-wrapped.
+
+Only the documents that can see the edit are rendered. Each script's
+module-level definitions (ws2_content, data1, create_pdf, ...) are read
+with ast and compared with the last version that rendered; a document is
+affected if its DOCUMENTS entry reaches a changed definition, directly or
+through the functions and names it uses. Changing anything that isn't a
+definition (a sys.path line, a top-level call) re-renders the whole script.
+A script that other scripts import by name re-renders those as well.
+
+    python -m genki.watch                        # every lesson folder, into build/
+    python -m genki.watch "Lesson 20" --out /tmp/sheets --interval 0.1
+
+Each render is reported with the time from the save to the finished PDF.
+Edits under genki/ itself need a restart.
+"""
+import io
+import os
+import ast
+import sys
+import glob
+import time
+import argparse
+import traceback
+import contextlib
+
+from genki.build import REPO_ROOT, lesson_dirs, output_path, render, unload_script, warm_worker
+
+
+# --- DEFINITIONS ---
+
+def _bound_names(node):
+    """The module-level names a statement defines (none for calls, ifs, ...)."""
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return [node.name]
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return [alias.asname or alias.name.split('.')[0] for alias in node.names]
+    targets = []
+    if isinstance(node, ast.Assign):
+        targets = node.targets
+    elif isinstance(node, (ast.AugAssign, ast.AnnAssign)):
+        targets = [node.target]
+    return [n.id for t in targets for n in ast.walk(t) if isinstance(n, ast.Name)]
+
+
+def _mentioned(node):
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name)}
+
+
+def _is_main_guard(node):
+    return isinstance(node, ast.If) and '__main__' in ast.dump(node.test)
+
+
+class Definitions:
+    """What a worksheet script defines at module level, read from its source without running it."""
+
+    def __init__(self, source, filename):
+        tree = ast.parse(source, filename)
+        self.bodies = {}      # name -> dumps of the statements that bind it
+        self.uses = {}        # name -> names those statements mention
+        self.other = []       # dumps of the statements that bind nothing
+        self.documents = {}   # output name -> (dump of its DOCUMENTS entry, names it mentions)
+        self.imports = set()  # top-level module names imported
+        for node in tree.body:
+            if isinstance(node, ast.Import):
+                self.imports.update(alias.name.split('.')[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                self.imports.add(node.module.split('.')[0])
+            if _is_main_guard(node):
+                continue
+            names = _bound_names(node)
+            if 'DOCUMENTS' in names and isinstance(node.value, ast.Dict):
+                for key, value in zip(node.value.keys, node.value.values):
+                    if isinstance(key, ast.Constant):
+                        self.documents[key.value] = (ast.dump(value), _mentioned(value))
+                continue
+            dump = ast.dump(node)
+            if not names:
+                self.other.append(dump)
+            mentioned = _mentioned(node)
+            for name in names:
+                self.bodies.setdefault(name, []).append(dump)
+                self.uses.setdefault(name, set()).update(mentioned)
+
+    def reach(self, names):
+        """names plus every module-level name their definitions use, transitively."""
+        seen = set()
+        todo = list(names)
+        while todo:
+            name = todo.pop()
+            if name not in seen:
+                seen.add(name)
+                todo.extend(self.uses.get(name, ()))
+        return seen
+
+    def changed(self, old):
+        """The names whose definitions differ from old's."""
+        return {name for name in set(self.bodies) | set(old.bodies)
+                if self.bodies.get(name) != old.bodies.get(name)}
+
+    def affected(self, old):
+        """The documents whose output may differ from what old rendered (all of them if old is None)."""
+        if old is None or self.other != old.other:
+            return list(self.documents)
+        changed = self.changed(old)
+        return [name for name, (dump, mentioned) in self.documents.items()
+                if old.documents.get(name, (None,))[0] != dump or self.reach(mentioned) & changed]
+
+
+# --- WATCHING ---
+
+def _rel(path):
+    return os.path.relpath(path, REPO_ROOT)
+
+
+def _stem(script):
+    return os.path.splitext(os.path.basename(script))[0]
+
+
+class Watcher:
+    """Polls the lesson scripts and re-renders the documents each save affects."""
+
+    def __init__(self, lessons=None, out_dir=None):
+        self.lessons = lessons
+        self.out_dir = out_dir or os.path.join(REPO_ROOT, "build")
+        self.stamps = {}   # script -> (mtime_ns, size) last seen
+        self.defs = {}     # script -> Definitions of the version last rendered (or loaded)
+
+    def scripts(self):
+        return [script for lesson in lesson_dirs(self.lessons)
+                for script in sorted(glob.glob(os.path.join(lesson, "*.py")))]
+
+    def warm(self):
+        """Loads the font and every script, and records what each one defines. Returns the document count."""
+        scripts = self.scripts()
+        for script in scripts:
+            self.stamps[script] = self.stamp(script)
+            with open(script, encoding="utf-8") as f:
+                self.defs[script] = Definitions(f.read(), script)
+        with contextlib.redirect_stdout(io.StringIO()):
+            warm_worker([s for s in scripts if self.defs[s].documents])
+        return sum(len(d.documents) for d in self.defs.values())
+
+    def stamp(self, script):
+        try:
+            st = os.stat(script)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def poll(self):
+        """Handles every script saved since the last poll."""
+        current = self.scripts()
+        for script in set(self.stamps) - set(current):
+            del self.stamps[script]
+            self.defs.pop(script, None)
+            unload_script(script)
+        for script in current:
+            stamp = self.stamp(script)
+            if stamp is not None and stamp != self.stamps.get(script):
+                self.stamps[script] = stamp
+                self.changed(script, stamp[0] / 1e9)
+
+    def importers(self, script):
+        """The other scripts in its folder that import it by name (via their sys.path line)."""
+        stem, folder = _stem(script), os.path.dirname(script)
+        return [s for s, d in self.defs.items()
+                if s != script and os.path.dirname(s) == folder and stem in d.imports]
+
+    def changed(self, script, saved):
+        try:
+            with open(script, encoding="utf-8") as f:
+                new = Definitions(f.read(), script)
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"{_rel(script)}: {e}")
+            return
+        except SyntaxError as e:
+            print(f"{_rel(script)}: line {e.lineno}: {e.msg} (waiting for the next save)")
+            return
+        old = self.defs.get(script)
+        jobs = [(script, name) for name in new.affected(old)]
+        if old is None or new.changed(old) or new.other != old.other:
+            sys.modules.pop(_stem(script), None)
+            for importer in self.importers(script):
+                jobs += [(importer, name) for name in self.defs[importer].documents]
+        if old is not None and not jobs:
+            self.defs[script] = new
+            print(f"{_rel(script)}: saved, no document affected")
+            return
+
+        if old is None:
+            what = "new script"
+        else:
+            what = ", ".join(sorted(new.changed(old))) or "module-level code"
+        print(f"{_rel(script)}: {what} changed")
+        if self.render(jobs, saved):
+            self.defs[script] = new
+
+    def render(self, jobs, saved):
+        """Re-runs the scripts of jobs and renders them; returns False (after reporting it) on an error."""
+        for script in dict.fromkeys(script for script, _ in jobs):
+            unload_script(script)
+        for script, name in jobs:
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    _, _, out_path, seconds, _, _ = render(script, name, output_path(self.out_dir, script, name))
+            except Exception:
+                traceback.print_exc()
+                print(f"  {name} not rendered (waiting for the next save)")
+                unload_script(script)
+                return False
+            print(f"  {name:<45} {seconds * 1000:>6.0f}ms  (save to PDF {(time.time() - saved) * 1000:.0f}ms)")
+        return True
+
+
+def watch(lessons=None, out_dir=None, interval=0.2):
+    watcher = Watcher(lessons, out_dir)
+    start = time.perf_counter()
+    count = watcher.warm()
+    print(f"Watching {len(watcher.stamps)} scripts ({count} documents) into {watcher.out_dir}; "
+          f"ready in {time.perf_counter() - start:.2f}s. Ctrl-C to stop.")
+    try:
+        while True:
+            time.sleep(interval)
+            watcher.poll()
+    except KeyboardInterrupt:
+        print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-render worksheets as their scripts are saved.")
+    parser.add_argument("lessons", nargs="*", help="Lesson folders to watch (default: all)")
+    parser.add_argument("--out", default=os.path.join(REPO_ROOT, "build"), help="Output folder (default: build/)")
+    parser.add_argument("--interval", type=float, default=0.2, help="Seconds between checks (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    if not lesson_dirs(args.lessons):
+        print("No lesson folders found.")
+        return 1
+    watch(args.lessons, args.out, args.interval)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
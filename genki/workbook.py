@@ -0,0 +1,106 @@
+"""
+Compiles every worksheet in the Lesson NN/ folders into one workbook PDF,
+streaming the story (see genki/stream.py) so memory stays flat however many
+pages it runs to.
+
+Each script contributes its spec lists (*_content, student pages) and, if it
+has one, its worksheet_story() generator; the answer keys of the specs with
+answers to fill in follow at the end unless --keys none. --repeat N repeats the whole set, for testing
+very large books.
+
+    python -m genki.workbook
+    python -m genki.workbook --repeat 40 --out /tmp/big.pdf      # 500+ pages
+    python -m genki.workbook --repeat 40 --eager                 # list story, to compare
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def workbook_sections(lessons=None):
+    """
+    (label, mode, factory) for every part of the workbook, in order; factory()
+    returns a fresh generator of that part's flowables. Student pages come
+    first, answer keys (mode 'key') after them, for the specs that have
+    answers to show (see genki/spec.py has_key()).
+    """
+    from genki.build import discover, load_script
+    from genki.spec import has_key, iter_story
+    from genki.variants import spec_names
+
+    sheets, keys = [], []
+    scripts = []
+    for script, _ in discover(lessons):
+        if script not in scripts:
+            scripts.append(script)
+    for script in scripts:
+        module = load_script(script)
+        stem = os.path.splitext(os.path.basename(script))[0]
+        for name in spec_names(script):
+            content = getattr(module, name)
+            sheets.append((f"{stem}.{name}", 'student',
+                           lambda c=content, s=module.styles: iter_story(c, s, 'student')))
+            if has_key(content):
+                keys.append((f"{stem}.{name}", 'key', lambda c=content, s=module.styles: iter_story(c, s, 'key')))
+        if hasattr(module, 'worksheet_story'):
+            sheets.append((stem, 'student', module.worksheet_story))
+    return sheets + keys
+
+
+def iter_workbook(sections, repeat=1, keys=True):
+    """Yields the whole workbook's flowables, with a page break before every part but the first."""
+    from reportlab.platypus import PageBreak
+
+    first = True
+    for _ in range(repeat):
+        for label, mode, factory in sections:
+            if mode == 'key' and not keys:
+                continue
+            if not first:
+                yield PageBreak()
+            first = False
+            yield from factory()
+
+
+def main(argv=None):
+    from genki.incremental import build_pdf, build_stats
+    from genki.spec import new_doc
+
+    parser = argparse.ArgumentParser(description="Compile every worksheet into one streamed workbook PDF.")
+    parser.add_argument("lessons", nargs="*", help="Lesson folders to include (default: all)")
+    parser.add_argument("--out", default=os.path.join(REPO_ROOT, "build", "Genki_Workbook.pdf"), help="Output PDF")
+    parser.add_argument("--keys", choices=("end", "none"), default="end", help="Answer keys at the end, or none")
+    parser.add_argument("--repeat", type=int, default=1, help="Repeat the whole set N times (default: 1)")
+    parser.add_argument("--eager", action="store_true", help="Collect the story into a list first (for comparison)")
+    args = parser.parse_args(argv)
+
+    sections = workbook_sections(args.lessons)
+    if not sections:
+        print("No worksheets found.")
+        return 1
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+
+    start = time.perf_counter()
+    story = iter_workbook(sections, args.repeat, args.keys == "end")
+    if args.eager:
+        story = list(story)
+    status = build_pdf(new_doc(args.out), story)
+    seconds = time.perf_counter() - start
+
+    pages = build_stats['pages']
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    if status == "hit":
+        return 0
+    print(f"Generated: {args.out}")
+    print(f"{pages} pages in {seconds:.1f}s ({pages / seconds:.0f} pages/s), "
+          f"{os.path.getsize(args.out) / 1e6:.1f} MB, peak RSS {peak:.0f} MB "
+          f"({'list' if args.eager else 'streamed'} story)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())